@@ -1,6 +1,5 @@
 import base64
 import subprocess
-import tempfile
 import os
 
 import textwrap
@@ -123,21 +122,16 @@ def generate_dot_file(G):
     dot_file += '}\n'
     return dot_file
 
+# Pipe the dot content through Graphviz and return the SVG bytes
+def render_svg(dot_content: str) -> bytes:
+    dot_path = os.getenv('DOT_PATH', 'dot')
+    timeout = float(os.getenv('FANTASIA_RENDER_TIMEOUT', 30))
+    result = subprocess.run([dot_path, '-Tsvg'], input=dot_content.encode('utf-8'), capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise Exception(f"Graphviz failed with exit code {result.returncode}: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout
+
 # Generate dot content and return b64 encoded representation
 def generate_svg_graph(G):
     dot_content = generate_dot_file(G)
-    
-    # Save dot_content to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.dot') as dotfile:
-        dotfile_path = dotfile.name
-        dotfile.write(dot_content)
-
-    # Define the output PNG file path
-    output_svg_path = dotfile_path + '.svg'
-
-    # Call Graphviz dot to render PNG
-    print(output_svg_path)
-    dot_path = os.getenv('DOT_PATH', 'dot')
-    subprocess.run([dot_path, '-Tsvg', dotfile_path, '-o', output_svg_path], check=True)
-    with open(output_svg_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    return base64.b64encode(render_svg(dot_content)).decode('utf-8')
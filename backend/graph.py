@@ -1,5 +1,7 @@
 from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Optional
 import numpy as np
 import networkx as nx
 from networkx import NetworkXNoCycle
@@ -107,12 +109,55 @@ def build_graph(task_rows, metadata):
 
     return G
 
-def calculate_jit_dates(G: nx.Graph):
+# What the metrics need from the topology, gathered in one topological pass
+@dataclass
+class GraphAnalysis:
+    order: list[Task]             # tasks in topological order, short if there's a cycle
+    cycle: Optional[list]         # edges of a cycle, None if acyclic; nothing below is valid if set
+    total_work: int
+    longest_path: int             # summing Edge.weight, as nx.dag_longest_path_length does
+    critical_path: list[Task]
+    parallelism_ratio: float
+
+# Kahn's algorithm, relaxing the longest path to each task as it's popped
+def analyze_graph(G: nx.DiGraph) -> GraphAnalysis:
+    total_work = sum(task.estimate for task in G.nodes)
+    indegree = {task: d for task, d in G.in_degree()}
+    dist = {task: 0 for task in G}
+    parent = {task: None for task in G}
+    order = [task for task in G if indegree[task] == 0]
+    for u in order:
+        for v, edge in G.adj[u].items():
+            reach = dist[u] + edge.get(Edge.weight, 1)
+            if parent[v] is None or reach > dist[v]:
+                dist[v] = reach
+                parent[v] = u
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                order.append(v)
+
+    if len(order) < len(G):
+        # Only pay for networkx's search once we know there's something to find
+        return GraphAnalysis(order, find_cycle(G), total_work, 0, [], 0)
+
+    critical_path = []
+    v = max(order, key=lambda t: dist[t]) if order else None
+    while v is not None:
+        critical_path.append(v)
+        v = parent[v]
+    critical_path.reverse()
+    longest_path = dist[critical_path[-1]] if critical_path else 0
+    parallelism_ratio = total_work / longest_path if longest_path else 0
+    return GraphAnalysis(order, None, total_work, longest_path, critical_path, parallelism_ratio)
+
+def calculate_jit_dates(G: nx.Graph, order: Optional[list[Task]] = None):
     # Similar to the date propagation, but in this case we start with the last task and force
     # setting predecessor start dates so that the project (and every task within it) starts as 
     # late as possible while still hitting the final end dates.
     # Only works if all leaf tasks have end dates.
-    for task in reversed(list(nx.topological_sort(G))):
+    if order is None:
+        order = analyze_graph(G).order
+    for task in reversed(order):
         # If this task doesn't already have a JIT end date, set it to the current end date.
         # Then set the JIT start based on the estimate.
         if not task.jit_end:
@@ -125,7 +170,7 @@ def calculate_jit_dates(G: nx.Graph):
                 pred.jit_end = task.jit_start
 
 # Decorate tasks with some useful information.
-def decorate_tasks(G: nx.Graph):
+def decorate_tasks(G: nx.Graph, critical_path: Optional[list[Task]] = None):
     # Today's date - tasks that contain this date are "active".
     # TODO should match the user's timezone.
     today = datetime.now().date()
@@ -151,7 +196,8 @@ def decorate_tasks(G: nx.Graph):
                 succ.up_next = True
 
     # Tag the critical path.
-    critical_path = nx.dag_longest_path(G)
+    if critical_path is None:
+        critical_path = analyze_graph(G).critical_path
     for task in critical_path:
         task.critical = True
     for edge in zip(critical_path, critical_path[1:]):
@@ -185,9 +231,8 @@ def find_cycle(G: nx.Graph):
 
 # Computes total work and the longest path
 def compute_dag_metrics(G: nx.Graph):
-    total_work = sum(task.estimate for task in G.nodes)
-    longest_path = nx.dag_longest_path_length(G)
-    return total_work, longest_path
+    a = analyze_graph(G)
+    return a.total_work, a.longest_path
 
 # Finds nodes that end after the next node starts.
 def find_start_next_before_end(G: nx.Graph, notifications):
@@ -245,14 +290,13 @@ def compute_graph_metrics(parsed_content, metadata, notifications):
     # Check for cycles before running graph algorithms
     G = build_graph(parsed_content, metadata)
 
-    cycle = find_cycle(G)
-    if cycle:
-        notifications.append(Notification(Severity.ERROR, f"Cycle detected in graph at: {cycle}. Cannot compute graph metrics."))
+    # The one topological pass; reused for JIT dates and the critical path below
+    a = analyze_graph(G)
+    if a.cycle:
+        notifications.append(Notification(Severity.ERROR, f"Cycle detected in graph at: {a.cycle}. Cannot compute graph metrics."))
         raise Exception("Can't build graph.")
 
-    total_length, critical_path_length = compute_dag_metrics(G)
-    parallelism_ratio = total_length / critical_path_length
-    notifications.append(Notification(Severity.INFO, f"[Total Length: {total_length}], [Critical Path Length: {critical_path_length}], [Parallelism Ratio: {parallelism_ratio:.2f}]"))
+    notifications.append(Notification(Severity.INFO, f"[Total Length: {a.total_work}], [Critical Path Length: {a.longest_path}], [Parallelism Ratio: {a.parallelism_ratio:.2f}]"))
 
     today = datetime.now().date()
     ret, makespan, valid_date = find_valid_schedule(G, metadata, today)
@@ -289,8 +333,8 @@ def compute_graph_metrics(parsed_content, metadata, notifications):
             print(s)
 
     # Other dates and decorations.
-    calculate_jit_dates(G)
-    decorate_tasks(G)
+    calculate_jit_dates(G, a.order)
+    decorate_tasks(G, a.critical_path)
 
     # Identify bad dates.
     bad_start_end_dates = find_bad_start_end_dates(G, notifications)
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from .metrics import counter, histogram
+
+# Admission control for the solver. Each solve is multi-threaded and
+# takes seconds, so running every request's solve at once just has them
+# fight over the cores until they all time out. At most `slots` solves
+# run at once; the rest wait in a queue of at most `queue`, for at most
+# `wait` seconds, and when a slot frees up it goes to whoever's user has
+# the fewest solves running, then was served longest ago, then has waited
+# longest: someone resubmitting over and over takes turns with everyone
+# else rather than ahead of them. A request admitted while others
+# are still queued behind it gets the shorter, degraded time budget, which
+# drains the queue faster. Past that, requests are turned away with a
+# guess at when to retry.
+#
+# Limits are per process: with preforked workers the machine runs up to
+# workers * slots solves at once.
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# What an admitted solve gets
+@dataclass
+class Ticket:
+    seconds: float      # time budget per solve
+    degraded: bool      # seconds is the shorter budget, because of load
+    waited: float       # seconds spent queueing
+
+admissions = counter('fantasia_admissions_total', 'Solves by how admission went', ('outcome',))
+wait_seconds = histogram('fantasia_admission_wait_seconds', 'Time solves spent queueing for a slot')
+
+# Users to remember the last turn of
+SERVED = 1024
+
+class Admission:
+    def __init__(self, slots: int, queue: int, wait: float, seconds: float, degraded_seconds: float, poll: float = 0.1):
+        self.slots = slots
+        self.queue = queue
+        self.wait = wait
+        self.seconds = seconds
+        self.degraded_seconds = degraded_seconds
+        self.poll = poll
+        self.cond = threading.Condition()
+        self.active = 0
+        # user -> solves they have running
+        self.running: Dict[str, int] = dict()
+        # ( user, arrival ) for everyone queued, in arrival order
+        self.waiting: list[tuple] = []
+        self.arrivals = 0
+        # user -> when they were last admitted, for the most recent users
+        self.served: OrderedDict[str, int] = OrderedDict()
+        self.admitted = 0
+        # How long solves hold a slot, on average, to guess retries by
+        self.held = degraded_seconds
+
+    # Who gets the next free slot
+    def next(self) -> Optional[tuple]:
+        if not self.waiting:
+            return None
+        return min(self.waiting, key=lambda w: (self.running.get(w[0], 0), self.served.get(w[0], -1), w[1]))
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.held * (len(self.waiting) + 1) / self.slots))
+
+    # Whether a new solve would be turned away right now
+    def full(self) -> bool:
+        with self.cond:
+            return self.active >= self.slots and len(self.waiting) >= self.queue
+
+    # Holds a slot for the duration. check is run while queueing, and can
+    # raise to give up.
+    @contextmanager
+    def admit(self, user: str, check: Optional[Callable[[], None]] = None) -> Iterator[Ticket]:
+        started = time.monotonic()
+        with self.cond:
+            if self.active >= self.slots or self.waiting:
+                if len(self.waiting) >= self.queue:
+                    admissions.inc(outcome='rejected')
+                    raise Overloaded(f"The solver is busy with {self.active} schedules and {len(self.waiting)} more waiting, try again shortly",
+                                     self.retry_after())
+                waiter = (user, self.arrivals)
+                self.arrivals += 1
+                self.waiting.append(waiter)
+                try:
+                    while self.active >= self.slots or self.next() is not waiter:
+                        remaining = started + self.wait - time.monotonic()
+                        if remaining <= 0:
+                            admissions.inc(outcome='timed_out')
+                            raise Overloaded(f"Waited {self.wait:.0f}s for the solver without getting a turn, try again shortly",
+                                             self.retry_after())
+                        self.cond.wait(min(self.poll, remaining))
+                        if check is not None:
+                            check()
+                finally:
+                    self.waiting.remove(waiter)
+                    self.cond.notify_all()
+            self.active += 1
+            self.running[user] = self.running.get(user, 0) + 1
+            self.served[user] = self.admitted
+            self.served.move_to_end(user)
+            self.admitted += 1
+            if len(self.served) > SERVED:
+                self.served.popitem(last=False)
+            degraded = bool(self.waiting)
+
+        waited = time.monotonic() - started
+        wait_seconds.observe(waited)
+        admissions.inc(outcome='degraded' if degraded else 'admitted')
+        holding = time.monotonic()
+        try:
+            yield Ticket(self.degraded_seconds if degraded else self.seconds, degraded, waited)
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.running[user] -= 1
+                if not self.running[user]:
+                    del self.running[user]
+                self.held = 0.8 * self.held + 0.2 * (time.monotonic() - holding)
+                self.cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self.cond:
+            return {'running': self.active, 'waiting': len(self.waiting), 'slots': self.slots, 'held_seconds': self.held}
+
+# Shared by every request in the process; made on first use so the
+# environment is read after startup configuration
+admission_lock = threading.Lock()
+admission: Optional[Admission] = None
+
+def get_admission() -> Admission:
+    global admission
+    with admission_lock:
+        if admission is None:
+            admission = Admission(int(os.getenv('FANTASIA_SOLVE_SLOTS', 2)),
+                                  int(os.getenv('FANTASIA_SOLVE_QUEUE', 16)),
+                                  float(os.getenv('FANTASIA_SOLVE_WAIT', 15)),
+                                  float(os.getenv('FANTASIA_SOLVE_SECONDS', 10)),
+                                  float(os.getenv('FANTASIA_DEGRADED_SOLVE_SECONDS', 2)))
+        return admission
@@ -1,28 +1,51 @@
-from collections import defaultdict
-import traceback
-from typing import Dict, Tuple
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import dataclasses
+import gzip
+import hashlib
+import json
+import queue
+import logging
+from datetime import datetime
+from typing import Callable, Optional, Tuple
 import uuid
-from .dot import generate_svg_graph
-from backend.app import parse_to_python
-from flask import Flask, request, jsonify, render_template, session
-from .notification import Notification
+from .dot import render_graph, FragmentCache
+from .gantt import render_gantt
+from .render import cached_svg, get_svg_cache
+from .layout import get_layout_cache
+from . import metrics
+from flask import Flask, Response, request, jsonify, render_template, session, stream_with_context, url_for
+from .notification import Notification, Severity
 
 from .types import *
-from .parse_csv import csv_string_to_task_list 
+from .parse_csv import csv_string_to_task_table
 from .metadata import extract_metadata
 from .verify import verify_inputs, verify_graph
-from .scheduler import find_solution
-from .graph import build_graph, merge_graphs, decorate_and_notify
+from .progress import SolveProgress
+from . import jobs
+from .admission import Overloaded, get_admission
+from .coalesce import SingleFlight
+from .store import get_plan_store, get_snapshot_store
+from .trace import Trace, annotate, configure_logging, profiled, span, tag
+from .graph import build_graph, merge_tables, decorate_and_notify
+from .dag import Graph
+from .summarize import summarize
+from .incremental import Snapshot, diff_tables, replay, hints_from
 from .expand import expand_specific_tasks, expand_parallelizable_tasks
 import os
 
+# brotli compresses SVG better than gzip, but is optional
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
 app = Flask(__name__, static_folder='../frontend/static', template_folder='../frontend/templates')
 
 app.secret_key = os.environ.get("FLASK_SECRET_KEY")
 
-# uuid -> semi structured view of the last plan
-last_plan:  Dict[str, list[Tuple[str, str, str]]] = defaultdict()
-
 def get_user_id():
     if 'user_id' not in session:
         session['user_id'] = str(uuid.uuid4())
@@ -35,73 +58,431 @@ def home():
 
 @app.route('/get-copy-text', methods=['GET'])
 def get_copy_text():
-    response = { "text": '\n'.join(['\t'.join(l) if l else "\t\t\t" for l in last_plan.get(get_user_id(), [])])}
+    response = { "text": get_plan_store().get(get_user_id()) or '' }
     return jsonify(response)
 
 # Converting to string now makes our life a bit easier later
-def build_plan(G) -> list[Tuple[str, str, str]]:
-    task_to_input_row_idx = {}
-    for task in G:
-        task_to_input_row_idx[task.name] = task.input_row_idx
-
-    result = [None] * (max([a.input_row_idx for a in G]) * 2)
-    for task in G:
+def build_plan(tasks: TaskTable) -> list[Tuple[str, str, str]]:
+    result = [None] * (int(tasks.input_rows.max()) * 2)
+    for task in tasks:
         start_string = task.start_date.strftime('%Y-%m-%d') if task.start_date else ''
         end_string = task.end_date.strftime('%Y-%m-%d') if task.end_date else ''
-        result[task_to_input_row_idx[task.name]] = (start_string, end_string, ','.join(task.assignees))
+        result[task.input_row_idx] = (start_string, end_string, ','.join(task.assignees))
 
     return result
 
-def build_graph_and_schedule(tasks: list[InputTask], metadata: Metadata, notifications: list[Notification]):
+# What /get-copy-text hands back for a plan, ready to paste into the sheet
+def copy_text(plan: list[Tuple[str, str, str]]) -> str:
+    return '\n'.join(['\t'.join(l) if l else "\t\t\t" for l in plan])
+
+# The solver is by far the slowest thing to import, so it's loaded with
+# the first solve rather than with the app
+def find_solution(*args, **kwargs):
+    from .scheduler import find_solution
+    return find_solution(*args, **kwargs)
+
+def build_graph_and_schedule(tasks: TaskTable, metadata: Metadata, notifications: list[Notification]):
     # Build the upper graph and verify it
     G = build_graph(tasks, metadata)
-    verify_graph(G)
+    verify_graph(G, notifications)
 
     # Expand the tasks into subtasks where appropriate
-    tasks, specific_subtasks = expand_specific_tasks(tasks)
-    tasks, parallelizable_subtasks = expand_parallelizable_tasks(tasks)
+    lowered, specific_subtasks = expand_specific_tasks(tasks)
+    lowered, parallelizable_subtasks = expand_parallelizable_tasks(lowered)
     
-    # Build the lower graph and verify it
-    L = build_graph(tasks, metadata)
-    verify_graph(L)
+    # The lowered table already has its successors resolved, so the lower
+    # graph comes straight from it
+    L = Graph(lowered)
+    verify_graph(L, notifications)
 
-    # Do the scheduling, note that this statefully updates L
-    makespan, offset = find_solution(L, metadata, specific_subtasks, notifications)
+    # Do the scheduling, note that this statefully updates the lowered table
+    makespan, offset = find_solution(L, specific_subtasks, notifications)
 
     if makespan >= 0:
-        # Merge L back onto G
-        merge_graphs(G, L, specific_subtasks, parallelizable_subtasks)
+        # Merge the lowered table back onto the one G views
+        merge_tables(tasks, lowered, specific_subtasks, parallelizable_subtasks)
 
     return G, makespan, offset
 
-@app.route('/process', methods=['POST'])
-def process():
-    try:
-        content = request.get_json()['content']
-        notifications: list[Notification] = list()
+# Like build_graph_and_schedule, but reusing what it can of the user's
+# previous run: an unchanged sheet reuses its schedule, otherwise only the
+# changed rows are re-verified and the solver is warm started, keeping
+# tasks which nothing changed upstream of in place. Solving waits its turn
+# with admission control, see admission.py. Returns the snapshot to pass
+# to the next run as well.
+def build_graph_and_schedule_incremental(tasks: TaskTable, metadata: Metadata, notifications: list[Notification],
+                                         previous: Optional[Snapshot],
+                                         progress: Optional[SolveProgress] = None) -> Tuple[Graph, int, int, Snapshot]:
+    today = datetime.now().date()
+    inputs = tasks.copy()
+    diff = diff_tables(previous.inputs, previous.metadata, tasks, metadata) if previous else None
+
+    if diff is not None and diff.empty() and previous.day == today and previous.makespan >= 0:
+        with span('replay'):
+            replay(previous.solved, tasks)
+            notifications.extend(previous.notifications)
+            G = build_graph(tasks, metadata)
+        return (G, previous.makespan, previous.offset,
+                Snapshot(today, metadata, inputs, tasks, previous.lowered, previous.makespan, previous.offset,
+                         previous.notifications, previous.fragments, previous.run))
+
+    with span('build_graph'):
+        G = build_graph(tasks, metadata)
+    unchanged_edges = diff is not None and not diff.edges_changed and not diff.metadata_changed
+    with span('verify_graph', incremental=unchanged_edges):
+        verify_graph(G, notifications, diff.affected if unchanged_edges else None)
+
+    with span('expand'):
+        lowered, specific_subtasks = expand_specific_tasks(tasks)
+        lowered, parallelizable_subtasks = expand_parallelizable_tasks(lowered)
+        L = Graph(lowered)
+        annotate(tasks=len(tasks), lowered=len(lowered))
+    with span('verify_lowered'):
+        verify_graph(L, notifications)
 
-        # Make the python data structure and extract metadata
-        # then verify the inputs are consistent
+    first = len(notifications)
+    makespan, offset = -1, 0
+    hints = hints_from(previous, L, tasks, diff) if diff is not None and previous.makespan >= 0 else None
+    job = jobs.current()
+    with get_admission().admit(job.user if job else '', job.check if job else None) as ticket:
+        tag(queued_ms=round(ticket.waited * 1000, 3), solve_seconds=ticket.seconds)
+        if ticket.degraded:
+            notifications.append(Notification(Severity.WARN, f"The solver is busy, so this schedule had {ticket.seconds:g}s to improve rather than the usual {get_admission().seconds:g}s and may not be the shortest"))
+        if hints is not None and hints.fixed.any():
+            # Only worth it at the offset that worked last time; if the fixed
+            # tasks don't leave room, solve again with them free
+            attempt: list[Notification] = []
+            with span('find_solution', fixed=int(hints.fixed.sum())):
+                makespan, offset = find_solution(L, specific_subtasks, attempt, hints, [previous.offset], progress, ticket.seconds)
+            if makespan >= 0:
+                notifications.extend(attempt)
+                notifications.append(Notification(Severity.INFO, f"Kept {int(hints.fixed.sum())} unchanged tasks in place from the last run"))
+            hints.fixed[:] = False
+        if makespan < 0:
+            with span('find_solution', hinted=hints is not None):
+                makespan, offset = find_solution(L, specific_subtasks, notifications, hints, progress=progress, seconds=ticket.seconds)
+
+    if makespan >= 0:
+        with span('merge'):
+            merge_tables(tasks, lowered, specific_subtasks, parallelizable_subtasks)
+
+    return G, makespan, offset, Snapshot(today, metadata, inputs, tasks, lowered, makespan, offset,
+                                         notifications[first:], previous.fragments if previous else FragmentCache())
+
+# Make the python data structure and extract metadata
+# then verify the inputs are consistent
+def parse_request(content: str) -> Tuple[TaskTable, Metadata]:
+    with span('extract_metadata'):
         metadata = extract_metadata(content, '\t')
-        tasks = csv_string_to_task_list(content, '\t', metadata)
+    with span('parse_csv', bytes=len(content)):
+        tasks = csv_string_to_task_table(content, '\t', metadata)
+    with span('verify_inputs'):
         verify_inputs(metadata, tasks)
-        
-        G, makespan, _ = build_graph_and_schedule(tasks, metadata, notifications)
-        last_plan[get_user_id()] = build_plan(G) if makespan >= 0 else []
+    return tasks, metadata
+
+sheet_tasks = metrics.histogram('fantasia_sheet_tasks', 'Tasks in each sheet scheduled', metrics.SIZE_BUCKETS)
+sheet_edges = metrics.histogram('fantasia_sheet_edges', 'Dependencies in each sheet scheduled', metrics.SIZE_BUCKETS)
+
+# Schedules tasks in place for the job's user, starting from their
+# previous snapshot, keeping their plan to copy out and what their next
+# run can reuse. Nothing is kept if the job was cancelled meanwhile, a
+# newer submission owns that now.
+def schedule_request(job: jobs.Job, tasks: TaskTable, metadata: Metadata, notifications: list[Notification],
+                     previous: Optional[Snapshot]) -> Tuple[Graph, Snapshot, str]:
+    G, makespan, _, snapshot = build_graph_and_schedule_incremental(tasks, metadata, notifications,
+                                                                    previous, job.progress)
+    sheet_tasks.observe(len(tasks))
+    sheet_edges.observe(len(G.src))
+    job.check()
+    plan = copy_text(build_plan(tasks)) if makespan >= 0 else ''
+    get_snapshot_store().put(job.user, snapshot)
+    get_plan_store().put(job.user, plan)
+    return G, snapshot, plan
+
+# Decorates G and draws it the way the request asked: the dependency
+# graph by default, or the schedule as a timeline. Returns the render key,
+# the SVG, and anything else the client needs to show it.
+def render_request(G: Graph, options: dict, notifications: list[Notification],
+                   fragments: Optional[FragmentCache] = None) -> Tuple[str, bytes, dict]:
+    with span('decorate'):
+        decorations: list[Decoration] = decorate_and_notify(G, notifications)
+    if options.get('view') == 'gantt':
+        with span('gantt'):
+            key, svg = render_gantt(G, decorations)
+        return key, svg, dict()
+    # Only as much of the graph as was asked for, or as is readable
+    with span('summarize'):
+        summary = summarize(G, decorations, options, notifications)
+        annotate(nodes=len(summary.G))
+    key, svg = render_graph(summary.G, summary.decorations, fragments)
+    return key, svg, {"clusters": {str(row): group for row, group in summary.clusters.items()}}
+
+# Everything a scheduled and rendered request comes to, which identical
+# requests can share
+@dataclasses.dataclass
+class Outcome:
+    key: str
+    svg: bytes
+    extra: dict
+    notifications: list[Notification]
+    plan: str
+    snapshot: Snapshot
+
+# Options which change what's drawn, as opposed to how it's sent
+RENDER_OPTIONS = ('view', 'collapse', 'expand', 'focus')
+
+# Requests for the same sheet, drawn the same way on the same day, from
+# the same previous run ( or none ), come to the same thing whoever sends
+# them. The previous run matters since the schedule is warm started from it.
+def flight_key(content: str, options: dict, previous: Optional[Snapshot]) -> str:
+    drawn = {option: options.get(option) for option in RENDER_OPTIONS}
+    return hashlib.sha256(json.dumps([content, datetime.now().date().isoformat(), drawn, previous.run if previous else None],
+                                     sort_keys=True).encode('utf-8')).hexdigest()
+
+flights = SingleFlight()
+
+# Schedules and renders a request. A team sharing a sheet tends to open it
+# at the same time, so identical requests already in flight are waited on
+# and shared rather than solved again; each requester still keeps the plan
+# for themselves. Only requests starting from the same previous run are
+# identical, see flight_key. If the request being waited on is cancelled,
+# it's the next one in line's turn.
+def solve_request(job: jobs.Job, content: str, tasks: TaskTable, metadata: Metadata, options: dict,
+                  notifications: list[Notification]) -> Outcome:
+    previous = get_snapshot_store().get(job.user)
 
-        # Decorate G before rendering
-        decorations: Dict[InputTask, Decoration] = decorate_and_notify(G, notifications)
+    def solve() -> Outcome:
+        G, snapshot, plan = schedule_request(job, tasks, metadata, notifications, previous)
+        key, svg, extra = render_request(G, options, notifications, snapshot.fragments)
+        return Outcome(key, svg, extra, list(notifications), plan, snapshot)
 
-        response = {
-            "image": generate_svg_graph(G, decorations),
-            "notifications": [n.to_dict() for n in notifications], 
-        }
+    while True:
+        try:
+            outcome, shared = flights.do(flight_key(content, options, previous), solve, job.check)
+            break
+        except jobs.Cancelled:
+            job.check()
+    tag(shared=shared)
+    if shared:
+        job.check()
+        notifications.extend(outcome.notifications)
+        # The drawing fragments stay the user's own, they aren't thread safe
+        get_snapshot_store().put(job.user, dataclasses.replace(outcome.snapshot, fragments=previous.fragments if previous else FragmentCache()))
+        get_plan_store().put(job.user, outcome.plan)
+    return outcome
+
+def render_response(key: str, svg: bytes, extra: dict, options: dict, notifications: list[Notification]) -> dict:
+    response = dict(extra)
+    response["notifications"] = [n.to_dict() for n in notifications]
+    # Clients that ask for it fetch the SVG separately rather than as base64 in here
+    if options.get('svg') == 'url':
+        response["svg"] = url_for('get_svg', key=key)
+    else:
+        response["image"] = base64.b64encode(svg).decode('utf-8')
+    return response
+
+# ?profile=1 runs the request under cProfile and sends the summary back
+def profiling() -> bool:
+    return request.args.get('profile') == '1'
+
+def run_profiled(enabled: bool, fn: Callable, *args) -> Tuple[object, Optional[str]]:
+    return profiled(fn, *args) if enabled else (fn(*args), None)
+
+# Responses say how long each stage took under 'timings', and the same
+# goes to the log
+@app.route('/process', methods=['POST'])
+def process():
+    notifications: list[Notification] = list()
+    job: Optional[jobs.Job] = None
+    trace = Trace()
+    user = get_user_id()
+    outcome = 'error'
+    try:
+        options = request.get_json()
+
+        def work():
+            nonlocal job
+            tasks, metadata = parse_request(options['content'])
+            job = jobs.start(user, SolveProgress())
+            with job.running():
+                return solve_request(job, options['content'], tasks, metadata, options, notifications)
+
+        with trace.running():
+            solved, profile = run_profiled(profiling(), work)
+        response = render_response(solved.key, solved.svg, solved.extra, options, notifications)
+        response['timings'] = trace.to_dict()
+        if profile is not None:
+            response['profile'] = profile
+        outcome = 'ok'
         return jsonify(response)
 
+    except jobs.Cancelled as e:
+        outcome = 'cancelled'
+        return jsonify({'message': str(e), 'cancelled': True, 'notifications': [n.to_dict() for n in notifications]}), 409
+    except Overloaded as e:
+        outcome = 'overloaded'
+        return overloaded(e)
     except Exception as e:
-        print(f"Caught exception {e}")
-        print(traceback.format_exc())
-        return jsonify({'message': str(e)}), 500
+        log.exception("Caught exception %s", e)
+        return jsonify({'message': str(e), 'notifications': [n.to_dict() for n in notifications],
+                        'timings': trace.to_dict()}), 500
+    finally:
+        if job is not None:
+            jobs.finish(job)
+        trace.finish('process', outcome, user=user)
+
+# Runs the solve and a provisional render side by side for /process/stream
+pipeline = ThreadPoolExecutor(max_workers=int(os.getenv('FANTASIA_PIPELINE_THREADS', 8)), thread_name_prefix='pipeline')
+
+# Turned away by admission control, the client should come back later
+def overloaded(e: Overloaded):
+    return jsonify({'message': str(e), 'overloaded': True, 'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+
+def server_sent_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Like /process, but as Server-Sent Events. While the solver runs, the
+# graph is drawn with the sheet's own dates and sent as a 'provisional'
+# event, and every better schedule the solver finds is sent as an
+# 'incumbent' event with its makespan, bound and gap. The scheduled render
+# follows as 'final', 'error' if it failed, or 'cancelled' if a newer
+# submission took over. A provisional render that isn't ready before the
+# solve is done is never sent. Closing the connection cancels the job;
+# comments go out every HEARTBEAT seconds so that's noticed mid-solve.
+# When the solver's queue is already full the stream isn't started at
+# all, it's a 503 like /process; if the wait for a turn runs out once
+# started, that's an 'error' with retry_after.
+HEARTBEAT = 1.0
+
+@app.route('/process/stream', methods=['POST'])
+def process_stream():
+    if get_admission().full():
+        return overloaded(Overloaded("The solver is busy, try again shortly", get_admission().retry_after()))
+    options = request.get_json()
+    user = get_user_id()
+    profile_final = profiling()
+
+    def provisional(tasks: TaskTable, metadata: Metadata):
+        with span('provisional'):
+            return render_request(build_graph(tasks, metadata), options, [])
+
+    # The profile, if asked for, is of this thread, which does the solve
+    def final(job: jobs.Job, tasks: TaskTable, metadata: Metadata, notifications: list[Notification]):
+        outcome, profile = run_profiled(profile_final, solve_request, job, options['content'], tasks, metadata, options, notifications)
+        return outcome.key, outcome.svg, outcome.extra, profile
+
+    def events():
+        notifications: list[Notification] = list()
+        updates: queue.Queue = queue.Queue()
+        job: Optional[jobs.Job] = None
+        trace = Trace()
+        finished = False
+        outcome = 'error'
+        try:
+            with trace.running():
+                tasks, metadata = parse_request(options['content'])
+            job = jobs.start(user, SolveProgress(lambda incumbent: updates.put(('incumbent', incumbent))))
+            # Scheduling writes into tasks, the provisional render gets its own
+            pipeline.submit(job.run, trace.run, provisional, tasks.copy(), metadata).add_done_callback(lambda f: updates.put(('provisional', f)))
+            pipeline.submit(job.run, trace.run, final, job, tasks, metadata, notifications).add_done_callback(lambda f: updates.put(('final', f)))
+            while True:
+                try:
+                    event, update = updates.get(timeout=HEARTBEAT)
+                except queue.Empty:
+                    yield ': still working\n\n'
+                    continue
+                if event == 'incumbent':
+                    yield server_sent_event('incumbent', dataclasses.asdict(update))
+                elif event == 'provisional':
+                    if update.exception() is None:
+                        yield server_sent_event('provisional', render_response(*update.result(), options, []))
+                else:
+                    finished = True
+                    key, svg, extra, profile = update.result()
+                    response = render_response(key, svg, extra, options, notifications)
+                    response['timings'] = trace.to_dict()
+                    if profile is not None:
+                        response['profile'] = profile
+                    outcome = 'ok'
+                    yield server_sent_event('final', response)
+                    break
+        except jobs.Cancelled as e:
+            finished = True
+            outcome = 'cancelled'
+            yield server_sent_event('cancelled', {'message': str(e)})
+        except Overloaded as e:
+            finished = True
+            outcome = 'overloaded'
+            yield server_sent_event('error', {'message': str(e), 'overloaded': True, 'retry_after': e.retry_after,
+                                              'notifications': [n.to_dict() for n in notifications]})
+        except Exception as e:
+            finished = True
+            log.exception("Caught exception %s", e)
+            yield server_sent_event('error', {'message': str(e), 'notifications': [n.to_dict() for n in notifications],
+                                              'timings': trace.to_dict()})
+        finally:
+            if job is not None:
+                # Still going means the client stopped listening
+                if not finished:
+                    outcome = 'gone'
+                    job.cancel("The client went away")
+                jobs.finish(job)
+            trace.finish('process_stream', outcome, user=user)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Good enough: stops the user's solve, which then finishes with the best
+# schedule found so far
+@app.route('/process/stop', methods=['POST'])
+def process_stop():
+    job = jobs.get(get_user_id())
+    if job is not None:
+        job.progress.stop()
+    return jsonify({'stopped': job is not None})
+
+# Numbers kept elsewhere, read at scrape time
+metrics.collector('fantasia_svg_cache', 'Rendered SVG cache', lambda: get_svg_cache().stats())
+metrics.collector('fantasia_layout_cache', 'Graph layout cache', lambda: get_layout_cache().stats())
+metrics.collector('fantasia_plan_store', 'Plans kept for copying out', lambda: get_plan_store().stats())
+metrics.collector('fantasia_snapshot_store', 'Snapshots kept for incremental runs', lambda: get_snapshot_store().stats())
+metrics.collector('fantasia_in_flight', 'Work in progress', lambda: {'jobs': len(jobs.active), 'flights': len(flights)})
+metrics.collector('fantasia_admission', 'Solver admission control', lambda: get_admission().stats())
+
+# Everything this process has counted, for Prometheus to scrape. Each
+# worker counts for itself, so scrape them individually.
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+# Encodings we can compress with, in order of preference
+def compressors() -> list[Tuple[str, Callable[[bytes], bytes]]]:
+    ret = [('gzip', lambda b: gzip.compress(b, compresslevel=6))]
+    if brotli is not None:
+        ret.insert(0, ('br', lambda b: brotli.compress(b, quality=5)))
+    return ret
+
+# A render by its key. The key is a hash of the DOT the SVG came from, so
+# the content behind a URL never changes and the ETag is just the key
+# ( per encoding, since each encoding is a different body ).
+@app.route('/svg/<key>', methods=['GET'])
+def get_svg(key: str):
+    encoding, compress = next(((e, c) for e, c in compressors() if e in request.accept_encodings), ('identity', None))
+    etag = key if compress is None else f"{key}.{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        svg = cached_svg(key)
+        if svg is None:
+            return jsonify({'message': f"No render {key}, it may have been evicted"}), 404
+        response = Response(svg if compress is None else compress(svg), mimetype='image/svg+xml')
+        if compress is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
 
 if __name__ == '__main__':
+    configure_logging()
     app.run(host='0.0.0.0', port=int(os.environ.get('FANTASIA_PORT', 5000)), debug=True)
@@ -0,0 +1,50 @@
+from concurrent.futures import Future, wait
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .metrics import counter
+
+# Single flight: whoever asks for a key while a call for it is already
+# running waits for that call and shares its result, rather than making
+# the same call again. Nothing is kept once the call is done, so this only
+# saves work for callers which overlap.
+
+coalesced = counter('fantasia_coalesced_total', 'Requests which shared a result already being computed for someone else')
+
+class SingleFlight:
+    # poll is how often, in seconds, waiting callers run their check
+    def __init__(self, poll: float = 0.1):
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.flights: Dict[str, Future] = dict()
+
+    # Returns fn's result, and whether it came from another caller's call.
+    # check is run now and then while waiting, and can raise to give up.
+    def do(self, key: str, fn: Callable[[], Any], check: Optional[Callable[[], None]] = None) -> Tuple[Any, bool]:
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Future()
+
+        if not leader:
+            coalesced.inc()
+            while not wait([flight], timeout=self.poll).done:
+                if check is not None:
+                    check()
+            return flight.result(), True
+
+        try:
+            result = fn()
+            flight.set_result(result)
+            return result, False
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.flights)
@@ -0,0 +1,209 @@
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+from .types import TaskTable, InputTask, Edge
+
+# Integer CSR adjacency over the rows of a TaskTable. Edge e goes from
+# src[e] to succ[e]; edges are grouped by source, so the successors of u are
+# succ[succ_offsets[u]:succ_offsets[u + 1]]. Per edge data lives in arrays
+# indexed by e rather than in dicts.
+class Graph:
+    __slots__ = ('tasks', 'succ_offsets', 'succ', 'src', 'pred_offsets', 'pred', 'pred_edges', 'slack', 'critical', 'analysis')
+
+    def __init__(self, tasks: TaskTable):
+        self.tasks = tasks
+        n = len(tasks)
+
+        # Drop duplicate edges ( a task listed twice in next )
+        src = np.repeat(np.arange(n, dtype=np.int64), np.diff(tasks.succ_offsets))
+        keys = np.unique(src * max(n, 1) + tasks.succ_rows)
+        self.src = (keys // max(n, 1)).astype(np.int32)
+        self.succ = (keys % max(n, 1)).astype(np.int32)
+        self.succ_offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.src, minlength=n), out=self.succ_offsets[1:])
+
+        # Same edges grouped by destination
+        self.pred_edges = np.argsort(self.succ, kind='stable').astype(np.int32)
+        self.pred = self.src[self.pred_edges]
+        self.pred_offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.succ, minlength=n), out=self.pred_offsets[1:])
+
+        # int; the number of business days difference between the task's end date and the start of the next.
+        self.slack = np.zeros(len(self.succ), dtype=np.int64)
+        # bool; True if this edge is on the critical path.
+        self.critical = np.zeros(len(self.succ), dtype=bool)
+        self.analysis: Optional[Analysis] = None
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def __iter__(self) -> Iterator[InputTask]:
+        return iter(self.tasks)
+
+    def num_edges(self) -> int:
+        return len(self.succ)
+
+    def successors(self, u: int) -> np.ndarray:
+        return self.succ[self.succ_offsets[u]:self.succ_offsets[u + 1]]
+
+    def predecessors(self, v: int) -> np.ndarray:
+        return self.pred[self.pred_offsets[v]:self.pred_offsets[v + 1]]
+
+    # Yields ( u, v, edge index )
+    def edges(self) -> Iterator[Tuple[int, int, int]]:
+        return zip(self.src.tolist(), self.succ.tolist(), range(len(self.succ)))
+
+    def edge(self, u: int, v: int) -> Optional[int]:
+        start = self.succ_offsets[u]
+        i = np.searchsorted(self.successors(u), v)
+        return int(start + i) if start + i < self.succ_offsets[u + 1] and self.succ[start + i] == v else None
+
+    # Kahn's algorithm, breaking ties by row. If the graph has a cycle the
+    # order stops short of len(self).
+    def topological_order(self) -> np.ndarray:
+        return self.analyze().order
+
+    # Returns the edges of a cycle if the graph contains any
+    def find_cycle(self) -> Optional[list[Tuple[int, int]]]:
+        return self.analyze().cycle
+
+    # The heaviest path where each edge weighs the estimate of its source task.
+    # Returns its length and rows. Assumes the graph is acyclic.
+    def longest_path(self) -> Tuple[int, list[int]]:
+        a = self.analyze()
+        return a.longest_path, a.critical_path
+
+    # Everything derived from the topology is computed once in a single
+    # Kahn pass and kept; only slack depends on the dates, which the
+    # scheduler changes, so it's refreshed on every call
+    def analyze(self) -> 'Analysis':
+        if self.analysis is None:
+            self.analysis = analyze(self)
+        self.update_slack()
+        return self.analysis
+
+    # Fill in slack for every edge where both ends have the relevant dates
+    def update_slack(self) -> None:
+        ends, starts = self.tasks.ends[self.src], self.tasks.starts[self.succ]
+        dated = ~np.isnat(ends) & ~np.isnat(starts)
+        self.slack[:] = 0
+        self.slack[dated] = np.busday_count(ends[dated], starts[dated])
+
+    # Mask of rows reachable from any of rows ( including themselves ),
+    # following predecessors instead if reverse
+    def reachable(self, rows, reverse: bool = False) -> np.ndarray:
+        offsets, adjacent = (self.pred_offsets, self.pred) if reverse else (self.succ_offsets, self.succ)
+        offsets, adjacent = offsets.tolist(), adjacent.tolist()
+        seen = [False] * len(self)
+        stack = [int(r) for r in rows]
+        for r in stack:
+            seen[r] = True
+        while stack:
+            u = stack.pop()
+            for v in adjacent[offsets[u]:offsets[u + 1]]:
+                if not seen[v]:
+                    seen[v] = True
+                    stack.append(v)
+        return np.array(seen, dtype=bool)
+
+    # Adapter for anything that still wants networkx; nodes are task views
+    def to_networkx(self):
+        import networkx as nx
+        nodes = list(self.tasks)
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        for u, v, e in self.edges():
+            G.add_edge(nodes[u], nodes[v], **{
+                Edge.weight   : nodes[u].estimate,
+                Edge.slack    : int(self.slack[e]),
+                Edge.critical : bool(self.critical[e])
+            })
+        return G
+
+@dataclass
+class Analysis:
+    # Rows in topological order, short of every row if there's a cycle
+    order: np.ndarray
+    # Edges ( as row pairs ) of a cycle, None if the graph is acyclic. Nothing
+    # below is meaningful when this is set.
+    cycle: Optional[list[Tuple[int, int]]]
+    # Earliest and latest start of each row in days from the project start,
+    # ignoring people and dates, such that the project takes makespan days
+    earliest: np.ndarray
+    latest: np.ndarray
+    makespan: int
+    # The heaviest path, where each edge weighs the estimate of its source task
+    longest_path: int
+    critical_path: list[int]
+    total_work: int
+    parallelism_ratio: float
+    # Per edge business days between the end of its source and the start of
+    # its destination ( the graph's own array )
+    slack: np.ndarray
+
+# Walking predecessors among the rows Kahn couldn't reach must come back
+# around, since each of them still has an unreached predecessor. Returns
+# the cycle starting from its lowest row.
+def walk_cycle(G: Graph, order: list[int]) -> list[Tuple[int, int]]:
+    unreached = np.ones(len(G), dtype=bool)
+    unreached[order] = False
+    seen: dict[int, int] = {}
+    v = int(np.flatnonzero(unreached)[0])
+    path = []
+    while v not in seen:
+        seen[v] = len(path)
+        path.append(v)
+        preds = G.predecessors(v)
+        v = int(preds[unreached[preds]][0])
+    cycle = path[seen[v]:][::-1]
+    first = cycle.index(min(cycle))
+    cycle = cycle[first:] + cycle[:first]
+    return list(zip(cycle, cycle[1:] + cycle[:1]))
+
+# One Kahn pass; earliest starts and longest path parents are relaxed as
+# each row is popped, then latest starts are filled walking the order back
+def analyze(G: Graph) -> Analysis:
+    n = len(G)
+    weights = G.tasks.estimates.tolist()
+    total_work = sum(weights)
+    indegree = np.bincount(G.succ, minlength=n).tolist()
+    offsets, succ = G.succ_offsets.tolist(), G.succ.tolist()
+
+    earliest = [0] * n
+    # -1 until some predecessor relaxes the row
+    parent = [-1] * n
+    order = [u for u in range(n) if indegree[u] == 0]
+    for u in order:
+        reach = earliest[u] + weights[u]
+        for v in succ[offsets[u]:offsets[u + 1]]:
+            if parent[v] == -1 or reach > earliest[v]:
+                earliest[v] = reach
+                parent[v] = u
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                order.append(v)
+
+    if len(order) < n:
+        empty = np.zeros(0, dtype=np.int64)
+        return Analysis(np.array(order, dtype=np.int32), walk_cycle(G, order),
+                        empty, empty, 0, 0, [], total_work, 0, G.slack)
+
+    makespan = max((earliest[u] + weights[u] for u in order), default=0)
+    latest = [0] * n
+    for u in reversed(order):
+        latest[u] = min((latest[v] for v in succ[offsets[u]:offsets[u + 1]]), default=makespan) - weights[u]
+
+    critical_path = []
+    if order:
+        v = max(order, key=lambda v: earliest[v])
+        critical_path.append(v)
+        while parent[v] != -1:
+            v = parent[v]
+            critical_path.append(v)
+    longest_path = earliest[critical_path[0]] if critical_path else 0
+
+    return Analysis(np.array(order, dtype=np.int32), None,
+                    np.array(earliest, dtype=np.int64), np.array(latest, dtype=np.int64), makespan,
+                    longest_path, critical_path[::-1], total_work,
+                    total_work / longest_path if longest_path else 0, G.slack)
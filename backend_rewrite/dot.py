@@ -1,14 +1,14 @@
 import base64
+from .render import render
+from .layout import render_restyled, restyle_enabled
 from datetime import datetime
-from typing import Dict
-import subprocess
-import tempfile
-import os
+from typing import Dict, Optional, Tuple
 
-from .dateutil import busdays_between
-import textwrap
 import html
 from .types import *
+from .dag import Graph
+from .style import Cell, table_border, node_rows, edge_style
+from .trace import annotate, span
 
 def title_format(title):
     return '<FONT POINT-SIZE="14">' + title + '</FONT>'
@@ -36,81 +36,53 @@ def style_text(text, **kwargs):
 # late -- same as active
 # contended -- cant happen anymore
 
+def dot_cell(cell: Cell, title: bool, critical: bool) -> str:
+    text = '<br/>'.join(html.escape(line) for line in cell.lines)
+    if title:
+        text = title_format(style_text(text, bold = critical))
+    colspan = f" colspan='{cell.colspan}'" if cell.colspan > 1 else ''
+    return f"<td color='black' bgcolor='{cell.bgcolor}'{colspan}>{text}</td>"
+
+# The table itself comes from style.node_rows, so the restyled drawing in
+# layout.py matches it
 def dot_task(task: InputTask, decoration: Decoration):
-    wrap_desc      = '<br/>'.join(textwrap.wrap(html.escape(task.description), width=70))
-    title          = title_format(style_text(task.name, bold = decoration.critical))
-
-    start_date     = style_text(task.start_date)
-    start_color    = 'white'
-
-    end_date       = style_text(f'{task.end_date}')
-    end_color      = 'white'
-
-    estimate       = style_text(f"{task.estimate}d")
-    estimate_color = 'white'
-
-    border_width = 2
-    border_color = 'black'
-    today = datetime.now().date()
-    if task.end_date and today > task.end_date:
-        border_width = 4
-        border_color = 'red'
-    # As long as it's in progress it's OK
-    elif task.start_date and today >= task.start_date:
-        if task.status != Status.InProgress:
-            border_width = 4
-            border_color = 'red'
-        else:
-            border_width = 4
-            border_color = 'lightgreen'
-    elif task.start_date and busdays_between(today, task.start_date) <= SOON_THRESHOLD:
-        border_width = 4
-        border_color = 'lightyellow'
-
-    assignees = ''
-    if len(task.assignees) > 0:
-        assignees = ', '.join(task.assignees)
-    assignee_color = 'white'
-    # Milestones are tasks with zero days estimated effort.
-    if task.estimate == 0:
-        return (
-            f"{task.scheduler_fields.id} [label=<"
-            f"<table border='1' cellborder='1' cellspacing='0'><tr><td>{title}</td></tr>"
-            f"<tr><td bgcolor='{end_color}'>{end_date}</td></tr>"
-            f"<tr><td bgcolor='#FFD580'> {wrap_desc}</td></tr></table>"
-            f">];"
-        )
-
-    # A regular task.
-    match task.status:
-        case Status.Completed:
-            return (
-                f"{task.scheduler_fields.id} [label=<"
-                f"<table border='1' color='lightblue' cellborder='1' cellspacing='0'><tr><td color='black' bgcolor='lightblue'>{title} (done)</td></tr>"
-                f"<tr><td color='black' bgcolor='{end_color}'>{end_date}</td></tr></table>"
-                f">];"
-            )
-        case Status.NotStarted:
-            return (
-                f"{task.scheduler_fields.id} [label=<"
-                f"<table border='{border_width}' color='{border_color}' cellborder='1' cellspacing='0'><tr><td color='black' colspan='2'>{title}</td></tr>"
-                f"<tr><td color='black' bgcolor='{start_color}'>{start_date}</td><td color='black' bgcolor='{end_color}'>{end_date}</td></tr>"
-                f"<tr><td color='black' bgcolor='{assignee_color}'>{assignees}</td><td color='black' bgcolor='{estimate_color}'>{estimate}</td></tr>"
-                f"<tr><td color='black' colspan='2'>{wrap_desc}</td></tr></table>"
-                f">];"
-            )
-        case _:
-            status_color = 'red' if task.status == 'blocked' else 'lightgreen' if task.status == 'in progress' else 'white'
-            return (
-                f"{task.scheduler_fields.id} [label=<"
-                f"<table border='{border_width}' color='{border_color}' cellborder='1' cellspacing='0'><tr><td color='black' colspan='3' bgcolor='{status_color}'>{title}</td></tr>"
-                f"<tr><td color='black' bgcolor='{start_color}'>{start_date}</td><td color='black' bgcolor='{status_color}'>{task.status}</td><td color='black' bgcolor='{end_color}'>{end_date}</td></tr>"
-                f"<tr><td color='black' bgcolor='{assignee_color}' colspan='2'>{assignees}</td><td color='black' bgcolor='{estimate_color}'>{estimate}</td></tr>"
-                f"<tr><td color='black' colspan='3'>{wrap_desc}</td></tr></table>"
-                f">];"
-            )
-
-def generate_dot_file(G, decorations: Dict[InputTask, Decoration]):
+    border_width, border_color = table_border(task, datetime.now().date())
+    rows = ''.join('<tr>' + ''.join(dot_cell(cell, r == 0, decoration.critical) for cell in row) + '</tr>'
+                   for r, row in enumerate(node_rows(task)))
+    return (
+        f"{task.row} [label=<"
+        f"<table border='{border_width}' color='{border_color}' cellborder='1' cellspacing='0'>{rows}</table>"
+        f">];"
+    )
+
+# Node fragments from the last render, so nodes that didn't change between
+# two submissions aren't formatted again. Only what the latest render
+# used is kept.
+class FragmentCache:
+    def __init__(self):
+        self.previous: Dict[tuple, str] = dict()
+        self.current: Dict[tuple, str] = dict()
+
+    def get(self, key: tuple, make) -> str:
+        fragment = self.current.get(key)
+        if fragment is None:
+            fragment = self.previous.get(key)
+            if fragment is None:
+                fragment = make()
+            self.current[key] = fragment
+        return fragment
+
+    # Call once a render is done
+    def rotate(self) -> None:
+        self.previous, self.current = self.current, dict()
+
+# Everything dot_task reads, including today since it drives the borders
+def fragment_key(task: InputTask, decoration: Decoration, today) -> tuple:
+    t = task.table
+    return (task.row, task.name, t.descriptions[task.row], int(t.estimates[task.row]), t.starts[task.row],
+            t.ends[task.row], int(t.statuses[task.row]), tuple(task.assignees), decoration.critical, today)
+
+def generate_dot_file(G: Graph, decorations: list[Decoration], fragments: Optional[FragmentCache] = None):
     # Graph top-level.
     dot_file = (
         'digraph Items {\n'
@@ -120,41 +92,31 @@ def generate_dot_file(G, decorations: Dict[InputTask, Decoration]):
     )
 
     # Write out all task nodes.
-    dot_file += '\n'.join([dot_task(task, decorations[task]) for task in G.nodes])
+    if fragments is None:
+        dot_file += '\n'.join([dot_task(task, decorations[task.row]) for task in G])
+    else:
+        today = datetime.now().date()
+        dot_file += '\n'.join([fragments.get(fragment_key(task, decorations[task.row], today),
+                                             lambda: dot_task(task, decorations[task.row])) for task in G])
+        fragments.rotate()
 
     # Add in the edges.
-    for u, v, edge in G.edges(data=True):
-        color = 'gray'
-        width = 1
-        label = ''
-        if edge[Edge.critical]:
-            color = 'black'
-            width = 4        
-        if edge[Edge.slack] > 0:
-            label = f"+{edge[Edge.slack]}d"
-        elif edge[Edge.slack] < 0:
-            color = 'red'
-            label = f"late {abs(edge[Edge.slack])}d"            
-        dot_file += f"{u.scheduler_fields.id} -> {v.scheduler_fields.id} [color={color}, penwidth={width}, label=\"{label}\"];\n"
+    for u, v, e in G.edges():
+        color, width, label = edge_style(G, e)
+        dot_file += f"{u} -> {v} [color={color}, penwidth={width}, label=\"{label}\"];\n"
 
     dot_file += '}\n'
     return dot_file
 
+# Generate dot content and render it, returning the render key and the SVG
+def render_graph(G, decorations, fragments: Optional[FragmentCache] = None) -> Tuple[str, bytes]:
+    with span('dot'):
+        dot = generate_dot_file(G, decorations, fragments)
+        annotate(bytes=len(dot))
+    if restyle_enabled():
+        return render_restyled(dot, G, decorations)
+    return render(dot)
+
 # Generate dot content and return b64 encoded representation
-def generate_svg_graph(G, decorations):
-    dot_content = generate_dot_file(G, decorations)
-    
-    # Save dot_content to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.dot') as dotfile:
-        dotfile_path = dotfile.name
-        dotfile.write(dot_content)
-
-    # Define the output PNG file path
-    output_svg_path = dotfile_path + '.svg'
-
-    # Call Graphviz dot to render PNG
-    print(output_svg_path)
-    dot_path = os.getenv('DOT_PATH', 'dot')
-    subprocess.run([dot_path, '-Tsvg', dotfile_path, '-o', output_svg_path], check=True)
-    with open(output_svg_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+def generate_svg_graph(G, decorations, fragments: Optional[FragmentCache] = None):
+    return base64.b64encode(render_graph(G, decorations, fragments)[1]).decode('utf-8')
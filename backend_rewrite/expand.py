@@ -1,86 +1,106 @@
 from typing import Dict, Tuple
-from copy import deepcopy
-from backend_rewrite.types import InputTask
+import numpy as np
+from backend_rewrite.types import TaskTable, NO_DATE, csr_take, csr_concat
 
-def expand_parallelizable_tasks(tasks: list[InputTask]) -> Tuple[list[InputTask], Dict[InputTask, list[InputTask]]]:
-    # Handle assigning start and end dates properly in this case
-    ret = []
-    ret.extend(tasks)
-    original_to_subtasks: Dict[InputTask, list[InputTask]] = dict()
-    tasks_to_add = []
+# Both expansions keep the original rows at the front and append the new
+# ones, so they're a gather of source rows followed by overriding a few
+# columns. Descriptions are immutable and shared, never copied.
+def take_rows(tasks: TaskTable, rows: np.ndarray, task_ids: np.ndarray, estimates: np.ndarray,
+              starts: np.ndarray, ends: np.ndarray, next, assignees) -> TaskTable:
+    descriptions = tasks.descriptions
+    return TaskTable(tasks.registry, task_ids, [descriptions[r] for r in rows.tolist()], tasks.specific[rows],
+                     tasks.parallelizable[rows], estimates, starts, ends, tasks.statuses[rows],
+                     tasks.input_rows[rows], next, assignees, tasks.group_ids[rows])
 
-    for t in tasks:
-        if t.parallelizable:
-            print(f"Splitting parallel {t.name} with start {t.start_date} end {t.end_date}")
-            original_to_subtasks[t] = []
-            assert t.estimate and t.estimate >= 2
-            original_estimate = t.estimate
-            original_end = t.end_date
+# Maps each expanded row to the rows appended for it
+def subtask_rows(expanded: np.ndarray, counts: np.ndarray, n: int) -> Dict[int, list[int]]:
+    ends = n + np.cumsum(counts)
+    return {row: list(range(end - count, end)) for row, count, end in zip(expanded.tolist(), counts.tolist(), ends.tolist())}
 
-            # Keep the start date, break the end / estimate
-            t.end_date = None
-            t.estimate = 1
-            original_next = t.next
-            last_t = t
-            id = 1
+# Returns a new task table, where the original rows keep their index
+# and chains are appended, as well as a dict which maps row indices back
+# to their subtask rows
+def expand_parallelizable_tasks(tasks: TaskTable) -> Tuple[TaskTable, Dict[int, list[int]]]:
+    n = len(tasks)
+    expanded = np.flatnonzero(tasks.parallelizable)
+    assert (tasks.estimates[expanded] >= 2).all()
+    # Each expanded task keeps its first day, and the rest of it becomes a chain of one day links
+    links = (tasks.estimates[expanded] - 1).astype(np.int64)
+    rows = np.concatenate([np.arange(n), np.repeat(expanded, links)])
+    added = len(rows) - n
 
-            for _ in range(original_estimate)[1:]:
-                t_copy = deepcopy(t)
-                t_copy.name = t_copy.name + f"_chain_{id}"
-                t_copy.estimate = 1
-                t_copy.start_date = None
-                t_copy.end_date = None
-                last_t.next = [t_copy.name]
-                tasks_to_add.append(t_copy)
-                last_t = t_copy
-                original_to_subtasks[t].append(t_copy)
-                id += 1
-            
-            last_t.end_date = original_end
-            last_t.next = original_next
+    # Position of each link in its chain, and whether it's the last one
+    first = np.cumsum(links) - links
+    position = np.arange(added) - np.repeat(first, links)
+    last = np.zeros(added, dtype=bool)
+    last[np.cumsum(links) - 1] = True
 
-    ret.extend(tasks_to_add)
-    return ret, original_to_subtasks
+    r = tasks.registry
+    names = tasks.names
+    link_ids = np.array([r.tasks.intern(f"{names[row]}_chain_{k + 1}") for row, k in zip(rows[n:].tolist(), position.tolist())],
+                        dtype=np.int32)
+    task_ids = np.concatenate([tasks.task_ids, link_ids])
 
+    # Keep the start date, break the end / estimate
+    estimates = tasks.estimates[rows]
+    estimates[expanded] = 1
+    estimates[n:] = 1
+    starts = tasks.starts[rows]
+    starts[n:] = NO_DATE
+    ends = tasks.ends[rows]
+    ends[expanded] = NO_DATE
+    ends[n:][~last] = NO_DATE
 
-# Returns a new list of input tasks as well as a dict which
-# maps tasks back to their parent task where applicable
-def expand_specific_tasks(tasks: list[InputTask]) -> Tuple[list[InputTask], Dict[InputTask, list[InputTask]]]:
-    ret = []
-    ret.extend(tasks)
-    tasks_to_add = []
+    # Expanded tasks point at their first link, links at the one after,
+    # and the last link takes over the original next
+    following = np.full(len(rows), -1, dtype=np.int32)
+    following[expanded] = link_ids[first]
+    following[n:][~last] = link_ids[1:][~last[:-1]]
+    next = csr_take(tasks.next_offsets, tasks.next_ids, rows, following)
 
-    # task name to subtasks
-    original_to_subtasks: Dict[InputTask, list[InputTask]] = dict()
+    lowered = take_rows(tasks, rows, task_ids, estimates, starts, ends, next,
+                        csr_take(tasks.assignee_offsets, tasks.assignee_ids, rows))
+    return lowered, subtask_rows(expanded, links, n)
 
-    for t in tasks:
-        original_assignees = t.assignees
-        if t.specific_assignments and len(original_assignees) > 1:
-            original_to_subtasks[t] = []
-            # Update the base one to have n assignment of the first one
-            t.assignees = [original_assignees[0]]
-            # Add tasks spanning this time range for everyone else
-            # It should be OK for them to not be connected, since
-            # we did the dep-sensitive expansion first
-            id = 1
-            added = []
-            for a in original_assignees[1:]:
-                # For every assignment on this item, append another with the same start / end date.
-                # No need to capture deps since the ordering is captured by the original
-                t_copy = deepcopy(t)
-                t_copy.name = t_copy.name + f"_specific_{id}"
-                t_copy.assignees = [a]
-                added.append(t_copy)
-                original_to_subtasks[t].append(t_copy)
-                id += 1
-            tasks_to_add.extend(added)
+# Returns a new task table, where the original rows keep their index
+# and copies are appended, as well as a dict which maps row indices
+# back to their subtask rows
+def expand_specific_tasks(tasks: TaskTable) -> Tuple[TaskTable, Dict[int, list[int]]]:
+    n = len(tasks)
+    counts = np.diff(tasks.assignee_offsets)
+    expanded = np.flatnonzero(tasks.specific & (counts > 1))
+    # One copy for everyone past the first assignee
+    copies = (counts[expanded] - 1).astype(np.int64)
+    rows = np.concatenate([np.arange(n), np.repeat(expanded, copies)])
+    added = len(rows) - n
+    position = np.arange(added) - np.repeat(np.cumsum(copies) - copies, copies)
 
-    # Anything which had any of my expanded tasks as next should
-    # include the new ones as well
-    ret.extend(tasks_to_add) 
-    for t in ret:
-        for n in t.next:
-            for s in original_to_subtasks.get(n, []):
-                t.next.append(s.name)
+    r = tasks.registry
+    names = tasks.names
+    copy_ids = np.array([r.tasks.intern(f"{names[row]}_specific_{k + 1}") for row, k in zip(rows[n:].tolist(), position.tolist())],
+                        dtype=np.int32)
+    task_ids = np.concatenate([tasks.task_ids, copy_ids])
 
-    return ret, original_to_subtasks
+    # Everyone expanded keeps exactly one assignee: the base the first, copy k the k + 1th
+    single = np.full(len(rows), -1, dtype=np.int32)
+    single[expanded] = tasks.assignee_ids[tasks.assignee_offsets[expanded]]
+    single[n:] = tasks.assignee_ids[tasks.assignee_offsets[rows[n:]] + position + 1]
+    assignees = csr_take(tasks.assignee_offsets, tasks.assignee_ids, rows, single)
+
+    # Anything which had any of my expanded tasks as next should include
+    # the new ones as well. Copies are keyed by task id since next refers to
+    # names; later rows with a duplicate name win, like TaskTable.rows
+    ids = tasks.task_ids[rows[n:]]
+    owned = tasks.rows[ids] == rows[n:]
+    id_offsets = np.zeros(len(tasks.rows) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(ids[owned], minlength=len(tasks.rows)), out=id_offsets[1:])
+    id_copies = np.empty(id_offsets[-1], dtype=np.int32)
+    id_copies[id_offsets[ids[owned]] + position[owned]] = copy_ids[owned]
+    # Copies of every next entry, regrouped by the row the entry belongs to
+    extra_offsets, extra = csr_take(id_offsets, id_copies, tasks.next_ids)
+    expanded_next = csr_concat((tasks.next_offsets, tasks.next_ids), (extra_offsets[tasks.next_offsets], extra))
+    next = csr_take(*expanded_next, rows)
+
+    lowered = take_rows(tasks, rows, task_ids, tasks.estimates[rows], tasks.starts[rows], tasks.ends[rows],
+                        next, assignees)
+    return lowered, subtask_rows(expanded, copies, n)
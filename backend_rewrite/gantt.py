@@ -0,0 +1,124 @@
+from datetime import datetime
+from html import escape
+from typing import Dict, Iterator, Tuple
+import numpy as np
+
+from .dag import Graph
+from .render import SvgCache, get_svg_cache
+from .style import edge_style, status_color
+from .types import Decoration, Status, to_datetime64
+
+# The scheduled plan as a timeline: a lane per person, a bar per task
+# from its start to its end, arrows for dependencies and the critical
+# chain drawn heavier. It's drawn straight from the schedule without any
+# layout step, in a single pass over tasks and edges, so it stays fast
+# for sheets far too big for dot.
+
+DAY = 24        # pixels per business day
+LANE = 28       # pixels per person
+LABELS = 140    # width of the names down the left
+HEADER = 32     # height of the dates along the top
+FONT = 'Calibri,sans-serif'
+UNASSIGNED = 'Unassigned'
+
+def gantt(G: Graph, decorations: list[Decoration]) -> Iterator[str]:
+    tasks = G.tasks
+    dated = ~np.isnat(tasks.starts) & ~np.isnat(tasks.ends)
+    if not dated.any():
+        yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="400" height="40">'
+               f'<text x="10" y="24" font-family="{FONT}" font-size="14">Nothing is scheduled yet</text></svg>')
+        return
+
+    # Offsets in business days from the first start
+    origin = tasks.starts[dated].min()
+    starts = np.zeros(len(tasks), dtype=np.int64)
+    ends = np.zeros(len(tasks), dtype=np.int64)
+    starts[dated] = np.busday_count(origin, tasks.starts[dated])
+    ends[dated] = np.busday_count(origin, tasks.ends[dated])
+    days = int(ends[dated].max()) + 1
+
+    rows = np.flatnonzero(dated).tolist()
+    people = {row: tasks.assignee_names(row) or [UNASSIGNED] for row in rows}
+    lanes: Dict[str, int] = {name: lane for lane, name in enumerate(sorted({p for names in people.values() for p in names}))}
+    width = LABELS + days * DAY + DAY
+    height = HEADER + len(lanes) * LANE
+
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+           f'font-family="{FONT}">\n'
+           '<defs>'
+           '<marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="6" markerHeight="6" orient="auto-start-reverse">'
+           '<path d="M0,0L10,5L0,10z" fill="context-stroke"/></marker>'
+           '</defs>\n'
+           f'<rect width="100%" height="100%" fill="white"/>\n')
+
+    # Lanes, shaded every other one
+    for name, lane in lanes.items():
+        y = HEADER + lane * LANE
+        if lane % 2:
+            yield f'<rect x="0" y="{y}" width="{width}" height="{LANE}" fill="#f4f4f4"/>\n'
+        yield f'<text x="6" y="{y + LANE / 2}" dominant-baseline="central" font-size="12">{escape(name)}</text>\n'
+
+    # A date every week along the top, and today if it's in range
+    for day in range(0, days, 5):
+        x = LABELS + day * DAY
+        date = np.busday_offset(origin, day)
+        yield (f'<line x1="{x}" y1="{HEADER - 6}" x2="{x}" y2="{height}" stroke="#dddddd"/>'
+               f'<text x="{x + 2}" y="{HEADER - 10}" font-size="11">{date}</text>\n')
+    today = to_datetime64(datetime.now().date())
+    if origin <= today <= np.busday_offset(origin, days - 1, roll='forward'):
+        x = LABELS + int(np.busday_count(origin, today)) * DAY
+        yield f'<line x1="{x}" y1="{HEADER - 6}" x2="{x}" y2="{height}" stroke="red" stroke-dasharray="4 3"/>\n'
+
+    # Dependencies go from the end of a task to the start of the next,
+    # between the first lane of each
+    def anchor(row: int) -> float:
+        return HEADER + lanes[people[row][0]] * LANE + LANE / 2
+    for u, v, e in G.edges():
+        if not (dated[u] and dated[v]):
+            continue
+        color, pen, _ = edge_style(G, e)
+        x1, x2 = LABELS + int(ends[u]) * DAY, LABELS + int(starts[v]) * DAY
+        y1, y2 = anchor(u), anchor(v)
+        if x2 >= x1 + 12:
+            path = f"M{x1},{y1}H{(x1 + x2) // 2}V{y2}H{x2}"
+        elif y1 != y2:
+            # No room in between, so come into the top or bottom of the next bar
+            path = f"M{x1},{y1}H{x2 + 6}V{y2 - (LANE / 2 - 4) if y2 > y1 else y2 + (LANE / 2 - 4)}"
+        else:
+            # Back to back in a lane, which shows the dependency well enough
+            continue
+        yield (f'<path d="{path}" fill="none" stroke="{color}" '
+               f'stroke-width="{min(pen, 2)}" marker-end="url(#arrow)"/>\n')
+
+    # A bar per task in the lane of everyone on it
+    for row in rows:
+        task = tasks[row]
+        critical = decorations[row].critical
+        stroke = 'stroke="black" stroke-width="2"' if critical else 'stroke="gray"'
+        fill = 'lightblue' if task.status == Status.Completed else status_color(task)
+        title = f'<title>{escape(task.name)}: {task.start_date} to {task.end_date}</title>'
+        x = LABELS + int(starts[row]) * DAY
+        span = int(ends[row] - starts[row]) * DAY
+        for name in people[row]:
+            y = HEADER + lanes[name] * LANE
+            # Milestones take no time, so they're a diamond
+            if span == 0:
+                m = LANE / 2
+                yield (f'<polygon points="{x},{y + 4} {x + m - 4},{y + m} {x},{y + LANE - 4} {x - m + 4},{y + m}" '
+                       f'fill="#FFD580" {stroke}>{title}</polygon>\n')
+                continue
+            yield f'<g><rect x="{x}" y="{y + 4}" width="{span}" height="{LANE - 8}" rx="3" fill="{fill}" {stroke}/>{title}'
+            if span >= 2 * DAY:
+                weight = ' font-weight="bold"' if critical else ''
+                yield (f'<text x="{x + 4}" y="{y + LANE / 2}" dominant-baseline="central" font-size="11"{weight}>'
+                       f'{escape(task.name)}</text>')
+            yield '</g>\n'
+    yield '</svg>\n'
+
+# Draws the timeline and caches it like any other render
+def render_gantt(G: Graph, decorations: list[Decoration]) -> Tuple[str, bytes]:
+    svg = ''.join(gantt(G, decorations))
+    key = SvgCache.key(svg)
+    svg = svg.encode('utf-8')
+    get_svg_cache().put(key, svg)
+    return key, svg
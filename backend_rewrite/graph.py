@@ -1,107 +1,76 @@
 from typing import Dict
-from collections import defaultdict
-from dataclasses import dataclass
 from datetime import datetime
-import networkx as nx
+import numpy as np
 
 from .notification import Notification, Severity
 
-from .dateutil import busdays_between
-from .types import InputTask, Metadata, Edge, Decoration, SOON_THRESHOLD
+from .dag import Graph
+from .types import TaskTable, Metadata, Decoration, SOON_THRESHOLD
 
-# Build a networkx graph out of the parsed content
-def build_graph(task_list: list[InputTask], metadata: Metadata):
-    tasks = {}
-    edges = []
-    for task in task_list:
-        tasks[task.name] = task
-        for next_task in task.next:
-            edges.append((task.name, next_task))
-
-    # Build the graph itself, first adding nodes, then edges.
-    G = nx.DiGraph()
-    for task in tasks.values():
-        G.add_node(task)
-
-    for u, v in edges:
-        if u in tasks and v in tasks:
-            G.add_edge(tasks[u], tasks[v], **{
-                Edge.weight   : tasks[u].estimate,
-                Edge.slack    : 0,
-                Edge.critical : False
-            })
-
-    return G
-
-def merge_parallel(task: InputTask, subtasks: list[InputTask]):
-    # When recombining in parallel, this task start is necessarily
-    # earliest, but I need to take the max end date of any and sum the
-    # estimates
-    combined_estimate = 1 + len(subtasks)
+# Build the CSR graph over the parsed content
+def build_graph(tasks: TaskTable, metadata: Metadata) -> Graph:
+    return Graph(tasks)
 
+# When recombining in parallel, this task start is necessarily
+# earliest, but I need to take the max end date of any and sum the
+# estimates
+def merge_parallel(upper: TaskTable, lower: TaskTable, row: int, subtasks: list[int]):
+    upper.estimates[row] = 1 + len(subtasks)
     # All end dates must be populated at this point if the scheduling succeeded
-    combined_end_date = max([s.end_date for s in subtasks]) # type: ignore
-    task.estimate = combined_estimate
-    task.end_date = combined_end_date
-    print(f"Merged estimate {combined_estimate} and end date {combined_end_date.strftime('%Y-%m-%d')}")
+    upper.ends[row] = lower.ends[subtasks].max()
 
-def merge_specific(task: InputTask, subtasks: list[InputTask]):
-    # All have the same estimate, start, end, just merge assignments
-    for s in subtasks:
-        task.assignees.extend(s.assignees)
+# All have the same estimate, start, end, just merge assignments
+def merge_specific(lower: TaskTable, row: int, subtasks: list[int]) -> list[int]:
+    return lower.assignees(row).tolist() + [a for s in subtasks for a in lower.assignees(s).tolist()]
 
-# Merge the lower graph ( expanded ) onto the upper graph
-def merge_graphs(upper: nx.DiGraph, lower: nx.DiGraph,
-                 ts_specific: Dict[InputTask, list[InputTask]], 
-                 ts_parallelizable: Dict[InputTask, list[InputTask]]) -> None:
-    # Iterate through the upper graph and "collect" all of the assignments in the lower graph
+# Merge the lower table ( expanded ) onto the upper table. Expansion keeps
+# the upper rows at the front of the lower table.
+def merge_tables(upper: TaskTable, lower: TaskTable,
+                 ts_specific: Dict[int, list[int]], 
+                 ts_parallelizable: Dict[int, list[int]]) -> None:
+    n = len(upper)
+    upper.starts[:] = lower.starts[:n]
+    upper.ends[:] = lower.ends[:n]
+    upper.specific[:] = lower.specific[:n]
     # Do it in the reverse order they were expanded so we do ( parallel first )
-    for task in upper:
-        if task in ts_parallelizable:
-            subtasks = ','.join([t.name for t in ts_parallelizable[task]])
-            print(f"Merging a parallel task: {task.name} from [{subtasks}]")
-            merge_parallel(task, ts_parallelizable[task])
-    for task in upper:
-        if task in ts_specific:
-            subtasks = ','.join([t.name for t in ts_specific[task]])
-            print(f"Merging a specific task: {task.name}. [{subtasks}]")
-            merge_specific(task, ts_specific[task])
+    for row, subtasks in ts_parallelizable.items():
+        if row < n:
+            merge_parallel(upper, lower, row, subtasks)
+    upper.replace_assignees([merge_specific(lower, row, ts_specific.get(row, [])) for row in range(n)])
 
-def decorate_and_notify(G: nx.DiGraph, notifications: list[Notification]) -> Dict[InputTask, Decoration]:
-    ret: Dict[InputTask, Decoration] = dict()
+def decorate_and_notify(G: Graph, notifications: list[Notification]) -> list[Decoration]:
+    tasks = G.tasks
+    ret: list[Decoration] = [Decoration(False) for _ in range(len(tasks))]
  
-    total_work = sum(task.estimate for task in G.nodes)
-    longest_path = nx.dag_longest_path_length(G)
-    parallelism_ratio = total_work / longest_path 
-    notifications.append(Notification(Severity.INFO, f"[Total Length: {total_work}], [Critical Path Length: {longest_path}], [Parallelism Ratio: {parallelism_ratio:.2f}]"))
+    # Also refreshes slack against the scheduled dates
+    a = G.analyze()
+    notifications.append(Notification(Severity.INFO, f"[Total Length: {a.total_work}], [Critical Path Length: {a.longest_path}], [Parallelism Ratio: {a.parallelism_ratio:.2f}]"))
 
-    # Prepare decorations, build days worked
-    days_alloc  = defaultdict(int)
-    today = datetime.now().date()
+    # Build days worked. Only count people, unscheduled 
+    # tasks may still be assigned to a team
+    owners = np.repeat(np.arange(len(tasks)), np.diff(tasks.assignee_offsets))
+    counted = tasks.specific[owners]
+    people = tasks.assignee_ids[counted]
+    days_alloc = np.bincount(people, weights=tasks.estimates[owners[counted]], minlength=len(tasks.registry.people))
 
-    task: InputTask
-    for task in G:
-        ret[task] = Decoration(False)
-        for a in task.assignees:
-            days_alloc[a] += task.estimate
-        for succ in G.successors(task):
-            if task.end_date and succ.start_date:
-                G.edges[task, succ][Edge.slack] = busdays_between(task.end_date, succ.start_date)
-        if task.start_date and busdays_between(today, task.start_date) <= SOON_THRESHOLD:
-            notifications.append(Notification(Severity.INFO, f"Task {task.name} starts on {task.start_date}, which is within {SOON_THRESHOLD} business days from today. Status: {task.status}. Check readiness."))
+    today = datetime.now().date()
+    dated = np.flatnonzero(~np.isnat(tasks.starts))
+    soon = dated[np.busday_count(today, tasks.starts[dated]) <= SOON_THRESHOLD]
+    for task in map(tasks.__getitem__, soon.tolist()):
+        notifications.append(Notification(Severity.INFO, f"Task {task.name} starts on {task.start_date}, which is within {SOON_THRESHOLD} business days from today. Status: {task.status}. Check readiness."))
 
     # Tag the critical path.
-    critical_path = nx.dag_longest_path(G)
     makespan = 0
-    for task in critical_path:
-        ret[task].critical = True
-        makespan += task.estimate
-    for edge in zip(critical_path, critical_path[1:]):
-        G.edges[edge][Edge.critical] = True
+    for row in a.critical_path:
+        ret[row].critical = True
+        makespan += int(tasks.estimates[row])
+    for u, v in zip(a.critical_path, a.critical_path[1:]):
+        G.critical[G.edge(u, v)] = True
     
     # Provide some metrics on utilization
-    for person in sorted(days_alloc.keys()):
+    names = tasks.registry.people.names
+    for person in sorted(np.unique(people).tolist(), key=lambda p: names[p]):
         percentage_days_worked = (days_alloc[person] / makespan) * 100
-        s = f"{person} - working {days_alloc[person]}d, {int(percentage_days_worked)}% utilization."
+        s = f"{names[person]} - working {int(days_alloc[person])}d, {int(percentage_days_worked)}% utilization."
         notifications.append(Notification(Severity.INFO, s))
-    return ret 
+    return ret
@@ -0,0 +1,28 @@
+# gunicorn settings for production:
+#
+#   FLASK_SECRET_KEY=... FANTASIA_PLAN_DB=/var/lib/fantasia/plans.db \
+#       gunicorn -c python:backend_rewrite.gunicorn_config 'backend_rewrite.serve:application()'
+#
+# The app is loaded and warmed once in the master ( preload_app ), then
+# frozen out of the collector's way so workers keep sharing its pages, as
+# serve.py does. Threaded workers, since streams hold a request open for
+# the whole solve.
+import gc
+import os
+
+bind = f"{os.getenv('FANTASIA_HOST', '0.0.0.0')}:{os.getenv('FANTASIA_PORT', 5000)}"
+workers = int(os.getenv('FANTASIA_WORKERS', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.getenv('FANTASIA_WORKER_THREADS', 16))
+preload_app = True
+# Requests run as long as a solve and its rollbacks, well past the default
+timeout = int(os.getenv('FANTASIA_WORKER_TIMEOUT', 300))
+graceful_timeout = 30
+
+# In the master, once the app is loaded and before any worker is forked
+def when_ready(server):
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    server.log.info("Worker %d ready, sharing the warmed app", worker.pid)
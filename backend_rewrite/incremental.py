@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict
+import uuid
+import numpy as np
+
+from .dag import Graph
+from .dot import FragmentCache
+from .notification import Notification
+from .types import TaskTable, Metadata, SchedulerHints, NO_DATE
+
+# What a user's last run leaves behind to make their next one cheaper
+@dataclass
+class Snapshot:
+    day: date
+    metadata: Metadata
+    inputs: TaskTable            # as submitted, before scheduling
+    solved: TaskTable            # the same tasks once scheduled
+    lowered: TaskTable           # the scheduled expansion, to warm start the solver
+    makespan: int
+    offset: int
+    # What scheduling told the user, to repeat if the schedule is reused
+    notifications: list[Notification] = field(default_factory=list)
+    fragments: FragmentCache = field(default_factory=FragmentCache)
+    # Which solve the schedule came from. Runs starting from snapshots
+    # with the same one ( a reused schedule, or one shared with the rest
+    # of the team ) come to the same thing.
+    run: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+# What changed between two submissions of a sheet. Tasks are matched up
+# by name, so moving rows around in the sheet isn't a change.
+@dataclass
+class TableDiff:
+    added: list[str]
+    removed: list[str]
+    changed: list[str]
+    edges_changed: bool
+    metadata_changed: bool
+    # Rows of the new table which were added or changed
+    affected: np.ndarray
+
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed or self.metadata_changed)
+
+# Everything about each row that goes into scheduling and rendering
+def row_keys(tasks: TaskTable) -> list[tuple]:
+    return list(zip(tasks.descriptions, tasks.specific.tolist(),
+                    [tuple(tasks.assignee_names(row)) for row in range(len(tasks))],
+                    [tuple(tasks.next_names(row)) for row in range(len(tasks))],
+                    tasks.parallelizable.tolist(), tasks.estimates.tolist(), tasks.starts.tolist(),
+                    tasks.ends.tolist(), tasks.statuses.tolist()))
+
+def diff_tables(old: TaskTable, old_metadata: Metadata, new: TaskTable, new_metadata: Metadata) -> TableDiff:
+    old_names, new_names = old.names, new.names
+    old_rows = {name: row for row, name in enumerate(old_names)}
+    new_rows = {name: row for row, name in enumerate(new_names)}
+    # Duplicate names can't be matched up, treat everything as changed
+    if len(old_rows) != len(old_names) or len(new_rows) != len(new_names):
+        return TableDiff(new_names, old_names, [], True, old_metadata != new_metadata, np.ones(len(new), dtype=bool))
+
+    old_keys, new_keys = row_keys(old), row_keys(new)
+    added = [name for name in new_names if name not in old_rows]
+    removed = [name for name in old_names if name not in new_rows]
+    changed = [name for name, key in zip(new_names, new_keys) if name in old_rows and old_keys[old_rows[name]] != key]
+    # next is part of the key; adding or removing a task can also change
+    # what an unchanged next resolves to
+    edges_changed = bool(added or removed) or any(
+        old_keys[old_rows[name]][3] != new_keys[new_rows[name]][3] for name in changed)
+
+    affected = np.zeros(len(new), dtype=bool)
+    affected[[new_rows[name] for name in added + changed]] = True
+    return TableDiff(added, removed, changed, edges_changed, old_metadata != new_metadata, affected)
+
+# Copy a previous schedule of the same tasks onto tasks, matching by name
+def replay(solved: TaskTable, tasks: TaskTable) -> None:
+    rows = {name: row for row, name in enumerate(solved.names)}
+    source = np.array([rows[name] for name in tasks.names], dtype=np.int64)
+    tasks.starts[:] = solved.starts[source]
+    tasks.ends[:] = solved.ends[source]
+    tasks.estimates[:] = solved.estimates[source]
+    tasks.specific[:] = solved.specific[source]
+    r = tasks.registry
+    tasks.replace_assignees([[r.people.intern(a) if tasks.specific[row] else r.team(a) for a in solved.assignee_names(s)]
+                             for row, s in enumerate(source.tolist())])
+
+# Warm start the lowered graph from the previous solution. Lowered tasks
+# which nothing changed upstream of keep their slot outright, unless the
+# people changed.
+def hints_from(previous: Snapshot, L: Graph, tasks: TaskTable, diff: TableDiff) -> SchedulerHints:
+    lowered = L.tasks
+    solved = previous.lowered
+    rows: Dict[str, int] = {name: row for row, name in enumerate(solved.names)}
+    source = np.array([rows.get(name, -1) for name in lowered.names], dtype=np.int64)
+    hinted = source >= 0
+
+    starts = np.full(len(lowered), NO_DATE, dtype='datetime64[D]')
+    ends = np.full(len(lowered), NO_DATE, dtype='datetime64[D]')
+    starts[hinted] = solved.starts[source[hinted]]
+    ends[hinted] = solved.ends[source[hinted]]
+
+    # Only hint people the solution actually settled on
+    people = lowered.registry.people.ids
+    assignees = np.full(len(lowered), -1, dtype=np.int64)
+    for row in np.flatnonzero(hinted).tolist():
+        s = int(source[row])
+        names = solved.assignee_names(s)
+        if solved.specific[s] and len(names) == 1:
+            assignees[row] = people.get(names[0], -1)
+
+    fixed = np.zeros(len(lowered), dtype=bool)
+    if not diff.metadata_changed:
+        # Expansion carries the input row through, which maps lowered rows back up
+        changed = np.isin(lowered.input_rows, tasks.input_rows[diff.affected])
+        fixed = hinted & ~L.reachable(np.flatnonzero(changed))
+    return SchedulerHints(starts, ends, assignees, fixed)
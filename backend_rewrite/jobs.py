@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+import subprocess
+import threading
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from .metrics import counter
+
+# Everything one submission sets running for a user: the solve and any
+# Graphviz processes. A user has at most one job at a time; starting
+# another cancels the one before, as does the client going away. Work
+# checks in with the job it's running under, so a cancelled job stops its
+# solver, gives up on further rollbacks and has its dot processes killed.
+
+class Cancelled(Exception):
+    pass
+
+cancellations = counter('fantasia_cancellations_total', 'Jobs cancelled by a newer submission or the client going away')
+
+class Job:
+    # progress is the job's SolveProgress, anything with a stop()
+    def __init__(self, user: str, progress):
+        self.user = user
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.cancelled: Optional[str] = None
+        self.processes: Set[subprocess.Popen] = set()
+
+    def cancel(self, reason: str) -> None:
+        with self.lock:
+            if self.cancelled is not None:
+                return
+            self.cancelled = reason
+            processes = list(self.processes)
+        cancellations.inc()
+        self.progress.stop()
+        for process in processes:
+            process.kill()
+
+    def check(self) -> None:
+        if self.cancelled is not None:
+            raise Cancelled(self.cancelled)
+
+    # Keeps hold of a process to kill if the job is cancelled. False if
+    # it already has been, in which case the process should be dropped.
+    def track(self, process: subprocess.Popen) -> bool:
+        with self.lock:
+            if self.cancelled is not None:
+                return False
+            self.processes.add(process)
+            return True
+
+    def untrack(self, process: subprocess.Popen) -> None:
+        with self.lock:
+            self.processes.discard(process)
+
+    # Marks whatever the calling thread does as part of this job
+    @contextmanager
+    def running(self) -> Iterator['Job']:
+        previous = current()
+        local.job = self
+        try:
+            yield self
+        finally:
+            local.job = previous
+
+    def run(self, fn: Callable, *args):
+        with self.running():
+            return fn(*args)
+
+local = threading.local()
+
+# The job the calling thread is working for, if any
+def current() -> Optional[Job]:
+    return getattr(local, 'job', None)
+
+active: Dict[str, Job] = dict()
+active_lock = threading.Lock()
+
+# Makes a new job the user's only one
+def start(user: str, progress) -> Job:
+    job = Job(user, progress)
+    with active_lock:
+        previous = active.get(user)
+        active[user] = job
+    if previous is not None:
+        previous.cancel("Cancelled by a newer submission")
+    return job
+
+def finish(job: Job) -> None:
+    with active_lock:
+        if active.get(job.user) is job:
+            del active[job.user]
+
+def get(user: str) -> Optional[Job]:
+    with active_lock:
+        return active.get(user)
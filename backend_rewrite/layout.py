@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from html import escape
+import hashlib
+import os
+import shlex
+import threading
+from typing import Dict, Optional, Tuple
+
+from .dag import Graph
+from .render import SvgCache, get_renderer, get_svg_cache
+from .style import Cell, table_border, node_rows, edge_style
+from .trace import span
+from .types import Decoration
+
+# Layout once, restyle many. Where things go only depends on which tasks
+# there are, how they're connected and how big their tables are; colours,
+# dates and slack don't move anything. So dot lays a graph out once, we
+# keep the geometry it comes back with, and every restyle of the same
+# topology is drawn in Python straight from it. Nodes also stay put across
+# edits, rather than jumping around whenever dot breaks a tie differently.
+
+Point = Tuple[float, float]
+
+# Geometry from dot -Tplain, in points with y pointing down as in SVG
+@dataclass
+class Layout:
+    width: float
+    height: float
+    # Centre x, centre y, width, height by row
+    nodes: Dict[int, Tuple[float, float, float, float]]
+    # B-spline control points by ( tail, head ), ending where the arrowhead starts
+    edges: Dict[Tuple[int, int], list[Point]]
+    labels: Dict[Tuple[int, int], Point]
+
+# Parses dot's plain output, see https://graphviz.org/docs/outputs/plain/
+def parse_plain(plain: str) -> Layout:
+    layout = Layout(0, 0, dict(), dict(), dict())
+    scale = 72
+    for line in plain.splitlines():
+        if line.startswith('graph '):
+            _, s, width, height = line.split()[:4]
+            scale = 72 * float(s)
+            layout.width, layout.height = float(width) * scale, float(height) * scale
+        elif line.startswith('node '):
+            # The label comes next and can have anything in it, so stop short
+            _, name, x, y, width, height = line.split()[:6]
+            layout.nodes[int(name)] = (float(x) * scale, layout.height - float(y) * scale,
+                                       float(width) * 72, float(height) * 72)
+        elif line.startswith('edge '):
+            fields = shlex.split(line)
+            tail, head, n = int(fields[1]), int(fields[2]), int(fields[3])
+            coords = [float(c) * scale for c in fields[4:4 + 2 * n]]
+            layout.edges[(tail, head)] = [(x, layout.height - y) for x, y in zip(coords[::2], coords[1::2])]
+            # Then an optional label and where it goes, then style and colour
+            rest = fields[4 + 2 * n:]
+            if len(rest) >= 5:
+                layout.labels[(tail, head)] = (float(rest[1]) * scale, layout.height - float(rest[2]) * scale)
+    return layout
+
+# What the size of a task's table depends on. Text is bucketed so that
+# small edits, a date appearing, a status changing to one of similar
+# length, keep the layout.
+def node_size(rows: list[list[Cell]]) -> tuple:
+    return tuple((tuple(c.colspan for c in row), max(max(len(c.lines), 1) for c in row),
+                  sum(max((len(l) for l in c.lines), default=0) for c in row) // 8) for row in rows)
+
+# Identifies the layout of G: the tasks, the edges and how big each of
+# their labels is
+def layout_key(G: Graph) -> str:
+    h = hashlib.sha256()
+    for task in G:
+        h.update(repr((task.row, node_size(node_rows(task)))).encode('utf-8'))
+    for u, v, e in G.edges():
+        h.update(repr((u, v, bool(edge_style(G, e)[2]))).encode('utf-8'))
+    return h.hexdigest()
+
+# Layouts by layout_key, least recently used goes first
+class LayoutCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, Layout] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Layout]:
+        with self.lock:
+            layout = self.entries.get(key)
+            if layout is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return layout
+
+    def put(self, key: str, layout: Layout) -> None:
+        with self.lock:
+            self.entries[key] = layout
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+layout_lock = threading.Lock()
+layout_cache: Optional[LayoutCache] = None
+
+def get_layout_cache() -> LayoutCache:
+    global layout_cache
+    with layout_lock:
+        if layout_cache is None:
+            layout_cache = LayoutCache(int(os.getenv('FANTASIA_LAYOUT_CACHE_ENTRIES', 256)))
+        return layout_cache
+
+# Whether to draw from cached layouts rather than have dot render every
+# change; FANTASIA_RENDER=layout turns it on
+def restyle_enabled() -> bool:
+    return os.getenv('FANTASIA_RENDER', 'graphviz') == 'layout'
+
+FONT = 'Calibri,sans-serif'
+
+def draw_edge(points: list[Point], color: str, width: int, label: str, at: Optional[Point]) -> str:
+    (x0, y0), rest = points[0], points[1:]
+    path = f"M{x0:.1f},{y0:.1f}" + ''.join(
+        f"C{a[0]:.1f},{a[1]:.1f} {b[0]:.1f},{b[1]:.1f} {c[0]:.1f},{c[1]:.1f}"
+        for a, b, c in zip(rest[::3], rest[1::3], rest[2::3]))
+    svg = f'<path d="{path}" fill="none" stroke="{color}" stroke-width="{width}"/>'
+
+    # The arrowhead carries on from the end of the spline, as dot's does
+    (ax, ay) = next((p for p in reversed(points[:-1]) if p != points[-1]), points[0])
+    (bx, by) = points[-1]
+    length = max(((bx - ax) ** 2 + (by - ay) ** 2) ** 0.5, 1e-9)
+    dx, dy = (bx - ax) / length, (by - ay) / length
+    size = 10 + width
+    tip = (bx + dx * size, by + dy * size)
+    left = (bx - dy * size / 3, by + dx * size / 3)
+    right = (bx + dy * size / 3, by - dx * size / 3)
+    svg += (f'<polygon points="{tip[0]:.1f},{tip[1]:.1f} {left[0]:.1f},{left[1]:.1f} '
+            f'{right[0]:.1f},{right[1]:.1f}" fill="{color}" stroke="{color}"/>')
+    if label and at is not None:
+        svg += (f'<text x="{at[0]:.1f}" y="{at[1]:.1f}" text-anchor="middle" dominant-baseline="central" '
+                f'font-family="{FONT}" font-size="10">{escape(label)}</text>')
+    return svg
+
+# Grouped and titled with the row like dot's nodes, which is how the
+# frontend finds them
+def draw_node(node: int, rows: list[list[Cell]], box: Tuple[float, float, float, float],
+              border: Tuple[int, str], critical: bool) -> str:
+    cx, cy, width, height = box
+    x0, y = cx - width / 2, cy - height / 2
+    heights = [max(max(len(c.lines), 1) for c in row) for row in rows]
+    line = height / sum(heights)
+    svg = f'<g id="node{node}" class="node"><title>{node}</title>'
+    for r, (row, lines) in enumerate(zip(rows, heights)):
+        span = sum(c.colspan for c in row)
+        x = x0
+        for c in row:
+            w = width * c.colspan / span
+            svg += f'<rect x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{line * lines:.1f}" fill="{c.bgcolor}" stroke="black"/>'
+            # The first row is the title
+            size, weight = (14, ' font-weight="bold"' if critical else '') if r == 0 else (12, '')
+            for i, text in enumerate(c.lines):
+                svg += (f'<text x="{x + w / 2:.1f}" y="{y + line * (i + 0.5):.1f}" text-anchor="middle" '
+                        f'dominant-baseline="central" font-family="{FONT}" font-size="{size}"{weight}>{escape(text)}</text>')
+            x += w
+        y += line * lines
+    border_width, border_color = border
+    svg += (f'<rect x="{x0:.1f}" y="{cy - height / 2:.1f}" width="{width:.1f}" height="{height:.1f}" '
+            f'fill="none" stroke="{border_color}" stroke-width="{border_width}"/></g>')
+    return svg
+
+# Draws G over a layout of its topology
+def draw_svg(G: Graph, decorations: list[Decoration], layout: Layout) -> bytes:
+    today = datetime.now().date()
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{layout.width:.0f}pt" height="{layout.height:.0f}pt" '
+             f'viewBox="0 0 {layout.width:.1f} {layout.height:.1f}">',
+             f'<rect width="100%" height="100%" fill="white"/>']
+    # Edges first, so nodes sit on top of their ends
+    for u, v, e in G.edges():
+        points = layout.edges.get((u, v))
+        if points:
+            color, width, label = edge_style(G, e)
+            parts.append(draw_edge(points, color, width, label, layout.labels.get((u, v))))
+    for task in G:
+        parts.append(draw_node(task.row, node_rows(task), layout.nodes[task.row], table_border(task, today),
+                               decorations[task.row].critical))
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+# Like render.render, but only goes to dot for a topology it hasn't seen.
+# dot is the source of the same picture, which is what the SVG is cached by.
+def render_restyled(dot: str, G: Graph, decorations: list[Decoration]) -> Tuple[str, bytes]:
+    svgs = get_svg_cache()
+    key = SvgCache.key('layout\n' + dot)
+    svg = svgs.get(key)
+    if svg is None:
+        layouts = get_layout_cache()
+        topology = layout_key(G)
+        layout = layouts.get(topology)
+        if layout is None:
+            layout = parse_plain(get_renderer().render(dot, 'plain').decode('utf-8'))
+            layouts.put(topology, layout)
+        with span('restyle'):
+            svg = draw_svg(G, decorations, layout)
+        svgs.put(key, svg)
+    return key, svg
@@ -2,7 +2,7 @@ from typing import Tuple
 from io import StringIO
 import csv
 
-from .types import Metadata, Team, Person
+from .types import Metadata, MetadataBuilder, Team, Person
 
 # Used elsewhere
 def row_contains_metadata(row: list[str]) -> bool:
@@ -40,7 +40,7 @@ def parse_team(row: list[str]) -> Team:
 def extract_metadata(input: str, delimiter: str) -> Metadata:
     csv_file_like = StringIO(input)
     data = list(csv.reader(csv_file_like, delimiter=delimiter))
-    m = Metadata()
+    m = MetadataBuilder()
     for row in data:
         row = [r.strip() for r in row]
         if not row_contains_metadata(row):
@@ -51,4 +51,4 @@ def extract_metadata(input: str, delimiter: str) -> Metadata:
             case '%ALLOCATION':
                 m.add_allocation(*parse_allocation(row))
 
-    return m
+    return m.build()
@@ -0,0 +1,150 @@
+from bisect import bisect_left
+import threading
+from typing import Callable, Dict, Iterator, Tuple
+
+# Process wide metrics, safe to update from any thread, and their
+# Prometheus text exposition for /metrics. Counters and histograms can
+# have labels, given as keyword arguments when they're updated. Anything
+# that already keeps its own numbers ( the caches, the stores ) registers
+# a collector instead, which is read at scrape time.
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+
+    # The label values given as keyword arguments, in order
+    def key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise Exception(f"{self.name} has labels {', '.join(self.labels) or 'none'}, not {', '.join(labels) or 'none'}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+class Counter(Metric):
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = dict()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        key = self.key(labels)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    # The count of an unlabelled counter
+    @property
+    def value(self) -> float:
+        return self.get()
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            values = sorted(self.values.items())
+        if not values and not self.labels:
+            values = [((), 0)]
+        for key, value in values:
+            yield f"{self.name}{label_text(self.labels, key)} {number(value)}"
+
+# Seconds, for latencies
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Counts, for the size of sheets and models
+SIZE_BUCKETS = (10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000)
+
+class Histogram(Metric):
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = TIME_BUCKETS, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Per label values: a count per bucket ( not cumulative ), the sum and the count
+        self.series: Dict[Tuple[str, ...], Tuple[list[int], list[float]]] = dict()
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series.setdefault(key, ([0] * len(self.buckets), [0.0, 0]))
+            counts[i] += 1
+            total[0] += value
+            total[1] += 1
+
+    def count(self, **labels) -> int:
+        key = self.key(labels)
+        with self.lock:
+            return int(self.series[key][1][1]) if key in self.series else 0
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            series = sorted((key, (list(counts), list(total))) for key, (counts, total) in self.series.items())
+        for key, (counts, (total, count)) in series:
+            cumulative = 0
+            for le, c in zip(self.buckets, counts):
+                cumulative += c
+                bound = 'le="' + number(le) + '"'
+                yield f"{self.name}_bucket{label_text(self.labels, key, bound)} {cumulative}"
+            yield f"{self.name}_sum{label_text(self.labels, key)} {number(total)}"
+            yield f"{self.name}_count{label_text(self.labels, key)} {int(count)}"
+
+# Numbers something else keeps, read when scraped. stats returns a dict
+# like the caches' stats(); names in counted are exposed as counters, the
+# rest as gauges, each as {prefix}_{name}.
+class Collector:
+    def __init__(self, prefix: str, help: str, stats: Callable[[], Dict[str, float]],
+                 counted: Tuple[str, ...] = ('hits', 'disk_hits', 'misses', 'evictions', 'expirations', 'batches', 'writes')):
+        self.name = prefix
+        self.help = help
+        self.stats = stats
+        self.counted = counted
+
+    def expose(self) -> Iterator[str]:
+        for key, value in sorted(self.stats().items()):
+            counter = key in self.counted
+            name = f"{self.name}_{key}" + ('_total' if counter else '')
+            yield f"# HELP {name} {self.help}, {key.replace('_', ' ')}"
+            yield f"# TYPE {name} {'counter' if counter else 'gauge'}"
+            yield f"{name} {number(value)}"
+
+metrics: Dict[str, object] = dict()
+metrics_lock = threading.Lock()
+
+def register(name: str, make: Callable[[], object]):
+    with metrics_lock:
+        if name not in metrics:
+            metrics[name] = make()
+        return metrics[name]
+
+# The metric called name, made on first use
+def counter(name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+    return register(name, lambda: Counter(name, help, labels))
+
+def histogram(name: str, help: str, buckets: Tuple[float, ...] = TIME_BUCKETS, labels: Tuple[str, ...] = ()) -> Histogram:
+    return register(name, lambda: Histogram(name, help, buckets, labels))
+
+def collector(prefix: str, help: str, stats: Callable[[], Dict[str, float]]) -> Collector:
+    return register(prefix, lambda: Collector(prefix, help, stats))
+
+# Everything, in the Prometheus text format
+def exposition() -> str:
+    with metrics_lock:
+        everything = sorted(metrics.items())
+    return '\n'.join(line for _, metric in everything for line in metric.expose()) + '\n'
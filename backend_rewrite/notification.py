@@ -5,6 +5,7 @@ import json
 class Severity(Enum):
     INFO = 1
     WARN = 2
+    ERROR = 3
 
 class Notification:
     def __init__(self, severity: Severity, message: str):
@@ -1,6 +1,6 @@
 from datetime import date
 from typing import Dict, Optional, Tuple
-from .types import InputTask, parse_status, Metadata
+from .types import InputTask, TaskTable, TaskTableBuilder, Registry, parse_status, Metadata
 from .metadata import row_contains_metadata
 from .dateutil import parse_date, busdays_between
 from io import StringIO
@@ -38,7 +38,7 @@ def verify_assignees(assignees: list[str],
         raise Exception(f"Task with assignees: {assignees} mixes team and specific assignments")
     return is_specific[0] if is_specific else False
 
-def csv_string_to_task_list(csv_string: str, delimiter: str, metadata: Metadata) -> list[InputTask]:
+def csv_string_to_task_table(csv_string: str, delimiter: str, metadata: Metadata) -> TaskTable:
     csv_file_like = StringIO(csv_string)
     data = list(csv.reader(csv_file_like, delimiter=delimiter))
 
@@ -57,7 +57,8 @@ def csv_string_to_task_list(csv_string: str, delimiter: str, metadata: Metadata)
     # always appear at the end
     next_index = headers.index('next')
 
-    processed_data: list[InputTask] = []
+    # Tasks, people and teams get their dense ids here
+    processed_data = TaskTableBuilder(Registry.from_metadata(metadata))
     for row_idx, row in enumerate(data[1:]):
         # Skip empty rows or rows with metadata
         if not row or row_contains_metadata(row):
@@ -75,9 +76,13 @@ def csv_string_to_task_list(csv_string: str, delimiter: str, metadata: Metadata)
         assignees = [a.strip() for a in row_dict['Assignee'].split(',') if a.strip()]
         parallelizable, est, start, end = parse_dates_and_estimates(row_dict['Task'], row_dict['Estimate'], row_dict['StartDate'], row_dict['EndDate'])
         status = parse_status(row_dict['Status'])
-        t = InputTask(row_dict['Task'], row_dict['Description'], verify_assignees(assignees, metadata), assignees, next, parallelizable, est, start, end, status, row_idx)
+        # Optional, only used to collapse the graph when drawing it
+        group = row_dict.get('Group', '')
 
         # Add to the output
-        processed_data.append(t)
+        processed_data.append(row_dict['Task'], row_dict['Description'], verify_assignees(assignees, metadata), assignees, next, parallelizable, est, start, end, status, row_idx, group)
+
+    return processed_data.build()
 
-    return processed_data
+def csv_string_to_task_list(csv_string: str, delimiter: str, metadata: Metadata) -> list[InputTask]:
+    return list(csv_string_to_task_table(csv_string, delimiter, metadata))
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+import threading
+from typing import Callable, Optional
+
+# Following a solve needs none of the solver itself, so this doesn't
+# import ortools; anything which only starts and stops solves can use it
+# without paying for that.
+
+# A schedule the solver found on its way to the best one
+@dataclass
+class Incumbent:
+    makespan: int
+    bound: int      # no schedule can be shorter than this
+    gap: float      # ( makespan - bound ) / makespan, 0 once it's proven optimal
+    seconds: float  # since the solve started
+
+# Follows a solve: hears about every better schedule the solver finds, and
+# can stop it early, which keeps the best schedule found so far. Once
+# stopped no further solves start, so rollbacks are given up on too.
+class SolveProgress:
+    def __init__(self, on_incumbent: Optional[Callable[[Incumbent], None]] = None):
+        self.on_incumbent = on_incumbent
+        self.lock = threading.Lock()
+        # The CpSolver running, if any
+        self.solver = None
+        self.stopped = False
+        self.best: Optional[Incumbent] = None
+
+    # False if it was stopped before the solver got going
+    def started(self, solver) -> bool:
+        with self.lock:
+            if self.stopped:
+                return False
+            self.solver = solver
+            return True
+
+    def finished(self) -> None:
+        with self.lock:
+            self.solver = None
+
+    def report(self, incumbent: Incumbent) -> None:
+        self.best = incumbent
+        if self.on_incumbent is not None:
+            self.on_incumbent(incumbent)
+
+    # Safe to call from any thread
+    def stop(self) -> None:
+        with self.lock:
+            self.stopped = True
+            if self.solver is not None:
+                self.solver.stop_search()
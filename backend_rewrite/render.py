@@ -0,0 +1,223 @@
+from collections import OrderedDict
+import hashlib
+import os
+import subprocess
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from . import jobs
+from .metrics import counter, histogram
+from .trace import annotate, span
+
+render_seconds = histogram('fantasia_render_seconds', 'Time Graphviz took to lay out and render, by output format', labels=('format',))
+graphviz_failures = counter('fantasia_graphviz_failures_total', 'Graphviz renders which failed, by why', ('reason',))
+
+# pygraphviz lays out in process through libgvc, which saves starting dot
+# for every render. It's optional and opt in ( FANTASIA_RENDER_IN_PROCESS=1 ),
+# since a render in process can be neither timed out nor killed; by
+# default we pipe to the dot binary. Loading libgvc is slow, so it's only
+# tried once a renderer is made.
+def load_pygraphviz():
+    try:
+        import pygraphviz
+        return pygraphviz
+    except ImportError:
+        return None
+
+# Renders DOT source to SVG bytes. DOT goes to dot over stdin and the SVG
+# comes back on stdout, so nothing touches the disk. At most `processes`
+# renders run at once, anyone past that waits for a free slot, and a
+# render which takes longer than `timeout` seconds is killed, as is one
+# whose job is cancelled. In process renders only wait `timeout` for
+# their slot: once drawing they run to completion, and a cancelled job
+# is only noticed before and after.
+class Renderer:
+    def __init__(self, dot_path: Optional[str] = None, processes: Optional[int] = None,
+                 timeout: Optional[float] = None, in_process: Optional[bool] = None):
+        self.dot_path = dot_path or os.getenv('DOT_PATH', 'dot')
+        self.timeout = timeout or float(os.getenv('FANTASIA_RENDER_TIMEOUT', 30))
+        if in_process is None:
+            in_process = (os.getenv('FANTASIA_RENDER_IN_PROCESS') == '1' and dot_path is None
+                          and 'DOT_PATH' not in os.environ and load_pygraphviz() is not None)
+        self.in_process = in_process
+        # libgvc isn't thread safe, so in process renders go one at a time
+        processes = 1 if in_process else processes or int(os.getenv('FANTASIA_RENDER_PROCESSES', os.cpu_count() or 1))
+        self.slots = threading.BoundedSemaphore(processes)
+
+    # Any output format dot has, plain gives just the layout
+    def render(self, dot: str, format: str = 'svg') -> bytes:
+        with span('graphviz', format=format, in_process=self.in_process):
+            waited = time.perf_counter()
+            if not self.slots.acquire(timeout=self.timeout):
+                graphviz_failures.inc(reason='busy')
+                raise Exception(f"Timed out after {self.timeout}s waiting for a free Graphviz renderer")
+            started = time.perf_counter()
+            annotate(wait_ms=round((started - waited) * 1000, 3))
+            try:
+                if self.in_process:
+                    return self.draw(dot, format)
+                return self.pipe(dot, format)
+            finally:
+                render_seconds.observe(time.perf_counter() - started, format=format)
+                self.slots.release()
+
+    def draw(self, dot: str, format: str = 'svg') -> bytes:
+        job = jobs.current()
+        if job is not None:
+            job.check()
+        try:
+            svg = load_pygraphviz().AGraph(string=dot).draw(format=format, prog='dot')
+        except Exception:
+            graphviz_failures.inc(reason='error')
+            raise
+        if job is not None:
+            job.check()
+        return svg
+
+    def pipe(self, dot: str, format: str = 'svg') -> bytes:
+        job = jobs.current()
+        if job is not None:
+            job.check()
+        try:
+            process = subprocess.Popen([self.dot_path, f'-T{format}'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+        except OSError:
+            graphviz_failures.inc(reason='error')
+            raise
+        if job is not None and not job.track(process):
+            process.kill()
+        try:
+            svg, err = process.communicate(dot.encode('utf-8'), timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            graphviz_failures.inc(reason='timeout')
+            raise Exception(f"Graphviz took longer than {self.timeout}s to render {len(dot)} bytes of DOT")
+        finally:
+            if job is not None:
+                job.untrack(process)
+        if job is not None:
+            job.check()
+        if process.returncode != 0:
+            graphviz_failures.inc(reason='exit')
+            raise Exception(f"Graphviz failed with exit code {process.returncode}: {err.decode('utf-8', 'replace').strip()}")
+        return svg
+
+# Rendered SVGs keyed on a hash of the exact DOT text, so anything that
+# changes the picture ( including today's date colouring the borders )
+# changes the key. In memory it's an LRU bounded by total SVG bytes. With
+# a directory it's also written through to disk, which lets workers share
+# renders; the disk copy isn't bounded, clear it out of band.
+class SvgCache:
+    def __init__(self, max_bytes: int, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(dot: str) -> str:
+        return hashlib.sha256(dot.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.svg')
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            svg = self.entries.get(key)
+            if svg is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return svg
+        if self.directory:
+            try:
+                with open(self.path(key), 'rb') as f:
+                    svg = f.read()
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            if svg is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.put(key, svg, persist=False)
+        return svg
+
+    def put(self, key: str, svg: bytes, persist: bool = True) -> None:
+        if persist and self.directory:
+            # Write then rename so another worker never reads half a file
+            tmp = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(svg)
+            os.replace(tmp, self.path(key))
+        if len(svg) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = svg
+            self.bytes += len(svg)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+# Shared by every request in the process; made on first use so the
+# environment is read after startup configuration
+renderer_lock = threading.Lock()
+renderer: Optional[Renderer] = None
+svg_cache: Optional[SvgCache] = None
+
+def get_renderer() -> Renderer:
+    global renderer
+    with renderer_lock:
+        if renderer is None:
+            renderer = Renderer()
+        return renderer
+
+def get_svg_cache() -> SvgCache:
+    global svg_cache
+    with renderer_lock:
+        if svg_cache is None:
+            svg_cache = SvgCache(int(os.getenv('FANTASIA_SVG_CACHE_BYTES', 64 * 2**20)),
+                                 os.getenv('FANTASIA_SVG_CACHE_DIR'))
+        return svg_cache
+
+# Returns the cache key along with the SVG, which is what clients can
+# fetch it again by
+def render(dot: str) -> Tuple[str, bytes]:
+    cache = get_svg_cache()
+    key = SvgCache.key(dot)
+    svg = cache.get(key)
+    if svg is None:
+        svg = get_renderer().render(dot)
+        cache.put(key, svg)
+    return key, svg
+
+def render_svg(dot: str) -> bytes:
+    return render(dot)[1]
+
+# A previous render by its key, if it's still cached
+def cached_svg(key: str) -> Optional[bytes]:
+    return get_svg_cache().get(key)
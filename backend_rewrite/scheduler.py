@@ -1,19 +1,29 @@
 from dataclasses import dataclass
 import datetime
 from datetime import date
-from .dateutil import busdays_between, busdays_offset
-from copy import deepcopy
-from typing import Tuple, Dict, Optional
-from bidict import bidict 
+import logging
+import os
+from .dateutil import busdays_offset
+from typing import Tuple, Dict, Iterable, Optional
+import numpy as np
 
 from .types import *
+from .dag import Graph
 from .notification import *
+from .progress import Incumbent, SolveProgress
+from .trace import annotate, span
+from .metrics import SIZE_BUCKETS, counter, histogram
 from ortools.sat.python import cp_model
-from networkx import DiGraph
+
+log = logging.getLogger(__name__)
+
+solves = counter('fantasia_solves_total', 'CP-SAT solves by how they ended', ('status',))
+schedules = counter('fantasia_schedules_total', 'Scheduling requests by the rollback offset ( business days ) a schedule was found at, or none', ('offset',))
+model_variables = histogram('fantasia_model_variables', 'Variables in each CP-SAT model', SIZE_BUCKETS)
+model_constraints = histogram('fantasia_model_constraints', 'Constraints in each CP-SAT model', SIZE_BUCKETS)
 
 # Register eligible or fixed assignments for a task
-def assign_people_to_task(model: cp_model.CpModel, person_assignments: Dict[int, cp_model.IntVar], scheduler_fields: SchedulerFields, person_ids):
-    id: int = scheduler_fields.id
+def assign_people_to_task(model: cp_model.CpModel, person_assignments: Dict[int, cp_model.IntVar], id: int, person_ids):
     if len(person_ids) == 1:
         person_assignments[id] = model.NewConstant(person_ids[0])
     elif len(person_ids) > 1:
@@ -21,9 +31,8 @@ def assign_people_to_task(model: cp_model.CpModel, person_assignments: Dict[int,
             cp_model.Domain.FromValues(person_ids), f'person_{id}')
          
 # Register the start end end and interval of a task
-def register_task_start_end(model: cp_model.CpModel, scheduler_fields: SchedulerFields, horizon: int,
+def register_task_start_end(model: cp_model.CpModel, id: int, horizon: int,
                             task_starts: Dict[int, cp_model.IntVar], task_ends: Dict[int, cp_model.IntVar]):
-    id = scheduler_fields.id
     # Create a new start variable for this subtask
     start_var = model.NewIntVar(0, horizon, f'start_{id}')
     end_var = model.NewIntVar(0, horizon, f'end_{id}')
@@ -31,28 +40,24 @@ def register_task_start_end(model: cp_model.CpModel, scheduler_fields: Scheduler
     task_starts[id] = start_var
     task_ends[id] = end_var
 
-class ValidTasks:
-    def __init__(self, tasks):
-        self.tasks = tasks
-        self._iterator = None
-
-    def __iter__(self):
-        self._iterator = iter(self.tasks) # Create an iterator over the tasks
-        return self
-
-    def __next__(self) -> InputTask:
-        # Loop through the internal iterator
-        assert self._iterator
-        for task in self._iterator:
-            if not task.scheduler_fields.exclude:
-                return task
-        raise StopIteration
-
-# Find a valid schedule, return assignments
-def schedule(G: DiGraph, metadata: Metadata, person_to_person_id: bidict[Person, int],
-             horizon: int, ts_specific: Dict[InputTask, list[InputTask]], notifications: list[Notification])\
-             -> Tuple[Dict[InputTask, SchedulerAssignment], int]:
+# The model along with the variables we need to read a solution back out
+@dataclass
+class SchedulerModel:
+    model: cp_model.CpModel
+    task_starts: Dict[int, cp_model.IntVar]
+    task_ends: Dict[int, cp_model.IntVar]
+    person_assignments: Dict[int, cp_model.IntVar]
+    makespan: cp_model.IntVar
+    valid: list[int]
+
+# Build the CP-SAT model for the tasks in the table which aren't excluded
+def build_model(L: Graph, fields: SchedulerFields, horizon: int, ts_specific: Dict[int, list[int]]) -> SchedulerModel:
+    tasks = L.tasks
     model: cp_model.CpModel = cp_model.CpModel()
+    valid: list[int] = np.flatnonzero(~fields.exclude).tolist()
+    estimates: list[int] = fields.estimate.tolist()
+    earliest_starts: list[int] = fields.earliest_start.tolist()
+    latest_ends: list[int] = fields.latest_end.tolist()
 
     # Model Variables
     task_starts: Dict[int, cp_model.IntVar] = {}
@@ -61,78 +66,84 @@ def schedule(G: DiGraph, metadata: Metadata, person_to_person_id: bidict[Person,
 
     # -------------------------------------------------------------
     # Build constraints around who may be assigned to certain tasks
-    task: InputTask
-    for task in ValidTasks(G):
-        if not task.scheduler_fields.assignees:
-            register_task_start_end(model, task.scheduler_fields, horizon,
-                                    task_starts, task_ends)
-            assign_people_to_task(model, person_assignments, task.scheduler_fields, task.scheduler_fields.eligible_assignees)
+    for id in valid:
+        register_task_start_end(model, id, horizon, task_starts, task_ends)
+        if not fields.assignees[id]:
+            assign_people_to_task(model, person_assignments, id, fields.eligible_assignees[id])
             continue
-        if not task.specific_assignments:
-            raise Exception(f"Something unexpected happened in scheduling task: {task}")
-        register_task_start_end(model, task.scheduler_fields, horizon,
-                                task_starts, task_ends)
-        assign_people_to_task(model, person_assignments, task.scheduler_fields, task.scheduler_fields.assignees)
+        if not tasks.specific[id]:
+            raise Exception(f"Something unexpected happened in scheduling task: {tasks[id]}")
+        assign_people_to_task(model, person_assignments, id, fields.assignees[id])
 
     # -------------------------------------------------------------
     # Build constraints around ensuring subtasks of multi-assignments
     # are worked on simultaneously
-    for task in ValidTasks(G):
-        for s in ts_specific.get(task, []):
-            model.Add(task_starts[task.scheduler_fields.id] ==
-                      task_starts[s.scheduler_fields.id])
-            model.Add(task_ends[task.scheduler_fields.id] ==
-                      task_ends[s.scheduler_fields.id])
+    for id in valid:
+        for s in ts_specific.get(id, []):
+            model.Add(task_starts[id] == task_starts[s])
+            model.Add(task_ends[id] == task_ends[s])
 
-    # Force all subtasks to match the first start / end
-    # model.Add(starts[subtasks[0]] == starts[subtasks[i]])
-    # model.Add(ends[subtasks[0]] == ends[subtasks[i]])
+    # -------------------------------------------------------------
+    # Warm start from a previous solution, keeping it outright where asked
+    if fields.hint_start is not None:
+        for id in valid:
+            start, end, assignee = int(fields.hint_start[id]), int(fields.hint_end[id]), int(fields.hint_assignee[id])
+            if start < 0 or end > horizon or assignee < 0:
+                continue
+            model.AddHint(task_starts[id], start)
+            model.AddHint(task_ends[id], end)
+            # Single candidates are constants, which the model shares between tasks
+            if len(fields.assignees[id] or fields.eligible_assignees[id]) > 1:
+                model.AddHint(person_assignments[id], assignee)
+            if fields.fixed[id]:
+                model.Add(task_starts[id] == start)
+                model.Add(task_ends[id] == end)
+                model.Add(person_assignments[id] == assignee)
 
     # ---------------------------------------------------------------
     # Tasks must end before their "latest end" assigned date
-    task: InputTask
-    for task in ValidTasks(G):
-        model.Add(task_ends[task.scheduler_fields.id] <= task.scheduler_fields.latest_end)
-        model.Add(task_starts[task.scheduler_fields.id] >= task.scheduler_fields.earliest_start)
+    for id in valid:
+        model.Add(task_ends[id] <= latest_ends[id])
+        model.Add(task_starts[id] >= earliest_starts[id])
 
     # ---------------------------------------------------------------
     # Constrain that successor items start after the end of the deps
-    task: InputTask
-    for task in ValidTasks(G):
-        for successor in G.successors(task):
-            if successor.scheduler_fields.exclude:
-                raise Exception(f"May not have task: {task.name} depending on {successor.name} when {task.name} is not done ( no end date ) but {successor.name} is")
-            model.Add(task_starts[successor.scheduler_fields.id] >= task_ends[task.scheduler_fields.id])
+    for id in valid:
+        for successor in L.successors(id).tolist():
+            if fields.exclude[successor]:
+                name, successor_name = tasks.names[id], tasks.names[successor]
+                raise Exception(f"May not have task: {name} depending on {successor_name} when {name} is not done ( no end date ) but {successor_name} is")
+            model.Add(task_starts[successor] >= task_ends[id])
 
     # ---------------------------------------------------------------
     # Constrain people to non-overlapping tasks
+    registry = tasks.registry
     person_weighted_durations = {}
-    for person, person_id in person_to_person_id.items():
+    for person_id in range(registry.known_people):
         person_intervals = []
         weighted_durations = []
-        task: InputTask
-        for task in ValidTasks(G):
-            is_assigned = model.NewBoolVar(f'assigned_{task.scheduler_fields.id}_to_{person_id}')
+        for id in valid:
+            is_assigned = model.NewBoolVar(f'assigned_{id}_to_{person_id}')
             # Although it'd be less ergonomic to retrive results later, I strongly
             # suspect it's possible to get rid of these variables, and person_assignments 
             # entirely . There's no additional info being provided by having person 
             # assignments to task ids vs. knowing whether or not somebody is assigned 
             # to a task. I tried for 5m and gave up
-            model.Add(person_assignments[task.scheduler_fields.id] == person_id).OnlyEnforceIf(is_assigned)
-            model.Add(person_assignments[task.scheduler_fields.id] != person_id).OnlyEnforceIf(is_assigned.Not())
+            model.Add(person_assignments[id] == person_id).OnlyEnforceIf(is_assigned)
+            model.Add(person_assignments[id] != person_id).OnlyEnforceIf(is_assigned.Not())
             
             # These intervals may or may not exist, depending on whether or not 
             # the person is assigned. If they do, they cant overlap.
             optional_interval = model.NewOptionalIntervalVar(
-                task_starts[task.scheduler_fields.id], task.scheduler_fields.estimate, task_ends[task.scheduler_fields.id], 
-                is_assigned, f'opt_interval_{task.scheduler_fields.id}_{person_id}')
+                task_starts[id], estimates[id], task_ends[id], 
+                is_assigned, f'opt_interval_{id}_{person_id}')
             person_intervals.append(optional_interval)
 
-            weighted_duration = task.scheduler_fields.estimate * is_assigned
+            weighted_duration = estimates[id] * is_assigned
             weighted_durations.append(weighted_duration)
         
         model.AddNoOverlap(person_intervals)
-        person_weighted_durations[person] = weighted_durations
+        person_weighted_durations[person_id] = weighted_durations
 
     # ---------------------------------------------------------------
     # Define and Minimize the makespan
@@ -142,117 +153,187 @@ def schedule(G: DiGraph, metadata: Metadata, person_to_person_id: bidict[Person,
 
     # ---------------------------------------------------------------
     # Finally, ensure allocations are respected wrt the makespan
-    for person in person_to_person_id.keys():
-        a = metadata.people_allocations[person]
+    for person_id in range(registry.known_people):
+        a = registry.allocations[person_id]
         if a != 1.0:
-            model.Add(sum(person_weighted_durations[person]) * 100 <= int(a * 100) * makespan)
+            model.Add(sum(person_weighted_durations[person_id]) * 100 <= int(a * 100) * makespan)
+
+    return SchedulerModel(model, task_starts, task_ends, person_assignments, makespan, valid)
+
+class IncumbentCallback(cp_model.CpSolverSolutionCallback):
+    def __init__(self, makespan: cp_model.IntVar, progress: SolveProgress):
+        super().__init__()
+        self.makespan = makespan
+        self.progress = progress
+
+    def on_solution_callback(self):
+        makespan = int(self.Value(self.makespan))
+        bound = int(np.ceil(self.BestObjectiveBound()))
+        gap = (makespan - bound) / makespan if makespan else 0.0
+        self.progress.report(Incumbent(makespan, bound, gap, self.WallTime()))
+
+# Search threads per solve; 0 leaves it to CP-SAT, which uses every core.
+# With several server workers each solving at once, fewer goes further.
+def solver_threads() -> int:
+    return int(os.getenv('FANTASIA_SOLVER_THREADS', 0))
+
+# How long a solve may look for better schedules, in seconds
+SOLVE_SECONDS = 10.0
+
+# Find a valid schedule, return assignments keyed by row
+def schedule(L: Graph, fields: SchedulerFields, horizon: int, ts_specific: Dict[int, list[int]],
+             notifications: list[Notification], progress: Optional[SolveProgress] = None,
+             seconds: float = SOLVE_SECONDS) -> Tuple[Dict[int, SchedulerAssignment], int]:
+    with span('build_model'):
+        m = build_model(L, fields, horizon, ts_specific)
+        proto = m.model.Proto()
+        annotate(variables=len(proto.variables), constraints=len(proto.constraints))
+        model_variables.observe(len(proto.variables))
+        model_constraints.observe(len(proto.constraints))
 
     # Solve the model
     solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 10
+    solver.parameters.max_time_in_seconds = seconds
+    if solver_threads() > 0:
+        solver.parameters.num_workers = solver_threads()
 
-    status = solver.Solve(model)
+    if progress is None:
+        status = solver.Solve(m.model)
+    elif not progress.started(solver):
+        return dict(), -1
+    else:
+        try:
+            status = solver.Solve(m.model, IncumbentCallback(m.makespan, progress))
+        finally:
+            progress.finished()
+    annotate(status=solver.StatusName(status), wall_ms=round(solver.WallTime() * 1000, 3),
+             conflicts=solver.NumConflicts(), branches=solver.NumBranches())
+    solves.inc(status=solver.StatusName(status))
     if status in [cp_model.INFEASIBLE]:
-        print("Overconstrained")
+        log.info("Overconstrained")
         return dict(), -1
     elif status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-        print("No solution found.")
+        log.warning("No solution found after %.1fs", solver.WallTime())
         return dict(), -1
+    objective, bound = solver.ObjectiveValue(), solver.BestObjectiveBound()
+    annotate(makespan=int(objective), gap=(objective - bound) / objective if objective else 0.0)
     status_str = "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE"
-    s = f'Minimal makespan {status_str}: {solver.Value(makespan)} days\n'
-    print(s)
+    s = f'Minimal makespan {status_str}: {solver.Value(m.makespan)} days\n'
+    log.info(s.strip())
     notifications.append(Notification(Severity.INFO, s))
+    if status == cp_model.FEASIBLE and progress is not None and progress.stopped and progress.best is not None:
+        notifications.append(Notification(Severity.INFO, f"Stopped early, a schedule could be up to {progress.best.makespan - progress.best.bound} days shorter"))
 
-    ret: Dict[InputTask, SchedulerAssignment] = dict()
-    for task in ValidTasks(G):
-        id = task.scheduler_fields.id
-        start = solver.Value(task_starts[id])
-        end = solver.Value(task_ends[id])
-        assignee = solver.Value(person_assignments[id])
-        ret[task] = SchedulerAssignment(id, start, end, assignee)
+    ret: Dict[int, SchedulerAssignment] = dict()
+    for id in m.valid:
+        start = solver.Value(m.task_starts[id])
+        end = solver.Value(m.task_ends[id])
+        assignee = solver.Value(m.person_assignments[id])
+        ret[id] = SchedulerAssignment(id, start, end, assignee)
 
-    return ret, solver.Value(makespan)
+    return ret, solver.Value(m.makespan)
  
-# Returns a pair of specific, eligible
-def get_assignees(task: InputTask, metadata: Metadata, person_to_person_id: bidict[Person, int]) -> Tuple[list[int], list[int]]:
+# Returns a pair of specific, eligible person ids
+def get_assignees(tasks: TaskTable, row: int) -> Tuple[list[int], list[int]]:
+    registry = tasks.registry
+    assignees = tasks.assignees(row).tolist()
     # They are either all specific assignments or all team
-    if not task.assignees:
-        return [], [person_to_person_id[p] for p in metadata.people_allocations.keys()]
-    if task.specific_assignments:
-        return [person_to_person_id[Person(p)] for p in task.assignees], []
+    if not assignees:
+        return [], list(range(registry.known_people))
+    if tasks.specific[row]:
+        return assignees, []
     pool: set[int] = set()
-    for team in task.assignees:
-        for p in metadata.teams[team].members:
-            pool.add(person_to_person_id[p])
+    for team in assignees:
+        pool.update(registry.team_members[team])
 
-    return [], list(pool)
+    return [], sorted(pool)
 
 @dataclass
 class DateResult:
-    start_offset: int # Busdays from today until start
-    end_offset: int # Busdays from today until end
-    exclude: bool # whether or not to include this value
-    remaining_estimate: int # adjusted if today >= start / in progress
-
-def densify_dates(today: date, start: Optional[date], end: Optional[date], estimate: int, horizon: int) -> DateResult:
-    start_offset = busdays_between(today, start) if start else 0
-    end_offset = busdays_between(today, end) if end else horizon
+    start_offset: np.ndarray # Busdays from today until start
+    end_offset: np.ndarray # Busdays from today until end
+    exclude: np.ndarray # whether or not to include this value
+    remaining_estimate: np.ndarray # adjusted if today >= start / in progress
+
+# Densify the start / end columns of a whole table at once
+def densify_dates(today: date, starts: np.ndarray, ends: np.ndarray, estimates: np.ndarray, horizon: int) -> DateResult:
+    today64 = np.datetime64(today, 'D')
+    has_start = ~np.isnat(starts)
+    has_end = ~np.isnat(ends)
+    start_offset = np.where(has_start, np.busday_count(today64, np.where(has_start, starts, today64)), 0)
+    end_offset = np.where(has_end, np.busday_count(today64, np.where(has_end, ends, today64)), horizon)
     exclude = end_offset < 0
 
     # If not already started ( and assuming includced ) then
     # end date must be after today. Assume it's still being worked on
-    if start_offset < 0:
-        scheduling_estimate = max(0, busdays_between(today, busdays_offset(start, estimate)))
-        start_offset = 0
-    else:
-        scheduling_estimate = estimate
+    started = start_offset < 0
+    started_end = np.busday_offset(np.where(started, starts, today64), np.where(started, estimates, 0), roll='forward')
+    scheduling_estimate = np.where(started, np.maximum(0, np.busday_count(today64, started_end)), estimates)
+    start_offset = np.where(started, 0, start_offset)
 
     return DateResult(start_offset, end_offset, exclude, scheduling_estimate)
 
 # 1. Expand assignees into eligible assignees
-# 2. Assign unique people_id to Person
-# 3. Assign unique task_id to task
+# 2. People and tasks already have dense ids from the registry
 # We need the subtasks mapping because specifically for the
 # ones with multiple "specific" assignments we need to ensure
 # they have the same start / end date
-def find_solution(G: DiGraph, m: Metadata, ts_specific: Dict[InputTask, list[InputTask]], notifications: list[Notification]) -> Tuple[int, int]:
-    # Build dense Person / PersonId 
-    person_to_person_id: bidict[Person, int] = bidict()
-    task_to_task_id: bidict[InputTask, int] = bidict()
-
-    # First we build the dense person identifiers
-    id = 0
-    for p in m.people_allocations.keys():
-        person_to_person_id[p] = id
-        id += 1
-    horizon = sum([task.estimate for task in G])
+# Hints warm start the solver from a previous solution, and offsets are
+# the rollbacks ( in business days ) to try in order. progress follows
+# ( and can stop ) the solves, each of which gets seconds.
+def find_solution(L: Graph, ts_specific: Dict[int, list[int]], notifications: list[Notification],
+                  hints: Optional[SchedulerHints] = None, offsets: Iterable[int] = range(0, 80, 5),
+                  progress: Optional[SolveProgress] = None, seconds: float = SOLVE_SECONDS) -> Tuple[int, int]:
+    tasks = L.tasks
+    horizon = int(tasks.estimates.sum())
+
+    # Expanding assignees doesn't depend on the date, so only do it once
+    specific: list[list[int]] = []
+    pool: list[list[int]] = []
+    for row in range(len(tasks)):
+        s, p = get_assignees(tasks, row)
+        specific.append(s)
+        pool.append(p)
 
     today: date = datetime.datetime.now().date()
     offset: int = 0
-    for offset in range(0, 80, 5):
-        # Expand assignees, densify dates and task_id
-        id = 0
+    for offset in offsets:
+        # Densify dates for the whole table
         today_offset = busdays_offset(today, -offset)
-        task: InputTask
-        for task in G:
-            specific, pool = get_assignees(task, m, person_to_person_id)
-            res: DateResult = densify_dates(today_offset, task.start_date, task.end_date, task.estimate, horizon)
-            task.scheduler_fields = SchedulerFields(id, pool, specific, res.start_offset, res.end_offset, res.remaining_estimate, res.exclude)
-            task_to_task_id[task] = id
-            id += 1
+        res: DateResult = densify_dates(today_offset, tasks.starts, tasks.ends, tasks.estimates, horizon)
+        fields = SchedulerFields(pool, specific, res.start_offset, res.end_offset, res.remaining_estimate, res.exclude)
+        if hints is not None:
+            today64 = np.datetime64(today_offset, 'D')
+            hinted = ~np.isnat(hints.starts) & ~np.isnat(hints.ends)
+            fields.hint_start = np.full(len(tasks), -1, dtype=np.int64)
+            fields.hint_end = np.full(len(tasks), -1, dtype=np.int64)
+            fields.hint_start[hinted] = np.busday_count(today64, hints.starts[hinted])
+            fields.hint_end[hinted] = np.busday_count(today64, hints.ends[hinted])
+            fields.hint_assignee = hints.assignees
+            fields.fixed = hints.fixed
 
         # At this point all scheduler fields are ready, we can attempt a solution no
-        assignments, makespan = schedule(G, m, person_to_person_id, horizon, ts_specific, notifications)
+        with span('solve', offset=offset):
+            assignments, makespan = schedule(L, fields, horizon, ts_specific, notifications, progress, seconds)
         if assignments:
-            # Apply the solution to the original graph
-            # if we found one
-            for task in ValidTasks(G):
-                assignment: SchedulerAssignment = assignments[task]
-                task.start_date = busdays_offset(today_offset, assignment.start_date)
-                task.end_date = busdays_offset(today_offset, assignment.end_date)
-                task.assignees = [person_to_person_id.inv[assignment.assignee].name]
+            # Apply the solution to the table if we found one
+            rows = list(assignments.keys())
+            today64 = np.datetime64(today_offset, 'D')
+            tasks.starts[rows] = np.busday_offset(today64, [assignments[r].start_date for r in rows], roll='forward')
+            tasks.ends[rows] = np.busday_offset(today64, [assignments[r].end_date for r in rows], roll='forward')
+            tasks.specific[rows] = True
+            assignees = [tasks.assignees(row) for row in range(len(tasks))]
+            for row, assignment in assignments.items():
+                assignees[row] = [assignment.assignee]
+            tasks.replace_assignees(assignees)
             if offset != 0:
                 notifications.append(Notification(Severity.WARN, f"Schedule only discovered by rolling back to {today_offset}"))
+            schedules.inc(offset=offset)
             return makespan, offset
+        if progress is not None and progress.stopped:
+            notifications.append(Notification(Severity.WARN, "Stopped before a schedule was found"))
+            schedules.inc(offset='none')
+            return -1, offset
+    schedules.inc(offset='none')
     notifications.append(Notification(Severity.WARN, f"Unable to find a schedule after rolling back to {today}"))
     return -1, offset
@@ -14,11 +14,11 @@ class SchedulerTest(unittest.TestCase):
                 InputTask("Task2", "", False, ['All'], [], False, 2, None, None, Status.NotStarted, 1),
                 InputTask("Task3", "", False, ['All'], [], False, 4, None, None, Status.NotStarted, 2),
                 ]
-        metadata = Metadata()
-        metadata.people_allocations = {Person("Alice"): 1}
-        metadata.teams = {'All': Team('All', [Person("Alice")])}
+        people_allocations = {Person("Alice"): 1}
+        teams = {'All': Team('All', [Person("Alice")])}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(9, makespan)
 
@@ -28,16 +28,16 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", False, ['All'], [], False, 2, None, None, Status.NotStarted, 1),
             InputTask("Task3", "", False, ['All'], [], False, 4, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1
         }
-        metadata.teams = {
+        teams = {
             'All': Team('All', [Person("Alice"), Person("Bob")])
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(5, makespan)  # Max(3+2, 4)
 
@@ -47,11 +47,11 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", False, ['All'], ["Task1"], False, 3, None, None, Status.NotStarted, 1),
             InputTask("Task3", "", False, ['All'], ["Task2"], False, 1, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {Person("Alice"): 1}
-        metadata.teams = {'All': Team('All', [Person("Alice")])}
+        people_allocations = {Person("Alice"): 1}
+        teams = {'All': Team('All', [Person("Alice")])}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(6, makespan)  # 2 + 3 + 1
     
@@ -61,14 +61,14 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", True, ["Bob"], [], False, 3, None, None, Status.NotStarted, 1),
             InputTask("Task3", "", True, ["Alice"], [], False, 1, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1
         }
-        metadata.teams = {}
+        teams = {}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(3, makespan)  # Max(2+1, 3)
 
@@ -78,17 +78,17 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", True, ["Alice", "Bob"], ["Task3"], False, 3, None, None, Status.NotStarted, 1),
             InputTask("Task3", "", False, ['All'], [], False, 1, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
             Person("Charlie"): 1,
         }
-        metadata.teams = {
+        teams = {
             'All': Team('All', [Person("Alice"), Person("Bob"), Person("Charlie")])
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(6, makespan)
 
@@ -98,19 +98,19 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", False, ["Pool2"], [], False, 3, None, None, Status.NotStarted, 1),
             InputTask("Task3", "", False, ["Pool3"], [], False, 1, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
             Person("Charlie"): 1,
         }
-        metadata.teams = {
+        teams = {
             "Pool1": Team("Pool1", [Person("Alice"), Person("Bob")]),
             "Pool2": Team("Pool2", [Person("Bob"), Person("Charlie")]),
             "Pool3": Team("Pool3", [Person("Alice")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(3, makespan)
 
@@ -120,11 +120,11 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", False, ['All'], [], False, 3, None, busdays_offset(today, 2), Status.NotStarted, 1),
             InputTask("Task3", "", False, ['All'], [], False, 1, None, busdays_offset(today, 3), Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {Person("Alice"): 1}
-        metadata.teams = {'All': Team('All', [Person("Alice")])}
+        people_allocations = {Person("Alice"): 1}
+        teams = {'All': Team('All', [Person("Alice")])}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(5, offset)
         self.assertEqual(6, makespan)
 
@@ -134,11 +134,11 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", False, ['All'], [], False, 3, None, busdays_offset(today, 4), Status.NotStarted, 1),
             InputTask("Task3", "", False, ['All'], [], False, 1, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {Person("Alice"): 1}
-        metadata.teams = {'All': Team('All', [Person("Alice")])}
+        people_allocations = {Person("Alice"): 1}
+        teams = {'All': Team('All', [Person("Alice")])}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertGreater(offset, 0)
         self.assertEqual(6, makespan)
 
@@ -150,16 +150,16 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task4", "", False, ['All'], ["Task5"], False, 2, None, None, Status.NotStarted, 3),
             InputTask("Task5", "", False, ['All'], [], False, 1, None, None, Status.NotStarted, 4),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
         }
-        metadata.teams = {
+        teams = {
             'All': Team('All', [Person("Alice"), Person("Bob")])
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(7, makespan)  # 1 → 3 → 4 → 5 = 1 + 3 + 2 + 1
 
@@ -169,15 +169,15 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task2", "", True, ["Bob", "Charlie"], [], False, 3, None, None, Status.NotStarted, 1),
             InputTask("Task3", "", True, ["Alice", "Charlie"], [], False, 1, None, None, Status.NotStarted, 2),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
             Person("Charlie"): 1,
         }
-        metadata.teams = {}
+        teams = {}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(6, makespan)
 
@@ -188,15 +188,15 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task3", "", False, ['All'], [], False, 1, None, None, Status.NotStarted, 2),
             InputTask("Task4", "", True, ["Alice", "Bob"], [], False, 2, None, None, Status.NotStarted, 3),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
             Person("Charlie"): 1,
         }
-        metadata.teams = {'All': Team('All', [Person("Alice"), Person("Bob"), Person("Charlie")])}
+        teams = {'All': Team('All', [Person("Alice"), Person("Bob"), Person("Charlie")])}
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(5, makespan)
 
@@ -211,11 +211,10 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task7", "", False, ["Team5"], ["Task8"], False, 3, None, None, Status.NotStarted, 6),
             InputTask("Task8", "", False, ["Team6"], [], False, 2, None, None, Status.NotStarted, 7),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person(p): 1 for p in ["Alice", "Bob", "Charlie", "Dave", "Eve", "Frank", "Grace", "Heidi", "Ivan"]
         }
-        metadata.teams = {
+        teams = {
             "Team1": Team("Team1", [Person("Alice"), Person("Dave")]),
             "Team2": Team("Team2", [Person("Bob"), Person("Eve")]),
             "Team3": Team("Team3", [Person("Charlie"), Person("Frank")]),
@@ -223,8 +222,9 @@ class SchedulerTest(unittest.TestCase):
             "Team5": Team("Team5", [Person("Eve"), Person("Heidi")]),
             "Team6": Team("Team6", [Person("Frank"), Person("Ivan")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(21, makespan)
 
@@ -236,19 +236,19 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task4", "", False, ["T1"], [], False, 2, None, busdays_offset(today, 12), Status.NotStarted, 3),
             InputTask("Task5", "", False, ["T2"], [], False, 3, None, busdays_offset(today, 15), Status.NotStarted, 4),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
             Person("Charlie"): 1
         }
-        metadata.teams = {
+        teams = {
             "T1": Team("T1", [Person("Alice"), Person("Bob")]),
             "T2": Team("T2", [Person("Bob"), Person("Charlie")]),
             "T3": Team("T3", [Person("Alice"), Person("Charlie")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(12, makespan)
 
@@ -262,18 +262,18 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task6", "", False, ["T3"], ["Task7"], False, 4, None, None, Status.NotStarted, 5),
             InputTask("Task7", "", False, ["T4"], [], False, 3, None, None, Status.NotStarted, 6),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person(p): 1 for p in ["Alice", "Bob", "Charlie", "Dave", "Eve", "Frank", "Grace"]
         }
-        metadata.teams = {
+        teams = {
             "T1": Team("T1", [Person("Bob"), Person("Eve"), Person("Frank")]),
             "T2": Team("T2", [Person("Charlie"), Person("Dave"), Person("Grace")]),
             "T3": Team("T3", [Person("Eve"), Person("Frank"), Person("Grace")]),
             "T4": Team("T4", [Person("Alice"), Person("Eve"), Person("Grace")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(22, makespan)
 
@@ -290,11 +290,10 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task9", "", False, ["T9"], [], False, 4, None, None, Status.NotStarted, 8),
             InputTask("Task10", "", False, ["T10"], [], False, 2, None, None, Status.NotStarted, 9),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person(p): 1 for p in ["Alice", "Bob", "Charlie", "Dave", "Eve", "Frank"]
         }
-        metadata.teams = {
+        teams = {
             "T1": Team("T1", [Person("Alice"), Person("Bob")]),
             "T2": Team("T2", [Person("Bob"), Person("Charlie")]),
             "T3": Team("T3", [Person("Charlie"), Person("Dave")]),
@@ -306,8 +305,9 @@ class SchedulerTest(unittest.TestCase):
             "T9": Team("T9", [Person("Eve"), Person("Alice")]),
             "T10": Team("T10", [Person("Frank"), Person("Bob")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(5, makespan)
 
@@ -322,8 +322,7 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task7", "", True, ["Alice", "Bob", "Charlie", "Dave", "Eve", "Frank", "Grace"], [], False, 2, None, None, Status.NotStarted, 6),
         ]
         
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
             Person("Charlie"): 1,
@@ -332,13 +331,14 @@ class SchedulerTest(unittest.TestCase):
             Person("Frank"): 1,
             Person("Grace"): 1,
         }
-        metadata.teams = {
+        teams = {
             "T1": Team("T1", [Person("Bob"), Person("Charlie")]),
             "T2": Team("T2", [Person("Dave"), Person("Eve")]),
             "T3": Team("T3", [Person("Frank"), Person("Grace")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(9, makespan)
 
@@ -358,17 +358,17 @@ class SchedulerTest(unittest.TestCase):
 
             InputTask("Task10", "", True, ["Alice", "Charlie", "Eve"], [], False, 3, None, busdays_offset(today, 20), Status.NotStarted, 9),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person(p): 1 for p in ["Alice", "Bob", "Charlie", "Dave", "Eve", "Frank"]
         }
-        metadata.teams = {
+        teams = {
             "T1": Team("T1", [Person("Alice"), Person("Bob")]),
             "T2": Team("T2", [Person("Charlie"), Person("Dave")]),
             "T3": Team("T3", [Person("Eve"), Person("Frank")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(15, makespan)
 
@@ -388,17 +388,17 @@ class SchedulerTest(unittest.TestCase):
 
             InputTask("Task10", "", True, ["DevOps"], [], False, 1, None, None, Status.NotStarted, 9),
         ]
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person(p): 1 for p in ["Expert", "Designer1", "Designer2", "Dev1", "Dev2", "Dev3", "QA1", "QA2", "DevOps"]
         }
-        metadata.teams = {
+        teams = {
             "Design": Team("Design", [Person("Designer1"), Person("Designer2")]),
             "Dev": Team("Dev", [Person("Dev1"), Person("Dev2"), Person("Dev3")]),
             "QA": Team("QA", [Person("QA1"), Person("QA2")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(17, makespan)
 
@@ -416,22 +416,22 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task10", "", False, ["All"], [], False, 4, None, None, Status.NotStarted, 9),
         ]
 
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Frontend1"): 1,
             Person("Frontend2"): 1,
             Person("Backend1"): 1,
             Person("Backend2"): 1,
             Person("DB1"): 1
         }
-        metadata.teams = {
+        teams = {
             "Frontend": Team("Frontend", [Person("Frontend1"), Person("Frontend2")]),
             "Backend": Team("Backend", [Person("Backend1"), Person("Backend2")]),
             "DB": Team("DB", [Person("DB1")]),
             "All": Team("All", [Person("Frontend1"), Person("Frontend2"), Person("Backend1"), Person("Backend2"), Person("DB1")]),
         }
+        metadata = Metadata(teams, people_allocations)
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         self.assertEqual(0, offset)
         self.assertEqual(12, makespan)
 
@@ -443,17 +443,17 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Task4", "", False, ['All'], ["Task1"], False, 4, None, None, Status.NotStarted, 3),  # Creates cycle
         ]
 
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Alice"): 1,
             Person("Bob"): 1,
         }
-        metadata.teams = {
+        teams = {
             "All": Team("All", [Person("Alice"), Person("Bob")])
         }
+        metadata = Metadata(teams, people_allocations)
 
         with self.assertRaisesRegex(Exception, "Cycle detected in graph.*"):
-            build_graph_and_schedule(tasks, metadata, [])
+            build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
 
     def test_csv_based_parallel_task_graph(self):
         tasks = [
@@ -464,17 +464,17 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Done", "Done", False, [], [], False, 0, None, None, Status.NotStarted, 4),
         ]
     
-        metadata = Metadata()
-        metadata.people_allocations = {
+        people_allocations = {
             Person("Lewis"): 1,
             Person("John"): 1,
             Person("Jack"): 1,
         }
-        metadata.teams = {
+        teams = {
             "All": Team("All", [Person("Lewis"), Person("John"), Person("Jack")])
         }
+        metadata = Metadata(teams, people_allocations)
     
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         
         self.assertEqual(0, offset)
         self.assertEqual(8, makespan)
@@ -488,7 +488,7 @@ class SchedulerTest(unittest.TestCase):
             InputTask("Done", "Done", False, [], [], False, 0, None, None, Status.NotStarted, 4),
         ]
 
-        _, makespan, offset = build_graph_and_schedule(tasks, metadata, [])
+        _, makespan, offset = build_graph_and_schedule(TaskTable.from_tasks(tasks, metadata), metadata, [])
         
         self.assertEqual(0, offset)
         # Its 11 without parallelism
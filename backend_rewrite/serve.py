@@ -0,0 +1,137 @@
+# Preforking entry point. The master process imports the app and warms
+# everything heavy ( numpy, ortools and its native solver, flask ) by
+# running one small sheet through the pipeline, then forks workers which
+# share those pages copy-on-write and all accept on the one listening
+# socket. A worker that dies is replaced.
+#
+#   FLASK_SECRET_KEY=... python -m backend_rewrite.serve --workers 4 --solver-threads 2
+#
+# The workers serve with werkzeug's development server, so this is for
+# trying things out and for small internal deployments with nothing but
+# the standard library. In production run gunicorn, which does the same
+# warm up through application() here, see gunicorn_config.py. app.py's
+# own __main__ is the single process debug server, for development.
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict
+
+from .trace import configure_logging
+
+log = logging.getLogger(__name__)
+
+# Small enough to solve instantly, but through every stage a real request takes
+WARM_SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tnext
+%TEAM\tAll\tA\tB
+T1\tT1\t2\t\t\tnot started\tAll\tT2
+T2\tT2\t1\t\t\tnot started\tA\t'''
+
+# Imports the app and runs a sheet through it, so nothing is left to load
+# on a worker's first request. Returns the app.
+def warm():
+    from . import app as server
+    from .graph import decorate_and_notify
+    from .dot import generate_dot_file
+    tasks, metadata = server.parse_request(WARM_SHEET)
+    G, _, _ = server.build_graph_and_schedule(tasks, metadata, [])
+    generate_dot_file(G, decorate_and_notify(G, []))
+    return server.app
+
+def listen(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+# Never returns
+def work(app, host: str, sock: socket.socket) -> None:
+    from werkzeug.serving import make_server
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    try:
+        make_server(host, sock.getsockname()[1], app, threaded=True, fd=sock.fileno()).serve_forever()
+    finally:
+        os._exit(1)
+
+def fork(app, host: str, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        work(app, host, sock)
+    return pid
+
+# Checks what every worker needs is set, and passes the solver threads on
+# to the workers, which read it as they solve
+def configure(workers: int, solver_threads: int) -> None:
+    if not os.getenv('FLASK_SECRET_KEY'):
+        raise Exception("Set FLASK_SECRET_KEY, every worker needs the same one to read sessions")
+    configure_logging()
+    if os.getenv('FANTASIA_PLAN_DB') is None and workers > 1:
+        log.warning("FANTASIA_PLAN_DB isn't set, so each worker keeps its own plans and copying a plan out can miss")
+    os.environ['FANTASIA_SOLVER_THREADS'] = str(solver_threads)
+
+# For gunicorn with preload_app, which calls it once in the master
+def application():
+    configure(int(os.getenv('FANTASIA_WORKERS', os.cpu_count() or 1)), int(os.getenv('FANTASIA_SOLVER_THREADS', 0)))
+    started = time.perf_counter()
+    app = warm()
+    log.info("Warmed up in %.2fs", time.perf_counter() - started)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=os.getenv('FANTASIA_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('FANTASIA_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('FANTASIA_WORKERS', os.cpu_count() or 1)))
+    # CP-SAT search threads per solve, see scheduler.solver_threads
+    parser.add_argument('--solver-threads', type=int, default=int(os.getenv('FANTASIA_SOLVER_THREADS', 0)))
+    parser.add_argument('--backlog', type=int, default=128)
+    args = parser.parse_args()
+
+    configure(args.workers, args.solver_threads)
+
+    started = time.perf_counter()
+    app = warm()
+    # Keep what's loaded so far out of the collector's way, so collections
+    # in the workers don't write to ( and so copy ) the shared pages
+    gc.collect()
+    gc.freeze()
+    sock = listen(args.host, args.port, args.backlog)
+    log.info("Warmed up in %.2fs, serving on %s:%d with %d workers", time.perf_counter() - started, args.host,
+             sock.getsockname()[1], args.workers)
+
+    workers: Dict[int, int] = dict()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for i in range(args.workers):
+        workers[fork(app, args.host, sock)] = i
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        i = workers.pop(pid, None)
+        if i is not None and not stopping:
+            log.warning("Worker %d ( pid %d ) exited with status %d, replacing it", i, pid, os.waitstatus_to_exitcode(status))
+            workers[fork(app, args.host, sock)] = i
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import atexit
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+# Per-user state kept between requests: the plan to copy out of
+# /get-copy-text, and the snapshot which lets a user's next run reuse
+# their last. Both are bounded, by entry count and by age. Plans can live
+# in SQLite so that every worker behind a load balancer sees the same
+# ones; snapshots are too big and too short lived to be worth sharing, a
+# worker without one just solves from scratch.
+
+# An LRU of at most max_entries, none older than ttl seconds
+class MemoryStore:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(user)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[user]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: str, value: Any) -> None:
+        with self.lock:
+            self.entries[user] = (time.monotonic(), value)
+            self.entries.move_to_end(user)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self.entries),
+            }
+
+# Text per user in a SQLite database any number of processes can share.
+# Text is stored zlib compressed. Writes are queued and committed in
+# batches by a background thread every flush_interval seconds, so a burst
+# of requests costs one transaction; until then this process reads its
+# own writes from the queue. Rows older than ttl are never returned, and
+# are deleted as batches are written.
+class SqliteStore:
+    def __init__(self, path: str, ttl: float, flush_interval: float = 0.05):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Tuple[float, bytes]] = dict()
+        self.wake = threading.Event()
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.writes = 0
+
+        db = self.connection()
+        with db:
+            db.execute('CREATE TABLE IF NOT EXISTS plans (user TEXT PRIMARY KEY, written REAL NOT NULL, plan BLOB NOT NULL) WITHOUT ROWID')
+            db.execute('CREATE INDEX IF NOT EXISTS plans_written ON plans (written)')
+        self.flusher = threading.Thread(target=self.run, name='plan-store', daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    # Connections can't be shared between threads, so each has its own
+    def connection(self) -> sqlite3.Connection:
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def get(self, user: str) -> Optional[str]:
+        with self.lock:
+            queued = self.pending.get(user)
+        if queued is not None:
+            written, plan = queued
+        else:
+            row = self.connection().execute('SELECT written, plan FROM plans WHERE user = ?', (user,)).fetchone()
+            written, plan = row if row is not None else (0.0, None)
+        with self.lock:
+            if plan is None or time.time() - written > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return zlib.decompress(plan).decode('utf-8')
+
+    def put(self, user: str, text: str) -> None:
+        plan = zlib.compress(text.encode('utf-8'), 6)
+        with self.lock:
+            self.pending[user] = (time.time(), plan)
+        self.wake.set()
+
+    # Commits everything queued so far in one transaction
+    def flush(self) -> None:
+        with self.lock:
+            batch = dict(self.pending)
+        if not batch:
+            return
+        db = self.connection()
+        with db:
+            db.executemany('INSERT OR REPLACE INTO plans (user, written, plan) VALUES (?, ?, ?)',
+                           [(user, written, plan) for user, (written, plan) in batch.items()])
+            db.execute('DELETE FROM plans WHERE written < ?', (time.time() - self.ttl,))
+        with self.lock:
+            # Anything written again meanwhile stays queued for the next batch
+            for user, entry in batch.items():
+                if self.pending.get(user) is entry:
+                    del self.pending[user]
+            self.batches += 1
+            self.writes += len(batch)
+
+    def run(self) -> None:
+        while not self.closed:
+            self.wake.wait()
+            self.wake.clear()
+            # Give a burst time to arrive
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self) -> None:
+        self.closed = True
+        self.wake.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'batches': self.batches,
+                'writes': self.writes,
+                'pending': len(self.pending),
+            }
+
+# Shared by every request in the process; made on first use so the
+# environment is read after startup configuration
+stores_lock = threading.Lock()
+plan_store = None
+snapshot_store: Optional[MemoryStore] = None
+
+# Plans go in SQLite at FANTASIA_PLAN_DB if that's set, which every worker
+# should point at the same file, in memory otherwise
+def get_plan_store():
+    global plan_store
+    with stores_lock:
+        if plan_store is None:
+            ttl = float(os.getenv('FANTASIA_PLAN_TTL', 7 * 24 * 3600))
+            path = os.getenv('FANTASIA_PLAN_DB')
+            if path:
+                plan_store = SqliteStore(path, ttl)
+            else:
+                plan_store = MemoryStore(int(os.getenv('FANTASIA_PLAN_ENTRIES', 10000)), ttl)
+        return plan_store
+
+def get_snapshot_store() -> MemoryStore:
+    global snapshot_store
+    with stores_lock:
+        if snapshot_store is None:
+            snapshot_store = MemoryStore(int(os.getenv('FANTASIA_SNAPSHOT_ENTRIES', 256)),
+                                         float(os.getenv('FANTASIA_SNAPSHOT_TTL', 24 * 3600)))
+        return snapshot_store
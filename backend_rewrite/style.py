@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Tuple
+import textwrap
+
+from .dateutil import busdays_between
+from .dag import Graph
+from .types import *
+
+# How a task and its edges look, shared by the DOT output and the
+# renderers which draw in Python
+
+# Red if it should be done or underway and isn't, green if it's underway,
+# yellow if it starts soon
+def node_border(task: InputTask, today: date) -> Tuple[int, str]:
+    if task.end_date and today > task.end_date:
+        return 4, 'red'
+    # As long as it's in progress it's OK
+    elif task.start_date and today >= task.start_date:
+        if task.status != Status.InProgress:
+            return 4, 'red'
+        return 4, 'lightgreen'
+    elif task.start_date and busdays_between(today, task.start_date) <= SOON_THRESHOLD:
+        return 4, 'lightyellow'
+    return 2, 'black'
+
+# The border of a task's table: done tasks and milestones are drawn plainly
+def table_border(task: InputTask, today: date) -> Tuple[int, str]:
+    if task.estimate == 0:
+        return 1, 'black'
+    if task.status == Status.Completed:
+        return 1, 'lightblue'
+    return node_border(task, today)
+
+def status_color(task: InputTask) -> str:
+    return 'red' if task.status == 'blocked' else 'lightgreen' if task.status == 'in progress' else 'white'
+
+# Colour, pen width and label of an edge
+def edge_style(G: Graph, e: int) -> Tuple[str, int, str]:
+    color = 'gray'
+    width = 1
+    label = ''
+    slack = G.slack[e]
+    if G.critical[e]:
+        color = 'black'
+        width = 4
+    if slack > 0:
+        label = f"+{slack}d"
+    elif slack < 0:
+        color = 'red'
+        label = f"late {abs(slack)}d"
+    return color, width, label
+
+@dataclass
+class Cell:
+    lines: list[str]
+    bgcolor: str = 'white'
+    colspan: int = 1
+
+# The rows of cells in a task's table, which dot_task and layout.draw_node
+# both draw. The first row is the title.
+def node_rows(task: InputTask) -> list[list[Cell]]:
+    desc = textwrap.wrap(task.description, width=70)
+    end = Cell([f'{task.end_date}'])
+    # Milestones are tasks with zero days estimated effort.
+    if task.estimate == 0:
+        return [[Cell([task.name])], [end], [Cell(desc, '#FFD580')]]
+
+    assignees = Cell([', '.join(task.assignees)])
+    estimate = Cell([f"{task.estimate}d"])
+    match task.status:
+        case Status.Completed:
+            return [[Cell([f'{task.name} (done)'], 'lightblue')], [end]]
+        case Status.NotStarted:
+            return [[Cell([task.name], colspan=2)], [Cell([f'{task.start_date}']), end],
+                    [assignees, estimate], [Cell(desc, colspan=2)]]
+        case _:
+            color = status_color(task)
+            assignees.colspan = 2
+            return [[Cell([task.name], color, 3)], [Cell([f'{task.start_date}']), Cell([f'{task.status}'], color), end],
+                    [assignees, estimate], [Cell(desc, colspan=3)]]
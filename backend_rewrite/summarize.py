@@ -0,0 +1,199 @@
+from dataclasses import dataclass, field
+import os
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+from .dag import Graph
+from .expand import take_rows
+from .notification import Notification, Severity
+from .types import *
+
+# Cuts G down to what's worth drawing, so render time and SVG size stay
+# bounded however big the sheet is. Collapsing replaces every group of
+# tasks ( by team, status or the Group column ) with a single node
+# summing them up; focusing keeps only the tasks around a few chosen ones,
+# or the critical chain. Either way the result is an ordinary Graph with
+# decorations, which renders like any other.
+
+GROUPINGS = ('team', 'status', 'group')
+
+# Collapse anything with more tasks than this, unless asked not to
+def max_nodes() -> int:
+    return int(os.getenv('FANTASIA_MAX_NODES', 300))
+
+@dataclass
+class Summary:
+    G: Graph
+    decorations: list[Decoration]
+    # Rows of G which stand for a collapsed group, and the group
+    clusters: Dict[int, str] = field(default_factory=dict)
+
+# The group every row falls in
+def group_labels(tasks: TaskTable, by: str) -> list[str]:
+    match by:
+        case 'status':
+            return [str(STATUS_CODES[c]) for c in tasks.statuses.tolist()]
+        case 'group':
+            names = tasks.registry.groups.names
+            return [names[g] if g >= 0 else 'Ungrouped' for g in tasks.group_ids.tolist()]
+        case 'team':
+            # A task's team is the team it was assigned to, or the first
+            # team declaring its first assignee
+            r = tasks.registry
+            person_team = np.full(len(r.people), -1, dtype=np.int64)
+            for team, members in reversed(list(enumerate(r.team_members))):
+                person_team[members] = team
+            has = np.diff(tasks.assignee_offsets) > 0
+            first = np.full(len(tasks), -1, dtype=np.int64)
+            first[has] = tasks.assignee_ids[tasks.assignee_offsets[:-1][has]]
+            team = first.copy()
+            specific = has & tasks.specific
+            team[specific] = person_team[first[specific]]
+            names = r.teams.names
+            return [names[t] if t >= 0 else 'No team' for t in team.tolist()]
+        case _:
+            raise Exception(f"Can't collapse by '{by}', expected one of {', '.join(GROUPINGS)}")
+
+# What a group of tasks adds up to
+def group_status(statuses: np.ndarray) -> Status:
+    codes = set(statuses.tolist())
+    if codes == {STATUS_TO_CODE[Status.Completed]}:
+        return Status.Completed
+    for status in (Status.Blocked, Status.InProgress):
+        if STATUS_TO_CODE[status] in codes:
+            return status
+    return Status.NotStarted
+
+# Carries slack and the critical flag over from the edges of G. node maps
+# rows of G to rows of H; edges of G which land on the same edge of H
+# keep the least slack, and are critical if any of them are.
+def carry_edges(G: Graph, H: Graph, node: np.ndarray) -> None:
+    m = max(len(H), 1)
+    a, b = node[G.src], node[G.succ]
+    kept = (a >= 0) & (b >= 0) & (a != b)
+    keys = a[kept] * m + b[kept]
+    target = np.searchsorted(H.src.astype(np.int64) * m + H.succ, keys)
+    H.slack[:] = np.iinfo(np.int64).max
+    np.minimum.at(H.slack, target, G.slack[kept])
+    np.logical_or.at(H.critical, target, G.critical[kept])
+    H.slack[H.slack == np.iinfo(np.int64).max] = 0
+
+# Replaces each group with one node, except for the groups in expand
+def collapse(G: Graph, decorations: list[Decoration], by: str, expand: Iterable[str] = (),
+             notifications: Optional[list[Notification]] = None) -> Summary:
+    tasks = G.tasks
+    labels = group_labels(tasks, by)
+    members: Dict[str, list[int]] = dict()
+    for row, label in enumerate(labels):
+        members.setdefault(label, []).append(row)
+
+    # Expand what was asked for, for as long as it fits
+    expanded = set()
+    size = len(members)
+    for label in expand:
+        if label not in members or label in expanded:
+            continue
+        if size + len(members[label]) - 1 > max_nodes():
+            if notifications is not None:
+                notifications.append(Notification(Severity.WARN, f"Not expanding {label}, it would draw more than {max_nodes()} tasks"))
+            continue
+        expanded.add(label)
+        size += len(members[label]) - 1
+
+    # Rows of the summary, and the row of G each is for ( -1 for a group )
+    node = np.full(len(tasks), -1, dtype=np.int64)
+    builder = TaskTableBuilder(Registry())
+    rendered: list[Decoration] = []
+    clusters: Dict[int, str] = dict()
+    for label, rows in members.items():
+        if label in expanded:
+            for row in rows:
+                t = tasks[row]
+                node[row] = builder.append(t.name, t.description, t.specific_assignments, t.assignees, [],
+                                           t.parallelizable, t.estimate, t.start_date, t.end_date, t.status,
+                                           t.input_row_idx, t.group or '')
+                rendered.append(decorations[row])
+            continue
+        rows = np.array(rows)
+        starts, ends = tasks.starts[rows], tasks.ends[rows]
+        people = sorted({p for row in rows.tolist() for p in tasks.assignee_names(row)})
+        critical = sum(decorations[row].critical for row in rows.tolist())
+        count = f"{len(rows)} task{'s' if len(rows) > 1 else ''}"
+        description = f"{count} with the same {by}" + (f", {critical} of them critical" if critical else '')
+        row = builder.append(f"{label} ({count})", description, True, people, [], False,
+                             int(tasks.estimates[rows].sum()),
+                             from_datetime64(starts.min()) if not np.isnat(starts).all() else None,
+                             from_datetime64(ends.max()) if not np.isnat(ends).all() else None,
+                             group_status(tasks.statuses[rows]), int(tasks.input_rows[rows].min()))
+        node[rows] = row
+        clusters[row] = label
+        rendered.append(Decoration(critical > 0))
+
+    # Edges between summary rows, resolved by name
+    summary = builder.build()
+    a, b = node[G.src], node[G.succ]
+    pairs = np.unique(np.stack([a, b])[:, a != b], axis=1)
+    following: list[list[int]] = [[] for _ in range(len(summary))]
+    for u, v in pairs.T.tolist():
+        following[u].append(int(summary.task_ids[v]))
+    summary = TaskTable(summary.registry, summary.task_ids, summary.descriptions, summary.specific,
+                        summary.parallelizable, summary.estimates, summary.starts, summary.ends,
+                        summary.statuses, summary.input_rows, to_csr(following),
+                        (summary.assignee_offsets, summary.assignee_ids), summary.group_ids)
+    H = Graph(summary)
+    carry_edges(G, H, node)
+    return Summary(H, rendered, clusters)
+
+# The rows within hops edges of rows, either way
+def neighbourhood(G: Graph, rows: np.ndarray, hops: int) -> np.ndarray:
+    seen = np.zeros(len(G), dtype=bool)
+    seen[rows] = True
+    frontier = np.asarray(rows, dtype=np.int64)
+    for _ in range(hops):
+        reached = np.concatenate([csr_take(G.succ_offsets, G.succ, frontier)[1],
+                                  csr_take(G.pred_offsets, G.pred, frontier)[1]])
+        frontier = np.unique(reached[~seen[reached]])
+        if not len(frontier):
+            break
+        seen[frontier] = True
+    return np.flatnonzero(seen)
+
+# Keeps only rows of G, and the edges between them
+def focus(G: Graph, decorations: list[Decoration], rows: np.ndarray) -> Summary:
+    tasks = G.tasks
+    rows = np.asarray(rows, dtype=np.int64)
+    sub = take_rows(tasks, rows, tasks.task_ids[rows], tasks.estimates[rows], tasks.starts[rows], tasks.ends[rows],
+                    csr_take(tasks.next_offsets, tasks.next_ids, rows), csr_take(tasks.assignee_offsets, tasks.assignee_ids, rows))
+    H = Graph(sub)
+    node = np.full(len(tasks), -1, dtype=np.int64)
+    node[rows] = np.arange(len(rows))
+    carry_edges(G, H, node)
+    return Summary(H, [decorations[row] for row in rows.tolist()])
+
+# What a request asks to see of G:
+#   focus:    'critical', or { tasks: [names], hops: k } for the tasks within k edges
+#   collapse: one of GROUPINGS
+#   expand:   groups to show the tasks of rather than collapse
+# Anything still too big to draw is collapsed by the Group column if the
+# sheet has one, by team otherwise.
+def summarize(G: Graph, decorations: list[Decoration], options: dict, notifications: list[Notification]) -> Summary:
+    summary = Summary(G, decorations)
+    chosen = options.get('focus')
+    if chosen == 'critical':
+        summary = focus(G, decorations, np.flatnonzero([d.critical for d in decorations]))
+    elif chosen:
+        rows = []
+        for name in chosen.get('tasks', []):
+            row = G.tasks.row_of(name)
+            if row is None:
+                raise Exception(f"Can't focus on '{name}', there's no such task")
+            rows.append(row)
+        summary = focus(G, decorations, neighbourhood(G, np.array(rows, dtype=np.int64), int(chosen.get('hops', 1))))
+
+    by = options.get('collapse')
+    if by is None and len(summary.G) > max_nodes():
+        by = 'group' if (G.tasks.group_ids >= 0).any() else 'team'
+        notifications.append(Notification(Severity.INFO, f"Collapsed {len(summary.G)} tasks by {by} to keep the graph readable, click a group to expand it"))
+    if by:
+        summary = collapse(summary.G, summary.decorations, by, options.get('expand', []), notifications)
+    return summary
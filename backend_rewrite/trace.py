@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+import cProfile
+from dataclasses import dataclass, field
+import io
+import json
+import logging
+import pstats
+import threading
+import os
+import time
+from typing import Callable, Iterator, Optional
+
+from .metrics import histogram
+
+# Where a request spends its time. A Trace collects a span for each stage
+# the request goes through, with whatever the stage wants to say about
+# itself ( the solver's status and conflicts, whether a render was
+# cached ). Stages open spans without knowing whether anything is
+# listening: outside a traced request a span costs a thread-local lookup.
+# Like jobs, a trace follows the work onto other threads by running it
+# there.
+
+log = logging.getLogger(__name__)
+
+stage_seconds = histogram('fantasia_stage_seconds', 'Time spent in each stage of a request', labels=('stage',))
+request_seconds = histogram('fantasia_request_seconds', 'Time to handle a request', labels=('endpoint', 'outcome'))
+
+# For entry points to call, FANTASIA_LOG_LEVEL sets the level
+def configure_logging() -> None:
+    logging.basicConfig(level=os.getenv('FANTASIA_LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s')
+
+@dataclass
+class Span:
+    name: str               # nested spans are named parent.child
+    started: float          # seconds since the trace began
+    seconds: float = 0.0
+    attrs: dict = field(default_factory=dict)
+
+class Trace:
+    def __init__(self):
+        self.began = time.perf_counter()
+        self.lock = threading.Lock()
+        self.spans: list[Span] = []
+        # About the request as a whole
+        self.attrs: dict = dict()
+
+    @contextmanager
+    def running(self) -> Iterator['Trace']:
+        previous = getattr(local, 'trace', None), getattr(local, 'stack', [])
+        local.trace, local.stack = self, []
+        try:
+            yield self
+        finally:
+            local.trace, local.stack = previous
+
+    def run(self, fn: Callable, *args):
+        with self.running():
+            return fn(*args)
+
+    def open(self, name: str, attrs: dict) -> Span:
+        s = Span(name, time.perf_counter() - self.began, attrs=attrs)
+        with self.lock:
+            self.spans.append(s)
+        return s
+
+    def seconds(self) -> float:
+        return time.perf_counter() - self.began
+
+    # The timings block of a response, in the order stages started
+    def to_dict(self) -> dict:
+        with self.lock:
+            stages = [{'stage': s.name, 'start_ms': round(s.started * 1000, 3), 'ms': round(s.seconds * 1000, 3), **s.attrs}
+                      for s in self.spans]
+            return {'total_ms': round(self.seconds() * 1000, 3), **self.attrs, 'stages': stages}
+
+    # Call once the request is done: records its stages in the metrics,
+    # and logs them as one structured line
+    def finish(self, event: str, outcome: str, **fields) -> None:
+        with self.lock:
+            for s in self.spans:
+                stage_seconds.observe(s.seconds, stage=s.name)
+        request_seconds.observe(self.seconds(), endpoint=event, outcome=outcome)
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps({'event': event, 'outcome': outcome, **fields, **self.to_dict()}, default=str))
+
+local = threading.local()
+
+# The trace the calling thread is working for, if any
+def current() -> Optional[Trace]:
+    return getattr(local, 'trace', None)
+
+# Times what runs inside it as a stage of the current trace
+@contextmanager
+def span(name: str, **attrs) -> Iterator[dict]:
+    trace = current()
+    if trace is None:
+        yield attrs
+        return
+    stack = local.stack
+    s = trace.open(f"{stack[-1].name}.{name}" if stack else name, attrs)
+    stack.append(s)
+    started = time.perf_counter()
+    try:
+        yield s.attrs
+    finally:
+        s.seconds = time.perf_counter() - started
+        stack.pop()
+
+# Adds to what the current trace says about the request as a whole
+def tag(**attrs) -> None:
+    trace = current()
+    if trace is not None:
+        with trace.lock:
+            trace.attrs.update(attrs)
+
+# Adds to what the innermost open span says about itself
+def annotate(**attrs) -> None:
+    trace = current()
+    if trace is None or not local.stack:
+        return
+    with trace.lock:
+        local.stack[-1].attrs.update(attrs)
+
+# Runs fn under cProfile, returning its result and the top functions by
+# cumulative time. Only the calling thread is profiled.
+def profiled(fn: Callable, *args, limit: int = 40):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        result = fn(*args)
+    finally:
+        profile.disable()
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(limit)
+    return result, out.getvalue()
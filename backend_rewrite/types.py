@@ -1,7 +1,10 @@
 from dataclasses import dataclass, field
-from typing import Optional
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping, Optional, Tuple
 from enum import Enum, StrEnum, auto
 from datetime import date
+import sys
+import numpy as np
 
 SOON_THRESHOLD = 3
 
@@ -11,7 +14,7 @@ class Edge(StrEnum):
     slack    = auto()  # int; the number of business days difference between the task's end date and the start of the next. Assigned to edges.
     critical = auto()  # bool; True if this edge is on the critical path.
 
-@dataclass
+@dataclass(frozen=True)
 class Person:
     name: str
 
@@ -42,18 +45,46 @@ StatusNormalization: dict[str, Status] = {
 def parse_status(status: str) -> Status:
     return StatusNormalization[status] if status in StatusNormalization else Status[status]
 
+# Index of each status in the TaskTable status column
+STATUS_CODES: list[Status] = list(Status)
+STATUS_TO_CODE: dict[Status, int] = {s: i for i, s in enumerate(STATUS_CODES)}
+
+# Missing start / end dates are stored as NaT in the date columns
+NO_DATE = np.datetime64('NaT', 'D')
+
+def to_datetime64(d: Optional[date]) -> np.datetime64:
+    return np.datetime64(d, 'D') if d else NO_DATE
+
+def from_datetime64(d: np.datetime64) -> Optional[date]:
+    return None if np.isnat(d) else d.astype(date)
+
 # Scheduler tasks are more granular
 # and contain only the absolutely essential information
-# for the solver
+# for the solver. Stored by column, indexed by TaskTable row.
 @dataclass
 class SchedulerFields:
-    id: int
-    eligible_assignees: list[int]
-    assignees: list[int]
-    earliest_start: int
-    latest_end: int
-    estimate: int
-    exclude: bool
+    eligible_assignees: list[list[int]]
+    assignees: list[list[int]]
+    earliest_start: np.ndarray
+    latest_end: np.ndarray
+    estimate: np.ndarray
+    exclude: np.ndarray
+    # Optional warm start from a previous solution, as offsets like the
+    # dates above ( -1 where there's none ), and which rows must keep it
+    hint_start: Optional[np.ndarray] = None
+    hint_end: Optional[np.ndarray] = None
+    hint_assignee: Optional[np.ndarray] = None
+    fixed: Optional[np.ndarray] = None
+
+# A previous solution by row of a lowered table. Dates are absolute so
+# they survive the scheduling date moving; NO_DATE / -1 where there's none.
+@dataclass
+class SchedulerHints:
+    starts: np.ndarray
+    ends: np.ndarray
+    assignees: np.ndarray
+    # Rows which should keep their previous solution outright
+    fixed: np.ndarray
 
 @dataclass
 class SchedulerAssignment:
@@ -66,36 +97,369 @@ class SchedulerAssignment:
 class Decoration:
     critical: bool
 
-@dataclass
+# Build a CSR ( offsets + flat values ) encoding of a list of lists
+def to_csr(lists: list) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+    np.cumsum([len(l) for l in lists], out=offsets[1:])
+    return offsets, np.fromiter((v for l in lists for v in l), dtype=np.int32, count=int(offsets[-1]))
+
+# CSR where row i is row rows[i] of ( offsets, values ), or just [single[i]]
+# wherever single[i] >= 0
+def csr_take(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray,
+             single: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = offsets[rows + 1] - offsets[rows]
+    if single is not None:
+        lengths = np.where(single >= 0, 1, lengths)
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=new_offsets[1:])
+    new_values = np.empty(new_offsets[-1], dtype=np.int32)
+    copied = np.ones(len(new_values), dtype=bool) if single is None else np.repeat(single < 0, lengths)
+    positions = np.repeat(offsets[rows] - new_offsets[:-1], lengths) + np.arange(len(new_values))
+    new_values[copied] = values[positions[copied]]
+    if single is not None:
+        new_values[~copied] = single[single >= 0]
+    return new_offsets, new_values
+
+# Row wise concatenation of two CSRs with the same number of rows
+def csr_concat(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    (a_offsets, a_values), (b_offsets, b_values) = a, b
+    a_lengths, b_lengths = np.diff(a_offsets), np.diff(b_offsets)
+    offsets = a_offsets + b_offsets
+    values = np.empty(offsets[-1], dtype=np.int32)
+    values[np.repeat(offsets[:-1] - a_offsets[:-1], a_lengths) + np.arange(len(a_values))] = a_values
+    values[np.repeat(offsets[:-1] + a_lengths - b_offsets[:-1], b_lengths) + np.arange(len(b_values))] = b_values
+    return offsets, values
+
+# Hands out dense ids for names, in the order they're first seen
+class Interner:
+    __slots__ = ('names', 'ids')
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+# Dense ids for every task, person and team in a request. Everything past
+# ingest works on these; names are only looked up again to show the user.
+# People known from the metadata come first, names only seen on tasks
+# are interned after them so they can still be reported.
+class Registry:
+    def __init__(self):
+        self.tasks = Interner()
+        self.people = Interner()
+        self.teams = Interner()
+        self.groups = Interner()
+        self.known_people: int = 0
+        self.allocations: list[float] = []     # by known person id
+        self.team_members: list[list[int]] = [] # by team id
+
+    @staticmethod
+    def from_metadata(m: 'Metadata') -> 'Registry':
+        r = Registry()
+        for person, allocation in m.people_allocations.items():
+            assert r.people.intern(person.name) == m.people_ids[person]
+            r.allocations.append(allocation)
+        r.known_people = len(r.people)
+        for team in m.teams.values():
+            r.team_members[r.team(team.name)] = [r.people.intern(p.name) for p in team.members]
+        return r
+
+    def team(self, name: str) -> int:
+        id = self.teams.intern(name)
+        if id == len(self.team_members):
+            self.team_members.append([])
+        return id
+
+# Columnar store of every task in a sheet; row i is task i. Variable 
+# length fields ( next, assignees ) are CSR encoded registry ids, passed in
+# as ( offsets, ids ). Assignees 
+# are person ids if the row is specific, otherwise team ids. Use 
+# TaskTableBuilder to make one, and InputTask to look at a single row.
+class TaskTable:
+    __slots__ = ('registry', 'task_ids', 'descriptions', 'specific', 'parallelizable', 'estimates', 'starts', 'ends',
+                 'statuses', 'input_rows', 'next_offsets', 'next_ids', 'assignee_offsets', 'assignee_ids',
+                 'group_ids', 'rows', 'succ_offsets', 'succ_rows')
+
+    def __init__(self, registry: Registry, task_ids: np.ndarray, descriptions: list[str], specific: np.ndarray,
+                 parallelizable: np.ndarray, estimates: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                 statuses: np.ndarray, input_rows: np.ndarray, next: Tuple[np.ndarray, np.ndarray],
+                 assignees: Tuple[np.ndarray, np.ndarray], group_ids: Optional[np.ndarray] = None):
+        self.registry = registry
+        self.task_ids = task_ids
+        self.descriptions = descriptions
+        self.specific = specific
+        self.parallelizable = parallelizable
+        self.estimates = estimates
+        self.starts = starts
+        self.ends = ends
+        self.statuses = statuses
+        self.input_rows = input_rows
+        self.next_offsets, self.next_ids = next
+        self.assignee_offsets, self.assignee_ids = assignees
+        # Registry group id from the optional Group column, -1 for none
+        self.group_ids = np.full(len(task_ids), -1, dtype=np.int32) if group_ids is None else group_ids
+
+        # Row of every task id, -1 for names which are only referenced by next.
+        # Later rows with a duplicate name win, like the graph always did
+        self.rows = np.full(len(registry.tasks), -1, dtype=np.int32)
+        np.maximum.at(self.rows, task_ids, np.arange(len(task_ids), dtype=np.int32))
+
+        # Resolve next into successor rows, dropping undefined tasks
+        owners = np.repeat(np.arange(len(task_ids), dtype=np.int32), np.diff(self.next_offsets))
+        targets = self.rows[self.next_ids]
+        defined = targets >= 0
+        self.succ_rows = targets[defined]
+        self.succ_offsets = np.zeros(len(task_ids) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(owners[defined], minlength=len(task_ids)), out=self.succ_offsets[1:])
+
+    @staticmethod
+    def from_tasks(tasks: Iterable['InputTask'], metadata: 'Metadata') -> 'TaskTable':
+        builder = TaskTableBuilder(Registry.from_metadata(metadata))
+        for t in tasks:
+            builder.append(t.name, t.description, t.specific_assignments, t.assignees, t.next, t.parallelizable,
+                           t.estimate, t.start_date, t.end_date, t.status, t.input_row_idx, t.group or '')
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.task_ids)
+
+    def __getitem__(self, row: int) -> 'InputTask':
+        return InputTask.view(self, row)
+
+    def __iter__(self) -> Iterator['InputTask']:
+        return (InputTask.view(self, row) for row in range(len(self)))
+
+    def name(self, row: int) -> str:
+        return self.registry.tasks.names[self.task_ids[row]]
+
+    @property
+    def names(self) -> list[str]:
+        names = self.registry.tasks.names
+        return [names[id] for id in self.task_ids.tolist()]
+
+    def row_of(self, name: str) -> Optional[int]:
+        id = self.registry.tasks.ids.get(name)
+        row = self.rows[id] if id is not None and id < len(self.rows) else -1
+        return int(row) if row >= 0 else None
+
+    def next(self, row: int) -> np.ndarray:
+        return self.next_ids[self.next_offsets[row]:self.next_offsets[row + 1]]
+
+    def next_names(self, row: int) -> list[str]:
+        names = self.registry.tasks.names
+        return [names[id] for id in self.next(row).tolist()]
+
+    def group(self, row: int) -> Optional[str]:
+        id = int(self.group_ids[row])
+        return self.registry.groups.names[id] if id >= 0 else None
+
+    def assignees(self, row: int) -> np.ndarray:
+        return self.assignee_ids[self.assignee_offsets[row]:self.assignee_offsets[row + 1]]
+
+    def assignee_names(self, row: int) -> list[str]:
+        names = self.registry.people.names if self.specific[row] else self.registry.teams.names
+        return [names[id] for id in self.assignees(row).tolist()]
+
+    # Rows of the tasks following row
+    def successors(self, row: int) -> np.ndarray:
+        return self.succ_rows[self.succ_offsets[row]:self.succ_offsets[row + 1]]
+
+    # A copy that can be scheduled without touching this one; descriptions,
+    # groups and the registry are shared
+    def copy(self) -> 'TaskTable':
+        return TaskTable(self.registry, self.task_ids.copy(), self.descriptions, self.specific.copy(),
+                         self.parallelizable.copy(), self.estimates.copy(), self.starts.copy(), self.ends.copy(),
+                         self.statuses.copy(), self.input_rows.copy(), (self.next_offsets, self.next_ids),
+                         (self.assignee_offsets.copy(), self.assignee_ids.copy()), self.group_ids)
+
+    def replace_assignees(self, assignees: list) -> None:
+        assert len(assignees) == len(self)
+        self.assignee_offsets, self.assignee_ids = to_csr(assignees)
+
+    def nbytes(self) -> int:
+        arrays = [self.task_ids, self.specific, self.parallelizable, self.estimates, self.starts, self.ends,
+                  self.statuses, self.input_rows, self.next_offsets, self.next_ids, self.assignee_offsets,
+                  self.assignee_ids, self.group_ids, self.rows, self.succ_offsets, self.succ_rows]
+        return sum(a.nbytes for a in arrays) + sys.getsizeof(self.descriptions)
+
+class TaskTableBuilder:
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self.columns: Tuple[list, ...] = tuple([] for _ in range(12))
+
+    # Append a row by name, interning everything in the registry
+    def append(self, name: str, description: str, specific_assignments: bool, assignees: list[str], next: list[str],
+               parallelizable: bool, estimate: int, start_date: Optional[date], end_date: Optional[date],
+               status: Status, input_row_idx: int, group: str = '') -> int:
+        r = self.registry
+        assignee_ids = [r.people.intern(a) if specific_assignments else r.team(a) for a in assignees]
+        return self.append_ids(r.tasks.intern(name), description, specific_assignments, assignee_ids,
+                               [r.tasks.intern(n) for n in next], parallelizable, estimate,
+                               to_datetime64(start_date), to_datetime64(end_date), STATUS_TO_CODE[status], input_row_idx,
+                               r.groups.intern(group) if group else -1)
+
+    # Append a row of already interned / encoded values
+    def append_ids(self, task_id: int, description: str, specific: bool, assignees, next, parallelizable: bool,
+                   estimate: int, start: np.datetime64, end: np.datetime64, status: int, input_row: int,
+                   group: int = -1) -> int:
+        values = (task_id, description, specific, assignees, next, parallelizable, estimate, start, end, status, input_row, group)
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        return len(self.columns[0]) - 1
+
+    def build(self) -> TaskTable:
+        task_ids, descriptions, specific, assignees, next, parallelizable, estimates, starts, ends, statuses, input_rows, groups = self.columns
+        return TaskTable(self.registry,
+                         np.array(task_ids, dtype=np.int32),
+                         descriptions,
+                         np.array(specific, dtype=bool),
+                         np.array(parallelizable, dtype=bool),
+                         np.array(estimates, dtype=np.int32),
+                         np.array(starts, dtype='datetime64[D]'),
+                         np.array(ends, dtype='datetime64[D]'),
+                         np.array(statuses, dtype=np.int8),
+                         np.array(input_rows, dtype=np.int32),
+                         to_csr(next), to_csr(assignees), np.array(groups, dtype=np.int32))
+
+# A lightweight view over one row of a TaskTable. Constructing one directly
+# makes a single row table with its own registry, which is mostly useful for tests.
 class InputTask:
-    name: str
-    description: str
+    __slots__ = ('table', 'row')
+
+    def __init__(self, name: str, description: str, specific_assignments: bool, assignees: list[str], next: list[str],
+                 parallelizable: bool, estimate: int, start_date: Optional[date], end_date: Optional[date],
+                 status: Status, input_row_idx: int):
+        builder = TaskTableBuilder(Registry())
+        builder.append(name, description, specific_assignments, assignees, next, parallelizable,
+                       estimate, start_date, end_date, status, input_row_idx)
+        self.table = builder.build()
+        self.row = 0
+
+    @staticmethod
+    def view(table: TaskTable, row: int) -> 'InputTask':
+        t = InputTask.__new__(InputTask)
+        t.table = table
+        t.row = row
+        return t
+
+    @property
+    def name(self) -> str:
+        return self.table.name(self.row)
+
+    @property
+    def description(self) -> str:
+        return self.table.descriptions[self.row]
+
     # This _should_ be string ( not Person ) 
     # since it doesn't contain any allocation information
-    specific_assignments: bool
-    assignees: list[str]
-    next: list[str]
-    parallelizable: bool
-    estimate: int
-    start_date: Optional[date]
-    end_date: Optional[date]
-    status: Status
-    input_row_idx: int
-
-    # Added and edited by scheduler
-    scheduler_fields: SchedulerFields = field(default_factory=lambda: SchedulerFields(0, [], [], 0, 0, 0, True))
+    @property
+    def specific_assignments(self) -> bool:
+        return bool(self.table.specific[self.row])
+
+    @property
+    def assignees(self) -> list[str]:
+        return self.table.assignee_names(self.row)
+
+    @property
+    def next(self) -> list[str]:
+        return self.table.next_names(self.row)
+
+    @property
+    def parallelizable(self) -> bool:
+        return bool(self.table.parallelizable[self.row])
+
+    @property
+    def estimate(self) -> int:
+        return int(self.table.estimates[self.row])
+
+    @estimate.setter
+    def estimate(self, estimate: int):
+        self.table.estimates[self.row] = estimate
+
+    @property
+    def start_date(self) -> Optional[date]:
+        return from_datetime64(self.table.starts[self.row])
+
+    @start_date.setter
+    def start_date(self, d: Optional[date]):
+        self.table.starts[self.row] = to_datetime64(d)
+
+    @property
+    def end_date(self) -> Optional[date]:
+        return from_datetime64(self.table.ends[self.row])
+
+    @end_date.setter
+    def end_date(self, d: Optional[date]):
+        self.table.ends[self.row] = to_datetime64(d)
+
+    @property
+    def status(self) -> Status:
+        return STATUS_CODES[self.table.statuses[self.row]]
+
+    @property
+    def input_row_idx(self) -> int:
+        return int(self.table.input_rows[self.row])
+
+    @property
+    def group(self) -> Optional[str]:
+        return self.table.group(self.row)
+
+    def fields(self) -> tuple:
+        return (self.name, self.description, self.specific_assignments, self.assignees, self.next, self.parallelizable,
+                self.estimate, self.start_date, self.end_date, self.status, self.input_row_idx)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, InputTask):
+            return NotImplemented
+        if self.table is other.table:
+            return self.row == other.row
+        return self.fields() == other.fields()
 
     def __hash__(self):
         return hash(self.name)
 
-@dataclass
+    def __repr__(self) -> str:
+        return f"InputTask{self.fields()}"
+
+@dataclass(frozen=True)
 class Team:
     name: str
-    members: list[Person]
+    members: tuple[Person, ...]
 
+    def __post_init__(self):
+        object.__setattr__(self, 'members', tuple(self.members))
+
+# Everything a sheet declares outside of its tasks. Immutable and made fresh
+# for every request ( see MetadataBuilder ), so nothing from one sheet can
+# leak into another's people ids.
+@dataclass(frozen=True)
 class Metadata:
-    teams: dict[str, Team] = dict()
-    people_allocations: dict[Person, float] = dict()
+    teams: Mapping[str, Team] = field(default_factory=dict)
+    people_allocations: Mapping[Person, float] = field(default_factory=dict)
+    # Dense id of every person, in the order they were first declared
+    people_ids: Mapping[Person, int] = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'teams', MappingProxyType(dict(self.teams)))
+        object.__setattr__(self, 'people_allocations', MappingProxyType(dict(self.people_allocations)))
+        object.__setattr__(self, 'people_ids', MappingProxyType({p: i for i, p in enumerate(self.people_allocations)}))
+
+class MetadataBuilder:
+    def __init__(self):
+        self.teams: dict[str, Team] = dict()
+        self.people_allocations: dict[Person, float] = dict()
 
     # Add the person, only add the allocation if new 
     def add_person(self, person: Person):
@@ -112,4 +476,5 @@ class Metadata:
             self.add_person(m)
         self.teams[team.name] = team
 
-
+    def build(self) -> Metadata:
+        return Metadata(self.teams, self.people_allocations)
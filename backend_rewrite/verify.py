@@ -1,40 +1,66 @@
-from typing import Optional, Any
-from .dateutil import compare_busdays 
-import networkx as nx
-from networkx import NetworkXNoCycle
-from .types import Metadata, InputTask, Person
+from typing import Optional, Tuple
+import numpy as np
+from .dag import Graph
+from .notification import Notification, Severity
+from .types import Metadata, TaskTable
 
-def verify_inputs(m: Metadata, tasks: list[InputTask]) -> None:
-    for t in tasks:
-        for a in t.assignees:
-            if Person(a) not in m.people_allocations and a not in m.teams:
-                raise Exception(f"InputTask definition {t.name} contained assignee {a} who is not defined in a team. Known people: {m.people_allocations.keys()}")
+def verify_inputs(m: Metadata, tasks: TaskTable) -> None:
+    # Team assignments are always known, people interned past
+    # the known ones were only ever seen on a task
+    r = tasks.registry
+    owners = np.repeat(np.arange(len(tasks)), np.diff(tasks.assignee_offsets))
+    unknown = np.flatnonzero(tasks.specific[owners] & (tasks.assignee_ids >= r.known_people))
+    if len(unknown):
+        i = unknown[0]
+        raise Exception(f"InputTask definition {tasks.name(owners[i])} contained assignee {r.people.names[tasks.assignee_ids[i]]} who is not defined in a team. Known people: {r.people.names[:r.known_people]}")
 
-def find_cycle(G: nx.Graph) -> Optional[Any]: 
-    try:
-        return nx.find_cycle(G)
-    except NetworkXNoCycle:
+def find_cycle(G: Graph) -> Optional[list[Tuple[str, str]]]: 
+    cycle = G.analyze().cycle
+    if cycle is None:
         return None
+    return [(G.tasks.name(u), G.tasks.name(v)) for u, v in cycle]
 
-# Finds nodes that end after the next node starts.
-def find_bad_dates(G: nx.DiGraph):
-    for task in G.nodes:
-        if task.estimate < 0:
-            raise Exception(f"Got estimate: {task.estimate} -- expected positive value only")
-        if not task.start_date or not task.end_date:
-            continue
-        if task.start_date >= task.end_date and task.estimate > 0:
-            raise Exception(f"Task '{task.name}' has an end date before its start date")
-        if compare_busdays(task.start_date, task.end_date, task.estimate) > 1:
-            raise Exception(f"Task '{task.name}' has an estimate {task.estimate} \
-                            that cannot fit in [{task.start_date.strftime('%Y-%m-%d')},\
-                                                {task.end_date.strftime('%Y-%m-%d')}]")
-        for s in G.successors(task):
-            if task.end_date and s.start_date and s.start_date < task.end_date:
-                raise Exception(f"Task '{task.name}' has an end date after next task [{s}] start date")
+# Every task whose dates don't hold together, and every edge where a task
+# ends after the next one starts, checked over whole columns at once. If
+# rows ( a mask ) is given only those rows and their edges are checked.
+def find_bad_dates(G: Graph, rows: Optional[np.ndarray] = None) -> list[Notification]:
+    tasks = G.tasks
+    names = tasks.names
+    ret: list[Notification] = []
+    def error(row: int, message: str):
+        ret.append(Notification(Severity.ERROR, f"Task '{names[row]}' {message}"))
+    if rows is None:
+        rows = np.ones(len(tasks), dtype=bool)
 
-def verify_graph(G: nx.DiGraph) -> None:
-    cycle = find_cycle(G)
-    if cycle:
-        raise Exception(f"Cycle detected in graph at: {cycle}. Cannot compute graph metrics.")
-    find_bad_dates(G)
+    for row in np.flatnonzero(rows & (tasks.estimates < 0)).tolist():
+        error(row, f"got estimate: {tasks.estimates[row]} -- expected positive value only")
+
+    # Only tasks with both dates can be checked against their estimate
+    dated = np.flatnonzero(rows & ~np.isnat(tasks.starts) & ~np.isnat(tasks.ends))
+    starts, ends, estimates = tasks.starts[dated], tasks.ends[dated], tasks.estimates[dated]
+    reversed = (starts >= ends) & (estimates > 0)
+    too_long = ~reversed & (estimates - np.busday_count(starts, ends) > 1)
+    for row in dated[reversed].tolist():
+        error(row, "has an end date before its start date")
+    for row in dated[too_long].tolist():
+        error(row, f"has an estimate {tasks.estimates[row]} that cannot fit in [{tasks.starts[row]}, {tasks.ends[row]}]")
+
+    # NaT compares false, so undated ends of an edge never overlap
+    overlap = np.flatnonzero((rows[G.src] | rows[G.succ]) & (tasks.starts[G.succ] < tasks.ends[G.src]))
+    for e in overlap.tolist():
+        u, v = int(G.src[e]), int(G.succ[e])
+        error(u, f"has an end date {tasks.ends[u]} after next task '{names[v]}' start date {tasks.starts[v]}")
+    return ret
+
+# affected ( a mask ) is for when G only differs from an already verified
+# graph in those rows' fields and not in its edges, so only they need checking
+def verify_graph(G: Graph, notifications: list[Notification], affected: Optional[np.ndarray] = None) -> None:
+    if affected is None:
+        cycle = find_cycle(G)
+        if cycle:
+            raise Exception(f"Cycle detected in graph at: {cycle}. Cannot compute graph metrics.")
+    # Report all of them so they can be fixed in one go
+    bad_dates = find_bad_dates(G, affected)
+    if bad_dates:
+        notifications.extend(bad_dates)
+        raise Exception(f"Found {len(bad_dates)} inconsistent dates, see notifications")
@@ -0,0 +1,39 @@
+# Expansion of multi-assignee and ~N tasks into the lowered table and graph,
+# at a few sizes so it's easy to see it stays linear.
+#
+#   python -m benchmarks.expand --tasks 10000 20000 40000 --parallel .5 --specific .5
+import argparse
+import time
+
+from backend_rewrite.dag import Graph
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.expand import expand_specific_tasks, expand_parallelizable_tasks
+from .generate import SheetSpec, generate_sheet
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, nargs='+', default=[10000, 20000, 40000])
+    parser.add_argument('--people', type=int, default=20)
+    parser.add_argument('--parallel', type=float, default=0.5)
+    parser.add_argument('--specific', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'tasks':>8} {'lowered':>8} {'specific':>10} {'parallel':>10} {'graph':>10} {'per row':>10}")
+    for n in args.tasks:
+        content = generate_sheet(SheetSpec(tasks=n, people=args.people, parallel=args.parallel, specific=args.specific))
+        table = csv_string_to_task_table(content, '\t', extract_metadata(content, '\t'))
+        (lowered, _), specific = timed(lambda: expand_specific_tasks(table))
+        (lowered, _), parallel = timed(lambda: expand_parallelizable_tasks(lowered))
+        _, graph = timed(lambda: Graph(lowered))
+        total = specific + parallel + graph
+        print(f"{n:>8} {len(lowered):>8} {specific * 1000:>8.1f}ms {parallel * 1000:>8.1f}ms {graph * 1000:>8.1f}ms "
+              f"{total / len(lowered) * 1e6:>8.2f}us")
+
+if __name__ == '__main__':
+    main()
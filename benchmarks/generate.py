@@ -0,0 +1,149 @@
+# Synthetic project sheets that look like real ones, in the tab separated
+# format csv_string_to_task_table reads: tasks in layers of dependencies,
+# a few teams, some ~N and multi-assignee tasks, some deadlines, and the
+# earliest part of the project already done with consistent dates. Sheets
+# always verify, and deadlines are loose enough that they always solve.
+#
+#   python -m benchmarks.generate --tasks 500 --depth 20 --done .3 > sheet.tsv
+import argparse
+from dataclasses import dataclass, fields
+from datetime import date
+import math
+import random
+from typing import Optional
+
+import numpy as np
+
+HEADER = ['Task', 'Description', 'Estimate', 'StartDate', 'EndDate', 'Status', 'Assignee', 'next']
+
+@dataclass
+class SheetSpec:
+    tasks: int = 1000
+    depth: int = 0              # layers of dependencies, 0 for about sqrt(tasks)
+    edges: float = 1.5          # predecessors per task, on average
+    teams: int = 3
+    people: int = 12            # split between the teams
+    parallel: float = 0.1       # fraction of ~N tasks
+    specific: float = 0.1       # fraction assigned to several people by name
+    deadlines: float = 0.05     # fraction of unfinished tasks with an end date
+    done: float = 0.2           # fraction of the project already completed
+    seed: int = 0
+    prefix: str = ''            # for team and people names, to keep sheets' people apart
+
+    # How many tasks wide each layer is
+    @property
+    def width(self) -> int:
+        return math.ceil(self.tasks / self.layers)
+
+    @property
+    def layers(self) -> int:
+        return max(1, min(self.tasks, self.depth or round(math.sqrt(self.tasks))))
+
+def busdays(start: np.datetime64, days: int) -> np.datetime64:
+    return np.busday_offset(start, days, roll='forward')
+
+def iso(day: np.datetime64) -> str:
+    return str(day.astype('datetime64[D]'))
+
+def generate_sheet(spec: SheetSpec, today: Optional[date] = None) -> str:
+    rng = random.Random(spec.seed)
+    today = np.datetime64(today or date.today(), 'D')
+    n = spec.tasks
+
+    teams = [f"{spec.prefix}Team{t}" for t in range(max(1, spec.teams))]
+    members: list[list[str]] = [[] for _ in teams]
+    for p in range(max(len(teams), spec.people)):
+        members[p % len(teams)].append(f"{spec.prefix}Person{p}")
+
+    # Rows are in layer order, and edges only go to later layers, so row
+    # order is a topological order and the done rows are a prefix of it
+    layer = [i * spec.layers // n for i in range(n)]
+    first = [0] * (spec.layers + 1)
+    for i in range(n):
+        first[layer[i] + 1] = i + 1
+    for l in range(1, spec.layers + 1):
+        first[l] = max(first[l], first[l - 1])
+    predecessors: list[list[int]] = [[] for _ in range(n)]
+    for i in range(n):
+        if layer[i] == 0:
+            continue
+        count = min(first[layer[i]], max(1, round(rng.expovariate(1 / spec.edges))))
+        for _ in range(count):
+            # Mostly on the layer just before, now and then further back
+            back = 1 if rng.random() < 0.8 else rng.randint(1, layer[i])
+            l = layer[i] - back
+            predecessors[i].append(rng.randrange(first[l], first[l + 1]))
+        predecessors[i] = sorted(set(predecessors[i]))
+
+    done = int(n * spec.done)
+    team = [rng.randrange(len(teams)) for _ in range(n)]
+    estimates = [rng.randint(1, 10) for _ in range(n)]
+    assignees: list[str] = []
+    kinds: list[str] = []
+    for i in range(n):
+        people = members[team[i]]
+        if i < done:
+            # Done work was done by someone in particular
+            kinds.append('')
+            assignees.append(rng.choice(people))
+        elif rng.random() < spec.parallel:
+            kinds.append('~')
+            assignees.append(teams[team[i]])
+        elif rng.random() < spec.specific and len(people) > 1:
+            kinds.append('')
+            assignees.append(','.join(rng.sample(people, min(len(people), rng.randint(2, 3)))))
+        else:
+            kinds.append('')
+            assignees.append(teams[team[i]] if rng.random() < 0.7 else rng.choice(people))
+
+    # Done tasks get dates as though each person worked through them in
+    # order, then everything is shifted to have finished by today
+    starts: list[Optional[int]] = [None] * n
+    ends: list[Optional[int]] = [None] * n
+    free: dict[str, int] = dict()
+    for i in range(done):
+        starts[i] = max([free.get(assignees[i], 0)] + [ends[p] for p in predecessors[i]])
+        ends[i] = free[assignees[i]] = starts[i] + estimates[i]
+    shift = max(ends[:done], default=0)
+    began = busdays(today, -shift - 1)
+
+    # Deadlines leave twice the time the task's longest chain and its share
+    # of the remaining work would take
+    remaining = sum(estimates[done:]) / max(1, spec.people)
+    chain = [0] * n
+    for i in range(done, n):
+        chain[i] = estimates[i] + max([chain[p] for p in predecessors[i]], default=0)
+
+    successors: list[list[int]] = [[] for _ in range(n)]
+    for i in range(n):
+        for p in predecessors[i]:
+            successors[p].append(i)
+
+    rows = ['\t'.join(HEADER)]
+    rows.extend('\t'.join(['%TEAM', t] + m) for t, m in zip(teams, members))
+    for i in range(n):
+        start, end, status = '', '', 'not started'
+        if i < done:
+            start, end, status = iso(busdays(began, starts[i])), iso(busdays(began, ends[i])), 'completed'
+        elif rng.random() < spec.deadlines:
+            end = iso(busdays(today, 2 * (chain[i] + math.ceil(remaining * (i - done + 1) / (n - done)))))
+        estimate = kinds[i] + str(estimates[i] if not kinds[i] else rng.randint(2, 5))
+        rows.append('\t'.join([f"T{i}", f"Layer {layer[i]} task {i}", estimate, start, end, status, assignees[i]]
+                              + [f"T{s}" for s in successors[i]]))
+    return '\n'.join(rows)
+
+# Adds a flag for each knob of SheetSpec
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    for f in fields(SheetSpec):
+        parser.add_argument('--' + f.name, type=type(f.default), default=f.default)
+
+def spec_from(args: argparse.Namespace, **overrides) -> SheetSpec:
+    return SheetSpec(**{**{f.name: getattr(args, f.name) for f in fields(SheetSpec)}, **overrides})
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_spec_arguments(parser)
+    print(generate_sheet(spec_from(parser.parse_args())))
+
+if __name__ == '__main__':
+    main()
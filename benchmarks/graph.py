@@ -0,0 +1,94 @@
+# The graph analyses the request path needs, networkx against the CSR graph.
+#
+#   python -m benchmarks.graph --tasks 10000
+import argparse
+from dataclasses import dataclass
+from datetime import date
+import time
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+
+from backend_rewrite.dag import Graph
+from backend_rewrite.dateutil import busdays_between
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.types import Edge
+from .generate import SheetSpec, generate_sheet
+
+# A task as the networkx code held it: plain Python fields, hashed by name
+@dataclass
+class BaselineTask:
+    name: str
+    estimate: int
+    start_date: Optional[date]
+    end_date: Optional[date]
+    row: int
+
+    def __hash__(self):
+        return hash(self.name)
+
+# The tasks and edges networkx starts from, made ahead of time so the
+# comparison is of the graph work alone
+def baseline_tasks(tasks) -> tuple[list[BaselineTask], list[tuple[int, int]]]:
+    nodes = [BaselineTask(name, estimate, start, end, row) for row, (name, estimate, start, end)
+             in enumerate(zip(tasks.names, tasks.estimates.tolist(), tasks.starts.tolist(), tasks.ends.tolist()))]
+    edges = [(row, s) for row in range(len(tasks)) for s in tasks.successors(row).tolist()]
+    return nodes, edges
+
+# What decorate / verify used to do over a DiGraph of tasks
+def with_networkx(nodes: list[BaselineTask], edges: list[tuple[int, int]]):
+    G = nx.DiGraph()
+    G.add_nodes_from(nodes)
+    for u, v in edges:
+        G.add_edge(nodes[u], nodes[v], **{Edge.weight: nodes[u].estimate, Edge.slack: 0, Edge.critical: False})
+    try:
+        nx.find_cycle(G)
+    except nx.NetworkXNoCycle:
+        pass
+    length = nx.dag_longest_path_length(G)
+    path = nx.dag_longest_path(G)
+    for task in G:
+        for succ in G.successors(task):
+            if task.end_date and succ.start_date:
+                G.edges[task, succ][Edge.slack] = busdays_between(task.end_date, succ.start_date)
+    return length, [t.row for t in path]
+
+def with_csr(tasks):
+    a = Graph(tasks).analyze()
+    return a.longest_path, a.critical_path
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--people', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    content = generate_sheet(SheetSpec(tasks=args.tasks, people=args.people))
+    tasks = csv_string_to_task_table(content, '\t', extract_metadata(content, '\t'))
+    # Give everything dates so slack has work to do
+    rng = np.random.default_rng(0)
+    tasks.starts[:] = np.datetime64('2025-01-01') + rng.integers(0, 365, len(tasks)).astype('timedelta64[D]')
+    tasks.ends[:] = tasks.starts + tasks.estimates.astype('timedelta64[D]')
+
+    nodes, edges = baseline_tasks(tasks)
+    assert with_networkx(nodes, edges)[0] == with_csr(tasks)[0]
+    slow = best_of(lambda: with_networkx(nodes, edges), args.repeat)
+    fast = best_of(lambda: with_csr(tasks), args.repeat)
+    print(f"{len(tasks)} tasks, {Graph(tasks).num_edges()} edges")
+    print(f"networkx {slow * 1000:10.1f}ms")
+    print(f"csr      {fast * 1000:10.1f}ms")
+    print(f"speedup  {slow / fast:10.1f}x")
+
+if __name__ == '__main__':
+    main()
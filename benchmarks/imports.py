@@ -0,0 +1,57 @@
+# What importing each entry point costs, from python -X importtime in a
+# fresh interpreter: the total, the top level packages it pulls in, and
+# the slowest modules by their own import time. Run it before and after
+# touching imports to see nothing heavy has crept onto a path that
+# doesn't need it.
+#
+#   python -m benchmarks.imports --modules backend_rewrite.parse_csv backend_rewrite.app --top 10
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+ENTRY_POINTS = [
+    'backend_rewrite.parse_csv',
+    'backend_rewrite.verify',
+    'backend_rewrite.dot',
+    'backend_rewrite.scheduler',
+    'backend_rewrite.app',
+]
+
+# Module -> ( self, cumulative ) microseconds
+def importtime(module: str) -> Dict[str, Tuple[int, int]]:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = dict()
+    for self_us, cumulative_us, name in re.findall(r'^import time:\s+(\d+) \|\s+(\d+) \| (.*)$', result.stderr, re.M):
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', nargs='+', default=ENTRY_POINTS)
+    parser.add_argument('--top', type=int, default=5)
+    # Imports are noisy, keep the fastest of a few runs
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [importtime(module) for _ in range(args.repeat)]
+        times = min(runs, key=lambda t: t[module][1])
+        packages: Dict[str, int] = dict()
+        for name, (self_us, _) in times.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+
+        print(f"{module}: {times[module][1] / 1000:.1f}ms, {len(times)} modules")
+        print(f"  {'package':<40} {'self':>10}")
+        for package, us in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+            print(f"  {package:<40} {us / 1000:>8.1f}ms")
+        print(f"  {'module':<40} {'self':>10} {'cumulative':>12}")
+        for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda t: -t[1][0])[:args.top]:
+            print(f"  {name:<40} {self_us / 1000:>8.1f}ms {cumulative_us / 1000:>10.1f}ms")
+        print()
+
+if __name__ == '__main__':
+    main()
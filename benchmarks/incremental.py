@@ -0,0 +1,46 @@
+# Latency of re-submitting a sheet with a single cell edited, against
+# scheduling it cold. Solves for real, so keep the sheet modest.
+#
+#   python -m benchmarks.incremental --tasks 150 --people 5
+import argparse
+import time
+
+from backend_rewrite.app import build_graph_and_schedule_incremental
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from .generate import SheetSpec, generate_sheet
+
+def run(content: str, previous):
+    metadata = extract_metadata(content, '\t')
+    tasks = csv_string_to_task_table(content, '\t', metadata)
+    start = time.perf_counter()
+    _, makespan, _, snapshot = build_graph_and_schedule_incremental(tasks, metadata, [], previous)
+    return snapshot, makespan, time.perf_counter() - start
+
+# Bump the estimate of the last task, which is in the last layer so
+# nothing depends on it
+def edit(content: str) -> str:
+    lines = content.split('\n')
+    cells = lines[-1].split('\t')
+    cells[2] = str(int(cells[2].lstrip('~')) + 1)
+    return '\n'.join(lines[:-1] + ['\t'.join(cells)])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=150)
+    parser.add_argument('--people', type=int, default=5)
+    args = parser.parse_args()
+
+    content = generate_sheet(SheetSpec(tasks=args.tasks, people=args.people, parallel=0, specific=0))
+    edited = edit(content)
+    snapshot, makespan, cold = run(content, None)
+    _, _, same = run(content, snapshot)
+    _, edited_makespan, warm = run(edited, snapshot)
+    _, cold_makespan, edited_cold = run(edited, None)
+    print(f"cold            {cold * 1000:10.1f}ms  makespan {makespan}")
+    print(f"unchanged       {same * 1000:10.1f}ms")
+    print(f"one cell, warm  {warm * 1000:10.1f}ms  makespan {edited_makespan}")
+    print(f"one cell, cold  {edited_cold * 1000:10.1f}ms  makespan {cold_makespan}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# Every stage a request goes through, end to end on generated sheets ( see
+# generate.py ) at a few sizes, with the time each takes and how far it
+# pushes the process's peak memory. The report is written as JSON so runs
+# on different commits can be compared:
+#
+#   python -m benchmarks.pipeline --out before.json
+#   git checkout ...
+#   python -m benchmarks.pipeline --out after.json --compare before.json
+#
+# Everything runs in process and offline. The SVG stage needs Graphviz's
+# dot on the PATH, and is skipped without it. The solve only tries the
+# first rollback by default, so a sheet that doesn't solve in the budget
+# costs one budget rather than sixteen; pass --offsets to try more.
+import argparse
+from dataclasses import asdict
+from datetime import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable, Optional
+
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.verify import verify_inputs, verify_graph
+from backend_rewrite.graph import build_graph, merge_tables, decorate_and_notify
+from backend_rewrite.dag import Graph
+from backend_rewrite.expand import expand_specific_tasks, expand_parallelizable_tasks
+from backend_rewrite.scheduler import SOLVE_SECONDS, find_solution
+from backend_rewrite.summarize import summarize
+from backend_rewrite.dot import generate_dot_file
+from backend_rewrite.gantt import render_gantt
+from backend_rewrite.render import get_renderer
+from .generate import SheetSpec, add_spec_arguments, generate_sheet, spec_from
+
+def status_kib(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise Exception(f"No {field} in /proc/self/status")
+
+# Starts the peak RSS over from the current RSS, False if the kernel won't
+def reset_peak() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+class Stages:
+    def __init__(self):
+        self.stages: list[dict] = []
+
+    # Runs a stage, noting its time and how much it raised the peak RSS
+    # above where it started
+    def run(self, name: str, fn: Callable):
+        before = status_kib('VmRSS')
+        reset = reset_peak()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        peak = (status_kib('VmHWM') - before) / 1024 if reset else None
+        self.stages.append({'stage': name, 'ms': round(elapsed * 1000, 3),
+                            'peak_mib': round(max(0.0, peak), 3) if peak is not None else None})
+        return result
+
+# One sheet through everything /process does, in the same order
+def run_pipeline(spec: SheetSpec, seconds: float, offsets: list[int], svg: bool) -> dict:
+    stages = Stages()
+    content = stages.run('generate', lambda: generate_sheet(spec))
+    metadata = stages.run('extract_metadata', lambda: extract_metadata(content, '\t'))
+    tasks = stages.run('parse_csv', lambda: csv_string_to_task_table(content, '\t', metadata))
+    stages.run('verify_inputs', lambda: verify_inputs(metadata, tasks))
+    notifications = []
+    G = stages.run('build_graph', lambda: build_graph(tasks, metadata))
+    stages.run('verify_graph', lambda: verify_graph(G, notifications))
+
+    def expand():
+        lowered, specific = expand_specific_tasks(tasks)
+        lowered, parallelizable = expand_parallelizable_tasks(lowered)
+        return lowered, specific, parallelizable, Graph(lowered)
+    lowered, specific, parallelizable, L = stages.run('expand', expand)
+    stages.run('verify_lowered', lambda: verify_graph(L, notifications))
+    makespan, offset = stages.run('find_solution', lambda: find_solution(L, specific, notifications, offsets=offsets, seconds=seconds))
+    if makespan >= 0:
+        stages.run('merge', lambda: merge_tables(tasks, lowered, specific, parallelizable))
+
+    decorations = stages.run('decorate', lambda: decorate_and_notify(G, notifications))
+    summary = stages.run('summarize', lambda: summarize(G, decorations, {}, notifications))
+    dot = stages.run('dot', lambda: generate_dot_file(summary.G, summary.decorations))
+    if svg:
+        stages.run('svg', lambda: get_renderer().render(dot))
+    stages.run('gantt', lambda: render_gantt(G, decorations))
+
+    # generate isn't something a request does
+    return {'tasks': len(tasks), 'lowered': len(lowered), 'edges': len(G.src), 'drawn': len(summary.G),
+            'makespan': makespan, 'offset': offset,
+            'total_ms': round(sum(s['ms'] for s in stages.stages[1:]), 3), 'stages': stages.stages}
+
+# The best time and worst peak of each stage over the runs
+def combine(runs: list[dict]) -> dict:
+    combined = dict(runs[0])
+    combined['total_ms'] = min(run['total_ms'] for run in runs)
+    stages: dict[str, dict] = dict()
+    for run in runs:
+        for s in run['stages']:
+            best = stages.setdefault(s['stage'], dict(s))
+            best['ms'] = min(best['ms'], s['ms'])
+            if s['peak_mib'] is not None:
+                best['peak_mib'] = max(best['peak_mib'] or 0.0, s['peak_mib'])
+    combined['stages'] = list(stages.values())
+    return combined
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def show(result: dict, base: Optional[dict]) -> None:
+    stages = {s['stage']: s for s in base['stages']} if base else dict()
+    print(f"{result['tasks']} tasks, {result['lowered']} lowered, {result['edges']} edges, "
+          f"makespan {result['makespan']} at offset {result['offset']}")
+    print(f"  {'stage':<18} {'time':>12} {'peak':>12}" + (f" {'before':>12} {'change':>8}" if base else ''))
+    for s in result['stages'] + [{'stage': 'total', 'ms': result['total_ms'], 'peak_mib': None}]:
+        peak = f"{s['peak_mib']:>9.1f}MiB" if s['peak_mib'] is not None else f"{'':>12}"
+        line = f"  {s['stage']:<18} {s['ms']:>10.1f}ms {peak}"
+        was = base['total_ms'] if base and s['stage'] == 'total' else stages.get(s['stage'], {}).get('ms')
+        if was:
+            line += f" {was:>10.1f}ms {(s['ms'] - was) / was:>+8.0%}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_spec_arguments(parser)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--seconds', type=float, default=SOLVE_SECONDS, help="time budget for each solve")
+    parser.add_argument('--offsets', type=int, nargs='+', default=[0], help="rollbacks to try, in business days")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--out', default='pipeline.json')
+    parser.add_argument('--compare', help="an earlier report to compare against")
+    args = parser.parse_args()
+
+    svg = shutil.which('dot') is not None
+    if not svg:
+        print("dot isn't on the PATH, skipping the svg stage", file=sys.stderr)
+    base = dict()
+    if args.compare:
+        with open(args.compare) as f:
+            base = {run['tasks']: run for run in json.load(f)['runs']}
+
+    runs = []
+    for n in args.sizes:
+        spec = spec_from(args, tasks=n)
+        result = combine([run_pipeline(spec, args.seconds, args.offsets, svg) for _ in range(args.repeat)])
+        show(result, base.get(result['tasks']))
+        runs.append(result)
+
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'commit': commit(),
+              'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+              'solver_threads': os.getenv('FANTASIA_SOLVER_THREADS'), 'seconds': args.seconds, 'offsets': args.offsets,
+              'spec': {k: v for k, v in asdict(spec_from(args)).items() if k != 'tasks'}, 'runs': runs}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Runs thousands of small requests through the pipeline, each with its own
+# people, and samples RSS to show per request state isn't accumulating.
+#
+#   python -m benchmarks.soak --requests 5000
+import argparse
+import gc
+import os
+
+from backend_rewrite.app import build_graph_and_schedule
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.verify import verify_inputs, verify_graph
+from backend_rewrite.graph import build_graph, decorate_and_notify
+from backend_rewrite.dot import generate_dot_file
+from .generate import SheetSpec, generate_sheet
+
+def rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+def request(i: int, tasks: int, people: int, solve: bool) -> None:
+    content = generate_sheet(SheetSpec(tasks=tasks, people=people, teams=1, seed=i, prefix=f"U{i}"))
+    metadata = extract_metadata(content, '\t')
+    table = csv_string_to_task_table(content, '\t', metadata)
+    verify_inputs(metadata, table)
+    notifications = []
+    if solve:
+        G, _, _ = build_graph_and_schedule(table, metadata, notifications)
+    else:
+        G = build_graph(table, metadata)
+        verify_graph(G, notifications)
+    generate_dot_file(G, decorate_and_notify(G, notifications))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--people', type=int, default=3)
+    # Solving is slow ( and bounded by the solver time limit ), so it's opt in
+    parser.add_argument('--solve', action='store_true')
+    args = parser.parse_args()
+
+    # Let imports and caches settle before taking the baseline
+    for i in range(20):
+        request(i, args.tasks, args.people, args.solve)
+    gc.collect()
+    baseline = rss_mib()
+    print(f"{'requests':>10} {'rss MiB':>10} {'growth':>10}")
+    for i in range(1, args.requests + 1):
+        request(i, args.tasks, args.people, args.solve)
+        if i % max(1, args.requests // 10) == 0:
+            gc.collect()
+            rss = rss_mib()
+            print(f"{i:>10} {rss:>10.1f} {rss - baseline:>+10.1f}")
+
+if __name__ == '__main__':
+    main()
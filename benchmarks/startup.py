@@ -0,0 +1,114 @@
+# What starting a server costs: a cold process importing the app and
+# serving its first request, against the preforking server, where workers
+# come up warm. Also reports how much of each worker's memory is its own
+# rather than shared with the master.
+#
+#   python -m benchmarks.startup --workers 4
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from .generate import SheetSpec, generate_sheet
+
+# Imports the app and serves one request, in a fresh interpreter
+COLD = '''
+import json, sys, time
+started = time.perf_counter()
+from backend_rewrite.app import app
+imported = time.perf_counter()
+response = app.test_client().post('/process', json={'content': sys.stdin.read(), 'view': 'gantt'})
+assert response.status_code == 200, response.get_data(as_text=True)
+done = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first': done - imported}))
+'''
+
+def env() -> dict:
+    return dict(os.environ, FLASK_SECRET_KEY=os.getenv('FLASK_SECRET_KEY', 'benchmark'))
+
+def cold(sheet: str) -> dict:
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', COLD], input=sheet, capture_output=True, text=True, env=env(), check=True).stdout
+    result = json.loads(out.strip().split('\n')[-1])
+    result['total'] = time.perf_counter() - started
+    return result
+
+def post(port: int, sheet: str) -> float:
+    started = time.perf_counter()
+    body = json.dumps({'content': sheet, 'view': 'gantt'}).encode('utf-8')
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/process', body, {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+    return time.perf_counter() - started
+
+def children(pid: int) -> list[int]:
+    ret = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        ret.append(int(entry))
+            except (FileNotFoundError, ProcessLookupError):
+                pass
+    return ret
+
+# Rss, Pss and private pages in MiB
+def memory(pid: int) -> dict:
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        kib = {k: int(v) for k, v in re.findall(r'^(\w+):\s+(\d+) kB', f.read(), re.M)}
+    return {'rss': kib['Rss'] / 1024, 'pss': kib['Pss'] / 1024,
+            'private': (kib['Private_Clean'] + kib['Private_Dirty']) / 1024}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sheet = generate_sheet(SheetSpec(tasks=args.tasks, people=5))
+
+    print(f"cold process, {args.tasks} task sheet")
+    print(f"{'':>8} {'import':>10} {'first':>10} {'total':>10}")
+    for i in range(args.repeat):
+        r = cold(sheet)
+        print(f"{i:>8} {r['import'] * 1000:>8.0f}ms {r['first'] * 1000:>8.0f}ms {r['total'] * 1000:>8.0f}ms")
+
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'backend_rewrite.serve', '--host', '127.0.0.1', '--port', '0',
+                               '--workers', str(args.workers)], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              text=True, env=env())
+    try:
+        # Warming up logs whatever the pipeline does before the address
+        port = None
+        while port is None:
+            line = server.stderr.readline()
+            if not line:
+                raise Exception("The server exited before it was ready")
+            found = re.search(r'serving on .*:(\d+) with', line)
+            port = int(found.group(1)) if found else None
+        ready = time.perf_counter() - started
+        # Keep the log moving so workers never block writing to it
+        threading.Thread(target=lambda: [None for _ in server.stderr], daemon=True).start()
+        print(f"\npreforked, {args.workers} workers, ready in {ready * 1000:.0f}ms")
+        # Enough requests to reach most workers for the first time
+        latencies = [post(port, sheet) for _ in range(args.workers * 2)]
+        print(f"{'request':>8} {'latency':>10}")
+        for i, latency in enumerate(latencies):
+            print(f"{i:>8} {latency * 1000:>8.0f}ms")
+
+        print(f"\n{'process':>8} {'rss':>10} {'pss':>10} {'private':>10}")
+        for name, pid in [('master', server.pid)] + [('worker', pid) for pid in children(server.pid)]:
+            m = memory(pid)
+            print(f"{name:>8} {m['rss']:>7.1f}MiB {m['pss']:>7.1f}MiB {m['private']:>7.1f}MiB")
+    finally:
+        server.terminate()
+        server.wait(10)
+
+if __name__ == '__main__':
+    main()
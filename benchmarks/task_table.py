@@ -0,0 +1,46 @@
+# Memory and throughput of the columnar task table on a synthetic sheet.
+#
+#   python -m benchmarks.task_table --tasks 50000
+import argparse
+from datetime import date
+import time
+import tracemalloc
+
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.verify import verify_inputs
+from backend_rewrite.expand import expand_specific_tasks, expand_parallelizable_tasks
+from backend_rewrite.scheduler import densify_dates
+from .generate import SheetSpec, generate_sheet
+
+# Time a stage, then run it again under tracemalloc for its peak allocation
+def measure(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed * 1000:10.1f}ms {peak / 2**20:10.1f}MiB peak")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--people', type=int, default=20)
+    args = parser.parse_args()
+
+    content = generate_sheet(SheetSpec(tasks=args.tasks, people=args.people))
+    metadata = extract_metadata(content, '\t')
+    table = measure('parse', lambda: csv_string_to_task_table(content, '\t', metadata))
+    measure('verify', lambda: verify_inputs(metadata, table))
+    lowered, _ = measure('specific', lambda: expand_specific_tasks(table))
+    lowered, _ = measure('parallel', lambda: expand_parallelizable_tasks(lowered))
+    measure('densify', lambda: densify_dates(date.today(), lowered.starts, lowered.ends,
+                                             lowered.estimates, int(lowered.estimates.sum())))
+    print(f"{len(table)} tasks in {table.nbytes() / 2**20:.1f}MiB, {table.nbytes() / len(table):.0f}B per task")
+    print(f"{len(lowered)} lowered tasks in {lowered.nbytes() / 2**20:.1f}MiB")
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,15 @@ document.addEventListener('DOMContentLoaded', function() {
             this.state = {
                 panZoomInstance: null,
                 isProcessing: false,
-                hasPastedContent: false
+                hasPastedContent: false,
+                lastText: null,
+                // Aborts the request in flight, if any
+                controller: null,
+                // Collapsed groups the user has opened up
+                expand: [],
+                // A retry waiting out a busy server, and how many in a row
+                retry: null,
+                retries: 0
             };
 
             this.init();
@@ -46,6 +54,17 @@ document.addEventListener('DOMContentLoaded', function() {
             this.copyButton.id = 'copyButton';
             header.appendChild(this.copyButton);
 
+            // How the solve is going, and a way to settle for it
+            this.progressText = document.createElement('span');
+            this.progressText.className = 'progress-text';
+            header.appendChild(this.progressText);
+
+            this.stopButton = document.createElement('button');
+            this.stopButton.textContent = 'Good enough';
+            this.stopButton.className = 'button';
+            this.stopButton.style.display = 'none';
+            header.appendChild(this.stopButton);
+
             const main = document.createElement('main');
             main.className = 'app-main';
 
@@ -128,6 +147,8 @@ document.addEventListener('DOMContentLoaded', function() {
             window.addEventListener('resize', this.resizeHandler.bind(this));
             this.elements.contentDiv.addEventListener('paste', this.handlePaste.bind(this));
             this.copyButton.addEventListener('click', this.handleCopyClick.bind(this));
+            // The solve finishes with what it has, which comes back as usual
+            this.stopButton.addEventListener('click', () => fetch('/process/stop', {method: 'POST'}));
         }
 
         resizeHandler() {
@@ -194,49 +215,226 @@ document.addEventListener('DOMContentLoaded', function() {
         handlePaste(event) {
             event.preventDefault();
 
+            // A new paste replaces whatever is still being worked on; the
+            // server cancels that when the connection closes
+            if (this.state.controller) {
+                this.state.controller.abort();
+            }
+            clearTimeout(this.state.retry);
+            this.state.retry = null;
+            this.state.retries = 0;
+            this.state.isProcessing = true;
+
+            this.state.lastText = (event.clipboardData || window.clipboardData).getData('text');
+            this.state.expand = [];
+            this.process();
+        }
+
+        // What to draw, from the page's query string:
+        //   ?view=gantt                  the timeline rather than the graph
+        //   ?collapse=team|status|group  a node per group
+        //   ?focus=critical              just the critical chain
+        //   ?focus=TaskA,TaskB&hops=2    just the tasks within 2 edges of these
+        viewOptions() {
+            const params = new URLSearchParams(window.location.search);
+            const options = {view: params.get('view') || 'graph', expand: this.state.expand};
+            if (params.get('collapse')) {
+                options.collapse = params.get('collapse');
+            }
+            const focus = params.get('focus');
+            if (focus === 'critical') {
+                options.focus = focus;
+            } else if (focus) {
+                options.focus = {tasks: focus.split(','), hops: parseInt(params.get('hops') || '1')};
+            }
+            return options;
+        }
+
+        // Opens up a collapsed group by drawing the same sheet again
+        expandGroup(group) {
             if (this.state.isProcessing) return;
             this.state.isProcessing = true;
+            this.state.expand.push(group);
+            this.process();
+        }
 
+        process() {
+            const controller = new AbortController();
+            this.state.controller = controller;
             this.elements.spinner.style.display = 'block';
             this.clearNotifications();
-            const text = (event.clipboardData || window.clipboardData).getData('text');
             this.elements.contentDiv.classList.add('hidden');
 
-            fetch('/process', {
+            // Ask for the SVG as its own ( compressed, cacheable ) resource
+            const request = {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({content: text })
-            })
+                body: JSON.stringify({content: this.state.lastText, svg: 'url', ...this.viewOptions()}),
+                signal: controller.signal
+            };
+
+            // The graph drawn with the sheet's own dates may come first,
+            // then the scheduled one
+            fetch('/process/stream', request)
             .then(response => {
+                // The legacy backend doesn't stream
+                if (response.status === 404) {
+                    return fetch('/process', request).then(response => {
+                        if (!response.ok) {
+                            return this.readError(response);
+                        }
+                        return response.json();
+                    }).then(data => this.loadSvg(data).then(svg => this.handleSuccessResponse(data, svg)));
+                }
+                // Turned away before it started ( busy ), or failed outright
                 if (!response.ok) {
-                    return response.json().then(data => {
-                        throw data;
-                    });
+                    return this.readError(response);
                 }
-                return response.json();
-            })
-            .then(data => {
-                this.handleSuccessResponse(data);
+                return this.readEvents(response, (event, data) => {
+                    switch (event) {
+                        case 'incumbent':
+                            return this.showProgress(data);
+                        case 'provisional':
+                            return this.loadSvg(data).then(svg => this.showSvg(data, svg));
+                        case 'final':
+                            return this.loadSvg(data).then(svg => this.handleSuccessResponse(data, svg));
+                        // Something newer took over, which will show itself
+                        case 'cancelled':
+                            return;
+                        default:
+                            throw data;
+                    }
+                });
             })
             .catch(error => {
+                if (error.name === 'AbortError' || error.cancelled) {
+                    return;
+                }
+                if (error.retry_after && this.state.controller === controller) {
+                    this.retryLater(error);
+                }
                 this.handleErrorResponse(error);
             })
             .finally(() => {
+                // Leave it all to the request that replaced this one
+                if (this.state.controller !== controller) {
+                    return;
+                }
+                this.state.controller = null;
                 this.elements.spinner.style.display = 'none';
+                this.progressText.textContent = '';
+                this.stopButton.style.display = 'none';
                 this.state.isProcessing = false;
             });
         }
 
-        handleSuccessResponse(data) {
+        // Throws the JSON error body of a failed response, with how long
+        // the server asked us to wait if it's busy
+        readError(response) {
+            return response.json()
+            .catch(() => ({message: `${response.status} ${response.statusText}`}))
+            .then(data => {
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+                if (!isNaN(retryAfter)) {
+                    data.retry_after = retryAfter;
+                }
+                throw data;
+            });
+        }
+
+        // The server is busy: try the same sheet again once it says to, a
+        // few times, unless something else is pasted meanwhile
+        retryLater(error) {
+            const MAX_RETRIES = 3;
+            if (this.state.retries >= MAX_RETRIES) {
+                error.message = `${error.message} ( gave up after ${MAX_RETRIES} retries, paste again to retry )`;
+                return;
+            }
+            this.state.retries += 1;
+            error.message = `${error.message} ( retrying in ${error.retry_after}s )`;
+            this.state.retry = setTimeout(() => {
+                this.state.retry = null;
+                if (this.state.isProcessing) return;
+                this.state.isProcessing = true;
+                this.process();
+            }, error.retry_after * 1000);
+        }
+
+        showProgress(incumbent) {
+            const gap = Math.round(incumbent.gap * 100);
+            this.progressText.textContent = `Best so far ${incumbent.makespan}d, at least ${incumbent.bound}d ( ${gap}% gap )`;
+            this.stopButton.style.display = 'block';
+        }
+
+        // Calls handle( event, data ) for each Server-Sent Event in the
+        // response, in order, once the last one has been handled
+        readEvents(response, handle) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let handled = Promise.resolve();
+            const pump = () => reader.read().then(({done, value}) => {
+                if (done) {
+                    return handled;
+                }
+                buffer += decoder.decode(value, {stream: true});
+                let end;
+                while ((end = buffer.indexOf('\n\n')) >= 0) {
+                    let event = 'message';
+                    let data = '';
+                    buffer.slice(0, end).split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) {
+                            event = line.slice(7);
+                        } else if (line.startsWith('data: ')) {
+                            data += line.slice(6);
+                        }
+                    });
+                    buffer = buffer.slice(end + 2);
+                    const parsed = JSON.parse(data);
+                    handled = handled.then(() => handle(event, parsed));
+                }
+                return pump();
+            });
+            return pump();
+        }
+
+        loadSvg(data) {
+            // The legacy backend still inlines the SVG as base64
+            if (!data.svg) {
+                return Promise.resolve(atob(data.image));
+            }
+            return fetch(data.svg).then(response => {
+                if (!response.ok) {
+                    return response.json().then(error => {
+                        throw error;
+                    });
+                }
+                return response.text();
+            });
+        }
+
+        handleSuccessResponse(data, svg) {
+            this.state.retries = 0;
             if (data.notifications && Array.isArray(data.notifications)) {
                 data.notifications.forEach(notification => {
                     this.addNotification(notification);
                 });
             }
 
-            this.elements.svgContainer.innerHTML = atob(data.image);
+            this.showSvg(data, svg);
+            this.elements.notificationsContainer.style.display = 'block';
+            this.copyButton.style.display = 'block';
+            this.state.hasPastedContent = true;
+        }
+
+        showSvg(data, svg) {
+            if (this.state.panZoomInstance) {
+                this.state.panZoomInstance.destroy();
+                this.state.panZoomInstance = null;
+            }
+            this.elements.svgContainer.innerHTML = svg;
             this.elements.svgContainer.style.display = 'block';
 
             const svgEl = this.elements.svgContainer.querySelector('svg');
@@ -253,10 +451,19 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
 
                 this.resizeHandler();
+
+                // Graphviz titles each node with its row, which is what
+                // collapsed groups are keyed by
+                const clusters = data.clusters || {};
+                svgEl.querySelectorAll('g.node').forEach(node => {
+                    const title = node.querySelector('title');
+                    const group = title && clusters[title.textContent];
+                    if (group) {
+                        node.style.cursor = 'pointer';
+                        node.addEventListener('click', () => this.expandGroup(group));
+                    }
+                });
             }
-            this.elements.notificationsContainer.style.display = 'block';
-            this.copyButton.style.display = 'block';
-            this.state.hasPastedContent = true;
         }
 
         handleErrorResponse(error) {
@@ -6,11 +6,13 @@ pkgs.mkShell {
     pkgs.python311Packages.pytest
     pkgs.python311Packages.flask     # Flask web framework
     pkgs.python311Packages.uvicorn   # ASGI server for running Flask
+    pkgs.python311Packages.gunicorn  # Production server, see backend_rewrite/gunicorn_config.py
     pkgs.graphviz
     pkgs.python311Packages.bidict
     pkgs.python311Packages.numpy
     pkgs.python311Packages.networkx
     pkgs.python311Packages.graphviz  # Python bindings for Graphviz
+    pkgs.python311Packages.pygraphviz # In process rendering, optional
     pkgs.python311Packages.pandas
     pkgs.python311Packages.ortools
     pkgs.python311Packages.protobuf
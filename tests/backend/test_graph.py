@@ -2,7 +2,7 @@ from datetime import datetime
 
 import pytest
 from backend.types import Metadata
-from backend.graph import compute_dag_metrics, find_cycle, find_bad_start_end_dates, build_graph, find_start_next_before_end, check_start_dates
+from backend.graph import analyze_graph, compute_dag_metrics, find_cycle, find_bad_start_end_dates, build_graph, find_start_next_before_end, check_start_dates
 
 def test_cycle():
     tasks = [
@@ -109,3 +109,22 @@ def test_compute_dag_metrics():
     total_work, longest_path = compute_dag_metrics(build_graph(tasks, Metadata()))
     assert total_work == 50
     assert longest_path ==  30
+
+def test_analyze_graph():
+    tasks = [
+        {'Task': 'Order Corn Seed', 'Estimate': '5', 'next': ['Grow Corn', 'Plan Maze']},
+        {'Task': 'Grow Corn', 'Estimate': '20', 'next': ['Cut Corn to Shape']},
+        {'Task': 'Plan Maze', 'Estimate': '3', 'next': ['Cut Corn to Shape']},
+        {'Task': 'Cut Corn to Shape', 'Estimate': '3', 'next': ['Done']},
+        {'Task': 'Done', 'Estimate': '0', 'next': []}
+    ]
+    a = analyze_graph(build_graph(tasks, Metadata()))
+    assert not a.cycle
+    assert [t.name for t in a.order] == ['Order Corn Seed', 'Grow Corn', 'Plan Maze', 'Cut Corn to Shape', 'Done']
+    assert [t.name for t in a.critical_path] == ['Order Corn Seed', 'Grow Corn', 'Cut Corn to Shape', 'Done']
+    assert a.longest_path == 28
+    assert a.parallelism_ratio == 31 / 28
+
+    tasks[2]['next'].append('Order Corn Seed')
+    a = analyze_graph(build_graph(tasks, Metadata()))
+    assert a.cycle
@@ -0,0 +1,138 @@
+from backend_rewrite import app as server
+from backend_rewrite.admission import Admission, Overloaded
+from backend_rewrite.app import app
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tnext
+%TEAM\tAll\tMichael\tJohn
+TaskA\tTaskA\t3\t\t\tnot started\tAll\tTaskB
+TaskB\tTaskB\t2\t\t\tnot started\tAll\t'''
+
+# Takes a turn as user in the background, holding it until release is set.
+# Returns the thread, the ticket ( once admitted ) goes in tickets.
+def hold(admission: Admission, user: str, release: threading.Event, tickets: list) -> threading.Thread:
+    def run():
+        try:
+            with admission.admit(user) as ticket:
+                tickets.append((user, ticket))
+                release.wait(5)
+        except Overloaded as e:
+            tickets.append((user, e))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise Exception("Timed out")
+        time.sleep(0.01)
+
+class TestAdmission(unittest.TestCase):
+    def test_fair_and_degraded(self):
+        admission = Admission(slots=1, queue=4, wait=5, seconds=10, degraded_seconds=2, poll=0.01)
+        tickets: list = []
+        first = threading.Event()
+        threads = [hold(admission, 'busy', first, tickets)]
+        wait_for(lambda: len(tickets) == 1)
+
+        # busy queues again before the others, but they go first since
+        # busy already has a solve running
+        rest = threading.Event()
+        threads.append(hold(admission, 'busy', rest, tickets))
+        wait_for(lambda: len(admission.waiting) == 1)
+        for user in ('a', 'b'):
+            threads.append(hold(admission, user, rest, tickets))
+            wait_for(lambda: admission.stats()['waiting'] == len(threads) - 1)
+        first.set()
+        wait_for(lambda: len(tickets) == 2)
+        rest.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([user for user, _ in tickets], ['busy', 'a', 'b', 'busy'])
+        # Admitted with nobody waiting, the full budget; with others
+        # waiting behind, the short one
+        self.assertEqual([ticket.seconds for _, ticket in tickets], [10, 2, 2, 10])
+        self.assertEqual(admission.stats()['running'], 0)
+
+    def test_overloaded(self):
+        admission = Admission(slots=1, queue=1, wait=0.2, seconds=10, degraded_seconds=2, poll=0.01)
+        tickets: list = []
+        release = threading.Event()
+        threads = [hold(admission, 'a', release, tickets)]
+        wait_for(lambda: len(tickets) == 1)
+        self.assertFalse(admission.full())
+        threads.append(hold(admission, 'b', release, tickets))
+        wait_for(admission.full)
+
+        # No room to queue
+        with self.assertRaisesRegex(Overloaded, "busy") as raised:
+            with admission.admit('c'):
+                pass
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        # Queued, but no turn in time
+        threads[1].join()
+        self.assertIsInstance(tickets[1][1], Overloaded)
+        self.assertEqual(admission.stats()['waiting'], 0)
+        release.set()
+        threads[0].join()
+
+    def test_check(self):
+        admission = Admission(slots=1, queue=1, wait=5, seconds=10, degraded_seconds=2, poll=0.01)
+        tickets: list = []
+        release = threading.Event()
+        thread = hold(admission, 'a', release, tickets)
+        wait_for(lambda: len(tickets) == 1)
+        def check():
+            raise Exception("gave up")
+        with self.assertRaisesRegex(Exception, "gave up"):
+            with admission.admit('b', check):
+                pass
+        self.assertEqual(admission.stats()['waiting'], 0)
+        release.set()
+        thread.join()
+
+class TestEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.saved = app.secret_key
+        app.secret_key = 'test'
+
+    def tearDown(self):
+        app.secret_key = self.saved
+
+    def test_busy(self):
+        admission = Admission(slots=1, queue=0, wait=5, seconds=10, degraded_seconds=2)
+        tickets: list = []
+        release = threading.Event()
+        with mock.patch.object(server, 'get_admission', lambda: admission):
+            thread = hold(admission, 'someone', release, tickets)
+            wait_for(lambda: len(tickets) == 1)
+            client = app.test_client()
+            response = client.post('/process', json={'content': SHEET, 'view': 'gantt'})
+            self.assertEqual(response.status_code, 503)
+            self.assertTrue(response.get_json()['overloaded'])
+            self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+            response = client.post('/process/stream', json={'content': SHEET, 'view': 'gantt'})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.mimetype, 'application/json')
+            body = response.get_json()
+            self.assertTrue(body['overloaded'])
+            self.assertIn('busy', body['message'])
+            self.assertEqual(int(response.headers['Retry-After']), body['retry_after'])
+            self.assertGreaterEqual(body['retry_after'], 1)
+
+            # Solves again once the slot is free
+            release.set()
+            thread.join()
+            response = client.post('/process', json={'content': SHEET, 'view': 'gantt'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['timings']['solve_seconds'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from backend_rewrite.dag import Graph
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.metadata import extract_metadata
+
+import unittest
+
+def table(input):
+    return csv_string_to_task_table(input, '|', extract_metadata(input, '|'))
+
+class TestGraph(unittest.TestCase):
+    def test_longest_path(self):
+        G = Graph(table('''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        %TEAM|All|Michael|John
+        TaskA|TaskA|3|||not started|All|TaskB|TaskC
+        TaskB|TaskB|4|||not started|All|TaskD
+        TaskC|TaskC|2|||not started|All|TaskD|TaskD
+        TaskD|TaskD|0|||milestone|All|'''))
+
+        self.assertEqual(G.num_edges(), 4)
+        self.assertEqual(G.topological_order().tolist(), [0, 1, 2, 3])
+        self.assertEqual(G.find_cycle(), None)
+        self.assertEqual(G.longest_path(), (7, [0, 1, 3]))
+        self.assertEqual(G.predecessors(3).tolist(), [1, 2])
+        self.assertEqual(G.reachable([1]).tolist(), [False, True, False, True])
+        self.assertEqual(G.reachable([1], reverse=True).tolist(), [True, True, False, False])
+
+    def test_analyze(self):
+        G = Graph(table('''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        %TEAM|All|Michael|John
+        TaskA|TaskA|3|2025-04-01|2025-04-04|not started|All|TaskB|TaskC
+        TaskB|TaskB|4|||not started|All|TaskD
+        TaskC|TaskC|2|2025-04-08|2025-04-10|not started|All|TaskD
+        TaskD|TaskD|0|||milestone|All|'''))
+
+        a = G.analyze()
+        self.assertEqual(a.cycle, None)
+        self.assertEqual(a.earliest.tolist(), [0, 3, 3, 7])
+        self.assertEqual(a.latest.tolist(), [0, 3, 5, 7])
+        self.assertEqual(a.makespan, 7)
+        self.assertEqual(a.total_work, 9)
+        self.assertEqual(a.parallelism_ratio, 9 / 7)
+        # Only the edge with both dates gets slack
+        self.assertEqual(a.slack.tolist(), [0, 2, 0, 0])
+        self.assertIs(G.analyze(), a)
+
+    def test_cycle(self):
+        G = Graph(table('''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        %TEAM|All|Michael|John
+        TaskA|TaskA|3|||not started|All|TaskB
+        TaskB|TaskB|4|||not started|All|TaskC
+        TaskC|TaskC|2|||not started|All|TaskA'''))
+
+        self.assertEqual(len(G.topological_order()), 0)
+        self.assertEqual(G.find_cycle(), [(0, 1), (1, 2), (2, 0)])
+
+if __name__ == '__main__':
+    unittest.main()
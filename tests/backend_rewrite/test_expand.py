@@ -0,0 +1,35 @@
+from backend_rewrite.dag import Graph
+from backend_rewrite.expand import expand_specific_tasks
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.metadata import extract_metadata
+
+import unittest
+
+def table(input):
+    return csv_string_to_task_table(input, '|', extract_metadata(input, '|'))
+
+class TestExpandSpecific(unittest.TestCase):
+    def test_copies_have_predecessors(self):
+        tasks = table('''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        %TEAM|All|Michael|John|Anna
+        TaskA|TaskA|3|||not started|All|TaskB
+        TaskB|TaskB|2|||not started|Michael,John,Anna|TaskC
+        TaskC|TaskC|1|||not started|All|''')
+
+        lowered, specific = expand_specific_tasks(tasks)
+        self.assertEqual(lowered.names, ['TaskA', 'TaskB', 'TaskC', 'TaskB_specific_1', 'TaskB_specific_2'])
+        self.assertEqual(specific, {1: [3, 4]})
+        self.assertEqual([lowered[row].assignees for row in range(len(lowered))],
+                         [['All'], ['Michael'], ['All'], ['John'], ['Anna']])
+
+        # Whatever came before the expanded task comes before its copies
+        # too, and the copies keep its next. The list based expansion this
+        # replaced never added the edges into the copies.
+        self.assertEqual(lowered[0].next, ['TaskB', 'TaskB_specific_1', 'TaskB_specific_2'])
+        self.assertEqual([lowered[row].next for row in (1, 3, 4)], [['TaskC']] * 3)
+        L = Graph(lowered)
+        self.assertEqual(L.successors(0).tolist(), [1, 3, 4])
+        self.assertEqual(L.predecessors(2).tolist(), [1, 3, 4])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+from backend_rewrite.app import app, build_graph_and_schedule
+from backend_rewrite.gantt import gantt
+from backend_rewrite.graph import build_graph, decorate_and_notify
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+
+import re
+import unittest
+
+SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tnext
+%TEAM\tAll\tMichael\tJohn
+TaskA\tTaskA\t3\t\t\tnot started\tMichael\tTaskB\tTaskC
+TaskB\tTaskB\t4\t\t\tnot started\tMichael\tTaskD
+TaskC\tTaskC\t2\t\t\tnot started\tJohn\tTaskD
+TaskD\tTaskD\t0\t\t\tmilestone\tAll\t'''
+
+class TestGantt(unittest.TestCase):
+    def test_gantt(self):
+        metadata = extract_metadata(SHEET, '\t')
+        tasks = csv_string_to_task_table(SHEET, '\t', metadata)
+        G, makespan, _ = build_graph_and_schedule(tasks, metadata, [])
+        self.assertEqual(makespan, 7)
+        svg = ''.join(gantt(G, decorate_and_notify(G, [])))
+
+        # A lane each, in name order
+        self.assertLess(svg.index('>John</text>'), svg.index('>Michael</text>'))
+        # Bars are as long as the tasks, the critical ones heavier
+        bars = re.findall(r'width="(\d+)" height="20" rx="3" fill="\w+" (stroke="\w+")', svg)
+        self.assertEqual(sorted(bars), [('48', 'stroke="gray"'), ('72', 'stroke="black"'), ('96', 'stroke="black"')])
+        # The milestone is a diamond
+        self.assertIn('<polygon', svg)
+        # TaskA -> TaskC crosses lanes from where TaskA ends
+        self.assertRegex(svg, r'<path d="M212,[\d.]+H\d+V[\d.]+" fill="none" stroke="gray"')
+
+    def test_unscheduled(self):
+        metadata = extract_metadata(SHEET, '\t')
+        G = build_graph(csv_string_to_task_table(SHEET, '\t', metadata), metadata)
+        self.assertIn('Nothing is scheduled yet', ''.join(gantt(G, decorate_and_notify(G, []))))
+
+class TestProcess(unittest.TestCase):
+    def setUp(self):
+        self.saved = app.secret_key
+        app.secret_key = 'test'
+
+    def tearDown(self):
+        app.secret_key = self.saved
+
+    def test_view(self):
+        client = app.test_client()
+        data = client.post('/process', json={'content': SHEET, 'svg': 'url', 'view': 'gantt'}).get_json()
+        response = client.get(data['svg'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'>Michael</text>', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
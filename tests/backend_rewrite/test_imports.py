@@ -0,0 +1,20 @@
+import subprocess
+import sys
+import unittest
+
+HEAVY = ('ortools', 'pandas', 'networkx', 'bidict', 'pygraphviz', 'backend')
+
+# The packages of HEAVY which importing module loads, in a fresh interpreter
+def loaded(module: str) -> list[str]:
+    code = f"import sys, {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+
+class TestImports(unittest.TestCase):
+    def test_lazy(self):
+        # The solver loads with the first solve, and the legacy app never
+        self.assertEqual(loaded('backend_rewrite.app'), [])
+        self.assertEqual(loaded('backend_rewrite.parse_csv'), [])
+        self.assertIn('ortools', loaded('backend_rewrite.scheduler'))
+
+if __name__ == '__main__':
+    unittest.main()
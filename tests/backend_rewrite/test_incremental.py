@@ -0,0 +1,57 @@
+from backend_rewrite.app import build_graph_and_schedule_incremental, build_plan
+from backend_rewrite.incremental import diff_tables
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.metadata import extract_metadata
+
+import unittest
+
+SHEET = '''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+%TEAM|All|Michael|John
+TaskA|TaskA|3|||not started|All|TaskB|TaskC
+TaskB|TaskB|4|||not started|Michael|TaskD
+TaskC|TaskC|2|||not started|Michael,John|TaskD
+TaskD|TaskD|0|||milestone|All|'''
+
+def parse(input):
+    metadata = extract_metadata(input, '|')
+    return csv_string_to_task_table(input, '|', metadata), metadata
+
+class TestIncremental(unittest.TestCase):
+    def test_diff(self):
+        old, m = parse(SHEET)
+        new, _ = parse(SHEET.replace('TaskB|TaskB|4', 'TaskB|TaskB|5'))
+        diff = diff_tables(old, m, new, m)
+        self.assertEqual(diff.changed, ['TaskB'])
+        self.assertFalse(diff.edges_changed)
+        self.assertEqual(diff.affected.tolist(), [False, True, False, False])
+
+        new, _ = parse(SHEET.replace('|TaskB|TaskC', '|TaskB') + '\nTaskE|TaskE|1|||not started|All|')
+        diff = diff_tables(old, m, new, m)
+        self.assertEqual(diff.added, ['TaskE'])
+        self.assertEqual(diff.changed, ['TaskA'])
+        self.assertTrue(diff.edges_changed)
+
+        self.assertTrue(diff_tables(old, m, old, m).empty())
+
+    def test_resubmit(self):
+        tasks, m = parse(SHEET)
+        _, makespan, _, snapshot = build_graph_and_schedule_incremental(tasks, m, [], None)
+        plan = build_plan(tasks)
+
+        # Unchanged reuses the schedule outright
+        tasks, m = parse(SHEET)
+        _, same, _, snapshot = build_graph_and_schedule_incremental(tasks, m, [], snapshot)
+        self.assertEqual(same, makespan)
+        self.assertEqual(build_plan(tasks), plan)
+
+        # A single edit gives the same schedule as starting from scratch
+        edited = SHEET.replace('TaskC|TaskC|2', 'TaskC|TaskC|3')
+        tasks, m = parse(edited)
+        _, warm, _, _ = build_graph_and_schedule_incremental(tasks, m, [], snapshot)
+        cold_tasks, m = parse(edited)
+        _, cold, _, _ = build_graph_and_schedule_incremental(cold_tasks, m, [], None)
+        self.assertEqual(warm, cold)
+        self.assertEqual(build_plan(tasks), build_plan(cold_tasks))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,3 +39,12 @@ class TestMetadata(unittest.TestCase):
         input = '''%TEAM|All'''
         with self.assertRaisesRegex(Exception, "Team declaration for.*All"):
             extract_metadata(input, '|')
+
+    def test_requests_are_isolated(self):
+        first = extract_metadata('''%TEAM|All|Michael|John''', '|')
+        second = extract_metadata('''%TEAM|Other|Jane''', '|')
+        self.assertEqual(list(first.teams.keys()), ['All'])
+        self.assertEqual(list(second.teams.keys()), ['Other'])
+        self.assertEqual(dict(second.people_ids), {Person("Jane"): 0})
+        with self.assertRaises(TypeError):
+            second.people_allocations[michael] = 1.0
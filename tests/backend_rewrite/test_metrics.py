@@ -0,0 +1,70 @@
+from backend_rewrite.app import app
+from backend_rewrite.metrics import Counter, Histogram, exposition
+
+import re
+import threading
+import unittest
+
+SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tnext
+%TEAM\tAll\tMichael\tJohn
+TaskA\tTaskA\t3\t\t\tnot started\tAll\tTaskB
+TaskB\tTaskB\t2\t\t\tnot started\tAll\t'''
+
+# name{labels} -> value, from the text format
+def samples(text: str) -> dict:
+    return {m.group(1): float(m.group(2)) for m in re.finditer(r'^([^#\s][^ ]*) (\S+)$', text, re.M)}
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        c = Counter('things_total', 'Things', ('kind',))
+        def bump():
+            for _ in range(1000):
+                c.inc(kind='a')
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        c.inc(2, kind='b"')
+        self.assertEqual(c.get(kind='a'), 8000)
+        self.assertEqual(list(c.expose()), ['# HELP things_total Things', '# TYPE things_total counter',
+                                            'things_total{kind="a"} 8000', 'things_total{kind="b\\""} 2'])
+        with self.assertRaisesRegex(Exception, "has labels kind, not colour"):
+            c.inc(colour='red')
+
+    def test_histogram(self):
+        h = Histogram('wait_seconds', 'Waits', (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            h.observe(value)
+        self.assertEqual(list(h.expose())[2:], ['wait_seconds_bucket{le="0.1"} 2', 'wait_seconds_bucket{le="1"} 3',
+                                                'wait_seconds_bucket{le="+Inf"} 4', 'wait_seconds_sum 3.65',
+                                                'wait_seconds_count 4'])
+        self.assertEqual(h.count(), 4)
+
+    def test_endpoint(self):
+        saved = app.secret_key
+        app.secret_key = 'test'
+        try:
+            before = samples(exposition())
+            client = app.test_client()
+            client.post('/process', json={'content': SHEET, 'view': 'gantt'})
+            response = client.get('/metrics')
+        finally:
+            app.secret_key = saved
+        self.assertEqual(response.mimetype, 'text/plain')
+        after = samples(response.get_data(as_text=True))
+        def grew(name):
+            return after[name] - before.get(name, 0)
+        self.assertEqual(grew('fantasia_solves_total{status="OPTIMAL"}'), 1)
+        self.assertEqual(grew('fantasia_schedules_total{offset="0"}'), 1)
+        self.assertEqual(grew('fantasia_sheet_tasks_count'), 1)
+        self.assertEqual(grew('fantasia_model_variables_count'), 1)
+        self.assertEqual(grew('fantasia_stage_seconds_count{stage="find_solution.solve"}'), 1)
+        self.assertEqual(grew('fantasia_request_seconds_count{endpoint="process",outcome="ok"}'), 1)
+        # Kept elsewhere, read on the way out
+        for name in ('fantasia_cancellations_total', 'fantasia_svg_cache_hit_rate', 'fantasia_layout_cache_misses_total',
+                     'fantasia_plan_store_entries', 'fantasia_in_flight_jobs'):
+            self.assertIn(name, after)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
-from backend_rewrite.parse_csv import csv_string_to_task_list
+from backend_rewrite.parse_csv import csv_string_to_task_list, csv_string_to_task_table
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.verify import verify_inputs
 from backend_rewrite.types import  Status, InputTask, Metadata
 
 import datetime
@@ -55,3 +57,26 @@ class TestParseCSV(unittest.TestCase):
         TaskA|TaskA|5|2025-04-02|2025-04-08|banana|Michael|TaskC'''
         with self.assertRaisesRegex(Exception, "banana"):
             csv_string_to_task_list(input, '|', Metadata())
+
+    def test_dense_ids(self):
+        input = '''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        TaskA|TaskA|5|||not started|All|TaskB|TaskZ
+        TaskB|TaskB|6|||not started|Michael,John|'''
+        metadata = extract_metadata(input.replace('TaskA|', '%TEAM|All|Michael|John\nTaskA|', 1), '|')
+        res = csv_string_to_task_table(input, '|', metadata)
+        registry = res.registry
+
+        self.assertEqual(registry.people.names, ['Michael', 'John'])
+        self.assertEqual(registry.known_people, 2)
+        self.assertEqual(res.assignees(0).tolist(), [registry.teams.ids['All']])
+        self.assertEqual(res.assignees(1).tolist(), [0, 1])
+        # TaskZ is referenced but never defined, so it isn't a successor
+        self.assertEqual(res.next_names(0), ['TaskB', 'TaskZ'])
+        self.assertEqual(res.successors(0).tolist(), [1])
+
+    def test_unknown_assignee(self):
+        input = '''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        TaskA|TaskA|5|||not started|Zed|'''
+        res = csv_string_to_task_table(input, '|', Metadata())
+        with self.assertRaisesRegex(Exception, "contained assignee Zed"):
+            verify_inputs(Metadata(), res)
@@ -0,0 +1,261 @@
+from backend_rewrite import app as server, coalesce, jobs
+from backend_rewrite.app import app
+from backend_rewrite.scheduler import SolveProgress
+
+import base64
+import json
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tnext
+%TEAM\tAll\tMichael\tJohn
+TaskA\tTaskA\t3\t\t\tnot started\tAll\tTaskB
+TaskB\tTaskB\t2\t\t\tnot started\tAll\t'''
+
+def parse_events(text: str) -> list:
+    # Comments are only there to keep the connection alive
+    blocks = [block for block in text.strip().split('\n\n') if block and not block.startswith(':')]
+    return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):])) for block in blocks]
+
+def events(response) -> list:
+    return parse_events(response.get_data(as_text=True))
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.saved = app.secret_key
+        app.secret_key = 'test'
+
+    def tearDown(self):
+        app.secret_key = self.saved
+
+    def test_provisional_first(self):
+        find_solution = server.find_solution
+        def slow(*args, **kwargs):
+            time.sleep(1)
+            return find_solution(*args, **kwargs)
+
+        with mock.patch.object(server, 'find_solution', slow):
+            response = app.test_client().post('/process/stream', json={'content': SHEET, 'view': 'gantt'})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        sent = events(response)
+        self.assertEqual(sent[0][0], 'provisional')
+        self.assertEqual(sent[-1][0], 'final')
+        provisional, final = sent[0][1], sent[-1][1]
+        # Every schedule found on the way, ending with the one reported
+        incumbents = [data for event, data in sent if event == 'incumbent']
+        self.assertTrue(incumbents)
+        self.assertEqual(incumbents[-1]['makespan'], 5)
+        self.assertLessEqual(incumbents[-1]['bound'], 5)
+        # Drawn before anything was scheduled
+        self.assertIn(b'Nothing is scheduled yet', base64.b64decode(provisional['image']))
+        self.assertIn(b'>John</text>', base64.b64decode(final['image']))
+        self.assertTrue(final['notifications'])
+
+    def test_stop(self):
+        # Nothing running, nothing to stop
+        self.assertEqual(app.test_client().post('/process/stop').get_json(), {'stopped': False})
+
+    def test_client_goes_away(self):
+        find_solution = server.find_solution
+        solved = threading.Event()
+        def slow(*args, **kwargs):
+            time.sleep(1.5)
+            try:
+                return find_solution(*args, **kwargs)
+            finally:
+                solved.set()
+
+        before = jobs.cancellations.value
+        with mock.patch.object(server, 'find_solution', slow):
+            response = app.test_client().post('/process/stream', json={'content': SHEET, 'view': 'gantt'}, buffered=False)
+            chunks = iter(response.response)
+            # Hang up part way through the solve
+            next(chunks)
+            response.close()
+            self.assertTrue(solved.wait(5))
+        self.assertEqual(jobs.cancellations.value, before + 1)
+
+    def test_error(self):
+        response = app.test_client().post('/process/stream', json={'content': SHEET.replace('\t3\t', '\tx\t')})
+        [(event, data)] = events(response)
+        self.assertEqual(event, 'error')
+        self.assertIn('plain integer', data['message'])
+
+class TestTimings(unittest.TestCase):
+    def setUp(self):
+        self.saved = app.secret_key
+        app.secret_key = 'test'
+
+    def tearDown(self):
+        app.secret_key = self.saved
+
+    def test_timings(self):
+        with self.assertLogs('backend_rewrite.trace', 'INFO') as logs:
+            response = app.test_client().post('/process?profile=1', json={'content': SHEET, 'view': 'gantt'})
+        timings = response.get_json()['timings']
+        stages = {stage['stage']: stage for stage in timings['stages']}
+        for stage in ('extract_metadata', 'parse_csv', 'verify_inputs', 'build_graph', 'expand', 'find_solution', 'decorate', 'gantt'):
+            self.assertIn(stage, stages)
+        # Every solve says how it went
+        solve = stages['find_solution.solve']
+        self.assertEqual((solve['offset'], solve['status'], solve['makespan'], solve['gap']), (0, 'OPTIMAL', 5, 0.0))
+        self.assertIn('conflicts', solve)
+        self.assertIn('branches', solve)
+        self.assertFalse(timings['shared'])
+        self.assertGreaterEqual(timings['total_ms'], sum(stage['ms'] for stage in timings['stages'] if '.' not in stage['stage']))
+        self.assertIn('function calls', response.get_json()['profile'])
+
+        # The same, one line in the log
+        logged = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((logged['event'], logged['outcome']), ('process', 'ok'))
+        self.assertEqual([stage['stage'] for stage in logged['stages']], [stage['stage'] for stage in timings['stages']])
+
+    def test_stream(self):
+        sent = events(app.test_client().post('/process/stream', json={'content': SHEET, 'view': 'gantt'}))
+        final = sent[-1][1]
+        self.assertNotIn('profile', final)
+        stages = [stage['stage'] for stage in final['timings']['stages']]
+        self.assertIn('parse_csv', stages)
+        self.assertIn('find_solution.solve', stages)
+
+class TestJobs(unittest.TestCase):
+    def test_newer_cancels(self):
+        before = jobs.cancellations.value
+        first = jobs.start('someone', SolveProgress())
+        sleeper = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(10)'])
+        self.assertTrue(first.track(sleeper))
+
+        second = jobs.start('someone', SolveProgress())
+        self.assertEqual(sleeper.wait(5), -9)
+        self.assertTrue(first.progress.stopped)
+        with self.assertRaisesRegex(jobs.Cancelled, "newer submission"):
+            first.check()
+        second.check()
+        self.assertIs(jobs.get('someone'), second)
+        self.assertEqual(jobs.cancellations.value, before + 1)
+
+        # Finishing the old one doesn't drop the new one
+        jobs.finish(first)
+        self.assertIs(jobs.get('someone'), second)
+        jobs.finish(second)
+        self.assertIsNone(jobs.get('someone'))
+
+class TestCoalesce(unittest.TestCase):
+    def setUp(self):
+        self.saved = app.secret_key
+        app.secret_key = 'test'
+
+    def tearDown(self):
+        app.secret_key = self.saved
+
+    def test_identical_requests(self):
+        find_solution = server.find_solution
+        calls = []
+        def slow(*args, **kwargs):
+            calls.append(args)
+            time.sleep(1)
+            return find_solution(*args, **kwargs)
+
+        before = coalesce.coalesced.value
+        clients = [app.test_client() for _ in range(3)]
+        responses = [None] * len(clients)
+        def submit(i):
+            responses[i] = clients[i].post('/process', json={'content': SHEET, 'view': 'gantt'})
+        with mock.patch.object(server, 'find_solution', slow):
+            threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(clients))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Solved once, and everyone got the lot
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(coalesce.coalesced.value, before + 2)
+        bodies = [response.get_json() for response in responses]
+        self.assertEqual(len({body['image'] for body in bodies}), 1)
+        self.assertTrue(all(body['notifications'] == bodies[0]['notifications'] for body in bodies))
+        # With a plan to copy out each
+        texts = [client.get('/get-copy-text').get_json()['text'] for client in clients]
+        self.assertEqual(len(set(texts)), 1)
+        self.assertIn('John', texts[0])
+
+        # Drawn another way, it's another request ( from someone new, who
+        # has no schedule to reuse )
+        with mock.patch.object(server, 'find_solution', slow):
+            app.test_client().post('/process', json={'content': SHEET, 'view': 'gantt', 'collapse': 'team'})
+        self.assertEqual(len(calls), 2)
+
+    def test_different_history(self):
+        find_solution = server.find_solution
+        calls = []
+        def slow(*args, **kwargs):
+            calls.append(args)
+            time.sleep(1)
+            return find_solution(*args, **kwargs)
+
+        # One of them has scheduled an earlier version of the sheet, which
+        # their schedule is warm started from, so they can't share
+        seasoned, fresh = app.test_client(), app.test_client()
+        seasoned.post('/process', json={'content': SHEET, 'view': 'gantt'})
+        edited = SHEET.replace('TaskB\tTaskB\t2', 'TaskB\tTaskB\t4')
+        before = coalesce.coalesced.value
+        responses = dict()
+        def submit(client):
+            responses[client] = client.post('/process', json={'content': edited, 'view': 'gantt'})
+        with mock.patch.object(server, 'find_solution', slow):
+            threads = [threading.Thread(target=submit, args=(client,)) for client in (seasoned, fresh)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(coalesce.coalesced.value, before)
+        self.assertTrue(calls)
+        self.assertTrue(all(response.status_code == 200 for response in responses.values()))
+
+    def test_single_flight(self):
+        flights = coalesce.SingleFlight(poll=0.01)
+        started, release = threading.Event(), threading.Event()
+        def fail():
+            started.set()
+            release.wait(5)
+            raise Exception("no good")
+
+        results = []
+        def follow():
+            started.wait(5)
+            try:
+                flights.do('key', lambda: 'mine')
+            except Exception as e:
+                results.append(str(e))
+        follower = threading.Thread(target=follow)
+        follower.start()
+        threading.Timer(0.2, release.set).start()
+        with self.assertRaisesRegex(Exception, "no good"):
+            flights.do('key', fail)
+        follower.join()
+        # The follower shared the failure, and nothing is left in flight
+        self.assertEqual(results, ['no good'])
+        self.assertEqual(len(flights), 0)
+        self.assertEqual(flights.do('key', lambda: 'mine'), ('mine', False))
+
+        # A waiting caller can give up
+        def never():
+            started.set()
+            release.wait(5)
+        started.clear(); release.clear()
+        leader = threading.Thread(target=lambda: flights.do('other', never))
+        leader.start()
+        started.wait(5)
+        def check():
+            raise jobs.Cancelled("gave up")
+        with self.assertRaisesRegex(jobs.Cancelled, "gave up"):
+            flights.do('other', lambda: None, check)
+        release.set()
+        leader.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+from backend_rewrite import jobs, layout, render
+from backend_rewrite.app import app
+from backend_rewrite.dot import generate_dot_file
+from backend_rewrite.graph import build_graph, decorate_and_notify
+from backend_rewrite.layout import LayoutCache, draw_svg, parse_plain, render_restyled
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.render import Renderer, SvgCache
+from backend_rewrite.scheduler import SolveProgress
+
+import gzip
+import html
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import xml.etree.ElementTree as ET
+
+# Stands in for dot: echoes the graph back wrapped in <svg>, or sleeps /
+# fails if the graph asks it to. Plain output puts the nodes in a row and
+# leaves a note that it was asked for.
+FAKE_DOT = f'''#!{sys.executable}
+import os, re, sys, time
+dot = sys.stdin.read()
+if '-Tplain' in sys.argv:
+    with open(os.path.join(os.path.dirname(sys.argv[0]), 'layouts'), 'a') as f:
+        f.write('plain\\n')
+    nodes = re.findall(r'^(\\d+) \\[label', dot, re.M)
+    print(f'graph 1 {{2 * len(nodes)}} 2')
+    for i, n in enumerate(nodes):
+        print(f'node {{n}} {{2 * i + 1}} 1 1.5 1 <label> plaintext black lightgrey')
+    for u, v, label in re.findall(r'^(\\d+) -> (\\d+) .*label="([^"]*)"', dot, re.M):
+        x, y = 2 * int(u) + 1.75, 2 * int(v) + 0.15
+        print(f'edge {{u}} {{v}} 4 {{x}} 1 {{x + 0.1}} 1 {{y - 0.1}} 1 {{y}} 1' + (f' "{{label}}" {{x + 0.2}} 1.2' if label else '') + ' solid gray')
+    print('stop')
+    sys.exit(0)
+if 'sleep' in dot:
+    time.sleep(10)
+if 'fail' in dot:
+    sys.stderr.write('syntax error')
+    sys.exit(1)
+sys.stdout.write('<svg>' + dot + '</svg>')
+'''
+
+class FakeDot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.dot_path = os.path.join(self.dir.name, 'dot')
+        with open(self.dot_path, 'w') as f:
+            f.write(FAKE_DOT)
+        os.chmod(self.dot_path, 0o755)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+class TestRender(FakeDot):
+    def test_pipe(self):
+        renderer = Renderer(self.dot_path, processes=2, in_process=False)
+        self.assertEqual(renderer.render('digraph {}'), b'<svg>digraph {}</svg>')
+        # Nothing is left behind
+        self.assertEqual(os.listdir(self.dir.name), ['dot'])
+
+    def test_failure(self):
+        renderer = Renderer(self.dot_path, in_process=False)
+        with self.assertRaisesRegex(Exception, "exit code 1: syntax error"):
+            renderer.render('fail')
+
+    def test_timeout(self):
+        renderer = Renderer(self.dot_path, timeout=0.5, in_process=False)
+        with self.assertRaisesRegex(Exception, "longer than 0.5s"):
+            renderer.render('sleep')
+        # The slot is given back
+        self.assertEqual(renderer.render('digraph {}'), b'<svg>digraph {}</svg>')
+
+    def test_cancel(self):
+        renderer = Renderer(self.dot_path, in_process=False)
+        job = jobs.Job('someone', SolveProgress())
+        threading.Timer(0.5, job.cancel, ['Cancelled by a newer submission']).start()
+        start = time.monotonic()
+        with job.running(), self.assertRaises(jobs.Cancelled):
+            renderer.render('sleep')
+        # Killed rather than left to finish
+        self.assertLess(time.monotonic() - start, 5)
+        with job.running(), self.assertRaises(jobs.Cancelled):
+            renderer.render('digraph {}')
+
+    def test_in_process_opt_in(self):
+        # Can't be timed out or killed, so never the default
+        saved = os.environ.pop('FANTASIA_RENDER_IN_PROCESS', None)
+        try:
+            self.assertFalse(Renderer().in_process)
+        finally:
+            if saved is not None:
+                os.environ['FANTASIA_RENDER_IN_PROCESS'] = saved
+        # A cancelled job doesn't start drawing
+        renderer = Renderer(in_process=True)
+        job = jobs.Job('someone', SolveProgress())
+        job.cancel('Cancelled by a newer submission')
+        with job.running(), self.assertRaises(jobs.Cancelled):
+            renderer.render('digraph {}')
+
+class TestSvgCache(unittest.TestCase):
+    def test_lru(self):
+        cache = SvgCache(max_bytes=10)
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        self.assertEqual(cache.get('a'), b'aaaa')
+        # b is least recently used, so it goes
+        cache.put('c', b'cccc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), b'cccc')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['bytes']), (2, 1, 1, 8))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            key = SvgCache.key('digraph {}')
+            SvgCache(max_bytes=100, directory=directory).put(key, b'<svg/>')
+            # A different worker finds it on disk
+            other = SvgCache(max_bytes=100, directory=directory)
+            self.assertEqual(other.get(key), b'<svg/>')
+            self.assertEqual(other.get(key), b'<svg/>')
+            self.assertEqual((other.stats()['disk_hits'], other.stats()['hits']), (1, 1))
+            self.assertEqual(os.listdir(directory), [key + '.svg'])
+
+class TestLayout(FakeDot):
+    def setUp(self):
+        super().setUp()
+        self.saved = render.renderer, render.svg_cache, layout.layout_cache
+        render.renderer = Renderer(self.dot_path, in_process=False)
+        render.svg_cache = SvgCache(2**20)
+        layout.layout_cache = LayoutCache(8)
+
+    def tearDown(self):
+        render.renderer, render.svg_cache, layout.layout_cache = self.saved
+        super().tearDown()
+
+    def test_parse_plain(self):
+        plain = parse_plain('graph 1 4 2\n'
+                            'node 0 1 1.5 1.5 1 "<table border=\'1\'>" plaintext black lightgrey\n'
+                            'edge 0 1 4 1.75 1 2 1 2.5 1 3 1 "late 2d" 2.5 1.25 solid red\n'
+                            'stop\n')
+        self.assertEqual((plain.width, plain.height), (288, 144))
+        self.assertEqual(plain.nodes[0], (72, 36, 108, 72))
+        self.assertEqual(plain.edges[(0, 1)][0], (126, 72))
+        self.assertEqual(plain.labels[(0, 1)], (180, 54))
+
+    def graph(self, sheet):
+        metadata = extract_metadata(sheet, '\t')
+        G = build_graph(csv_string_to_task_table(sheet, '\t', metadata), metadata)
+        decorations = decorate_and_notify(G, [])
+        return generate_dot_file(G, decorations), G, decorations
+
+    def layouts(self):
+        with open(os.path.join(self.dir.name, 'layouts')) as f:
+            return len(f.readlines())
+
+    def test_restyle(self):
+        key, svg = render_restyled(*self.graph(SHEET))
+        self.assertIn(b'<svg xmlns', svg)
+        self.assertIn(b'TaskA', svg)
+
+        # A new description of much the same length keeps the layout, so
+        # dot isn't asked again and the node doesn't move
+        other, restyled = render_restyled(*self.graph(SHEET.replace('TaskA\tTaskA', 'TaskA\tTaskZ')))
+        self.assertNotEqual(key, other)
+        self.assertIn(b'TaskZ', restyled)
+        self.assertEqual(self.layouts(), 1)
+        self.assertEqual(svg.split(b'<text')[0], restyled.split(b'<text')[0])
+
+        # A much longer one needs laying out again
+        render_restyled(*self.graph(SHEET.replace('TaskA\tTaskA', 'TaskA\t' + 'Much longer ' * 10)))
+        self.assertEqual(self.layouts(), 2)
+
+    def test_node_groups(self):
+        dot, G, decorations = self.graph(SHEET.replace('TaskA\tTaskA', 'TaskA\tFish & chips'))
+        layout = parse_plain(Renderer(self.dot_path, in_process=False).render(dot, 'plain').decode('utf-8'))
+        svg = ET.fromstring(draw_svg(G, decorations, layout))
+        ns = '{http://www.w3.org/2000/svg}'
+        # Titled with the row, like dot's nodes, so the frontend can find them
+        nodes = [g for g in svg.iter(ns + 'g') if g.get('class') == 'node']
+        self.assertEqual(sorted(g.find(ns + 'title').text for g in nodes), [str(task.row) for task in G])
+        # Both drawings show the same table
+        self.assertIn('Fish &amp; chips', dot)
+        texts = {t.text for t in svg.iter(ns + 'text')}
+        self.assertIn('Fish & chips', texts)
+        for text in texts:
+            self.assertIn(html.escape(text), dot)
+
+SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tnext
+%TEAM\tAll\tMichael\tJohn
+TaskA\tTaskA\t3\t\t\tnot started\tAll\tTaskB
+TaskB\tTaskB\t2\t\t\tnot started\tAll\t'''
+
+class TestServeSvg(FakeDot):
+    def setUp(self):
+        super().setUp()
+        self.saved = render.renderer, render.svg_cache, app.secret_key
+        render.renderer = Renderer(self.dot_path, in_process=False)
+        render.svg_cache = SvgCache(2**20)
+        app.secret_key = 'test'
+
+    def tearDown(self):
+        render.renderer, render.svg_cache, app.secret_key = self.saved
+        super().tearDown()
+
+    def test_svg_url(self):
+        client = app.test_client()
+        data = client.post('/process', json={'content': SHEET, 'svg': 'url'}).get_json()
+        self.assertNotIn('image', data)
+        self.assertTrue(data['notifications'])
+
+        response = client.get(data['svg'], headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'image/svg+xml')
+        self.assertTrue(gzip.decompress(response.data).startswith(b'<svg>digraph Items'))
+
+        etag = response.headers['ETag']
+        response = client.get(data['svg'], headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        self.assertEqual(client.get('/svg/nope').status_code, 404)
+
+    def test_inline(self):
+        data = app.test_client().post('/process', json={'content': SHEET}).get_json()
+        self.assertIn('image', data)
+
+if __name__ == '__main__':
+    unittest.main()
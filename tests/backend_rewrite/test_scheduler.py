@@ -0,0 +1,50 @@
+from backend_rewrite.dag import Graph
+from backend_rewrite.expand import expand_specific_tasks, expand_parallelizable_tasks
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.scheduler import SolveProgress, find_solution
+
+import unittest
+
+SHEET = '''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+%TEAM|All|Michael|John
+TaskA|TaskA|3|||not started|All|TaskB|TaskC
+TaskB|TaskB|4|||not started|All|TaskD
+TaskC|TaskC|2|||not started|All|TaskD
+TaskD|TaskD|0|||milestone|All|'''
+
+def lowered():
+    tasks = csv_string_to_task_table(SHEET, '|', extract_metadata(SHEET, '|'))
+    lowered, specific = expand_specific_tasks(tasks)
+    lowered, _ = expand_parallelizable_tasks(lowered)
+    return Graph(lowered), specific
+
+class TestProgress(unittest.TestCase):
+    def test_incumbents(self):
+        found = []
+        progress = SolveProgress(found.append)
+        L, specific = lowered()
+        makespan, offset = find_solution(L, specific, [], progress=progress)
+        self.assertEqual((makespan, offset), (7, 0))
+        self.assertEqual(found[-1].makespan, 7)
+        self.assertIs(progress.best, found[-1])
+        self.assertGreaterEqual(found[-1].gap, 0)
+
+    def test_stopped_on_first(self):
+        # Good enough straight away still gives that schedule
+        progress = SolveProgress(lambda incumbent: progress.stop())
+        L, specific = lowered()
+        makespan, _ = find_solution(L, specific, [], progress=progress)
+        self.assertEqual(makespan, progress.best.makespan)
+
+    def test_stopped_before(self):
+        progress = SolveProgress()
+        progress.stop()
+        L, specific = lowered()
+        notifications = []
+        # Rollbacks aren't tried either
+        self.assertEqual(find_solution(L, specific, notifications, progress=progress), (-1, 0))
+        self.assertEqual(notifications[-1].message, "Stopped before a schedule was found")
+
+if __name__ == '__main__':
+    unittest.main()
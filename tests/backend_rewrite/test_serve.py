@@ -0,0 +1,57 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import unittest
+import urllib.request
+
+class TestServe(unittest.TestCase):
+    def test_workers(self):
+        server = subprocess.Popen([sys.executable, '-m', 'backend_rewrite.serve', '--host', '127.0.0.1', '--port', '0',
+                                   '--workers', '2'], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                  env=dict(os.environ, FLASK_SECRET_KEY='test'))
+        try:
+            port = None
+            while port is None:
+                line = server.stderr.readline()
+                self.assertTrue(line, "The server exited before it was ready")
+                found = re.search(r'serving on .*:(\d+) with 2 workers', line)
+                port = int(found.group(1)) if found else None
+
+            def get():
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=10) as response:
+                    return response.status
+            self.assertEqual(get(), 200)
+
+            # A worker that dies is replaced, and the server keeps answering
+            worker = int(subprocess.run(['pgrep', '-P', str(server.pid)], capture_output=True, text=True).stdout.split()[0])
+            os.kill(worker, signal.SIGKILL)
+            time.sleep(0.5)
+            self.assertEqual(len(subprocess.run(['pgrep', '-P', str(server.pid)], capture_output=True, text=True).stdout.split()), 2)
+            self.assertEqual(get(), 200)
+        finally:
+            server.terminate()
+            self.assertEqual(server.wait(10), 0)
+        # With the exit code rather than the raw wait status
+        self.assertIn('exited with status -9, replacing it', server.stderr.read())
+
+    def test_secret_key(self):
+        env = {k: v for k, v in os.environ.items() if k != 'FLASK_SECRET_KEY'}
+        result = subprocess.run([sys.executable, '-m', 'backend_rewrite.serve'], capture_output=True, text=True, env=env)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('Set FLASK_SECRET_KEY', result.stderr)
+
+    # What gunicorn loads, in a fresh process as it would
+    def test_application(self):
+        script = ('import gc; from backend_rewrite import gunicorn_config, serve; app = serve.application(); '
+                  'gunicorn_config.when_ready(None); print(app.name, gunicorn_config.preload_app, gc.get_freeze_count() > 0)')
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                env=dict(os.environ, FLASK_SECRET_KEY='test'))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['backend_rewrite.app', 'True', 'True'])
+        self.assertIn('Warmed up', result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
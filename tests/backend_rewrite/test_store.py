@@ -0,0 +1,79 @@
+from backend_rewrite.store import MemoryStore, SqliteStore
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+class TestMemoryStore(unittest.TestCase):
+    def test_lru(self):
+        store = MemoryStore(2, 60)
+        store.put('a', 1)
+        store.put('b', 2)
+        self.assertEqual(store.get('a'), 1)
+        # b is the least recently used now
+        store.put('c', 3)
+        self.assertIsNone(store.get('b'))
+        self.assertEqual((store.get('a'), store.get('c')), (1, 3))
+        self.assertEqual(store.stats(), {'hits': 3, 'misses': 1, 'evictions': 1, 'expirations': 0, 'entries': 2})
+
+    def test_ttl(self):
+        store = MemoryStore(2, 0.05)
+        store.put('a', 1)
+        time.sleep(0.1)
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(store.stats()['expirations'], 1)
+        self.assertEqual(store.stats()['entries'], 0)
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'plans.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_shared(self):
+        # Two workers on the same file
+        first, second = SqliteStore(self.path, 60, flush_interval=10), SqliteStore(self.path, 60)
+        first.put('someone', '2024-01-01\t2024-01-03\tJohn')
+        first.put('someone else', '')
+        # Readable here straight away, there once it's written
+        self.assertEqual(first.get('someone'), '2024-01-01\t2024-01-03\tJohn')
+        self.assertIsNone(second.get('someone'))
+        first.flush()
+        self.assertEqual(second.get('someone'), '2024-01-01\t2024-01-03\tJohn')
+        self.assertEqual(second.get('someone else'), '')
+        self.assertEqual(first.stats()['batches'], 1)
+        self.assertEqual(first.stats()['writes'], 2)
+        first.close()
+        second.close()
+
+    def test_batched(self):
+        store = SqliteStore(self.path, 60, flush_interval=0.05)
+        for i in range(100):
+            store.put(f'user{i}', f'plan {i}')
+        deadline = time.time() + 5
+        while store.stats()['pending'] and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(store.stats()['writes'], 100)
+        self.assertLess(store.stats()['batches'], 10)
+        self.assertEqual(SqliteStore(self.path, 60).get('user42'), 'plan 42')
+        store.close()
+
+    def test_ttl(self):
+        store = SqliteStore(self.path, 0.05)
+        store.put('old', 'plan')
+        store.flush()
+        time.sleep(0.1)
+        self.assertIsNone(store.get('old'))
+        # Swept out when the next batch is written
+        store.put('new', 'plan')
+        store.flush()
+        users = [user for user, in sqlite3.connect(self.path).execute('SELECT user FROM plans')]
+        self.assertEqual(users, ['new'])
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
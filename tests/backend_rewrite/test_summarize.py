@@ -0,0 +1,77 @@
+from backend_rewrite.app import build_graph_and_schedule
+from backend_rewrite.graph import decorate_and_notify
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.summarize import collapse, summarize
+from backend_rewrite.types import Status
+
+import os
+import unittest
+from unittest import mock
+
+SHEET = '''Task\tDescription\tEstimate\tStartDate\tEndDate\tStatus\tAssignee\tGroup\tnext
+%TEAM\tAll\tMichael\tJohn
+TaskA\tTaskA\t3\t\t\tnot started\tMichael\tBuild\tTaskB\tTaskC
+TaskB\tTaskB\t4\t\t\tin progress\tMichael\tBuild\tTaskD
+TaskC\tTaskC\t2\t\t\tnot started\tJohn\tTest\tTaskD
+TaskD\tTaskD\t0\t\t\tmilestone\tAll\t\t'''
+
+class TestSummarize(unittest.TestCase):
+    def setUp(self):
+        metadata = extract_metadata(SHEET, '\t')
+        tasks = csv_string_to_task_table(SHEET, '\t', metadata)
+        self.G, _, _ = build_graph_and_schedule(tasks, metadata, [])
+        self.decorations = decorate_and_notify(self.G, [])
+
+    def edges(self, G):
+        return [(G.tasks.name(u), G.tasks.name(v), int(G.slack[e]), bool(G.critical[e])) for u, v, e in G.edges()]
+
+    def test_collapse(self):
+        self.assertEqual(self.G.tasks.group(0), 'Build')
+        summary = collapse(self.G, self.decorations, 'group')
+        H = summary.G
+        self.assertEqual(H.tasks.names, ['Build (2 tasks)', 'Test (1 task)', 'Ungrouped (1 task)'])
+        self.assertEqual(summary.clusters, {0: 'Build', 1: 'Test', 2: 'Ungrouped'})
+        # Adds the work up, spans the dates, and is in progress if any of it is
+        build = H.tasks[0]
+        self.assertEqual(build.estimate, 7)
+        self.assertEqual((build.start_date, build.end_date), (self.G.tasks[0].start_date, self.G.tasks[1].end_date))
+        self.assertEqual(build.status, Status.InProgress)
+        self.assertEqual([d.critical for d in summary.decorations], [True, False, True])
+        # Edges inside a group go, those between groups keep the least slack
+        self.assertEqual(self.edges(H), [('Build (2 tasks)', 'Test (1 task)', 0, False),
+                                         ('Build (2 tasks)', 'Ungrouped (1 task)', 0, True),
+                                         ('Test (1 task)', 'Ungrouped (1 task)', 2, False)])
+
+        expanded = collapse(self.G, self.decorations, 'group', ['Build'])
+        self.assertEqual(expanded.G.tasks.names, ['TaskA', 'TaskB', 'Test (1 task)', 'Ungrouped (1 task)'])
+        self.assertEqual(expanded.clusters, {2: 'Test', 3: 'Ungrouped'})
+
+        with self.assertRaisesRegex(Exception, "Can't collapse by 'colour'"):
+            collapse(self.G, self.decorations, 'colour')
+
+    def test_focus(self):
+        critical = summarize(self.G, self.decorations, {'focus': 'critical'}, [])
+        self.assertEqual(critical.G.tasks.names, ['TaskA', 'TaskB', 'TaskD'])
+        self.assertEqual(self.edges(critical.G), [('TaskA', 'TaskB', 0, True), ('TaskB', 'TaskD', 0, True)])
+
+        near = summarize(self.G, self.decorations, {'focus': {'tasks': ['TaskB'], 'hops': 1}}, [])
+        self.assertEqual(near.G.tasks.names, ['TaskA', 'TaskB', 'TaskD'])
+        everything = summarize(self.G, self.decorations, {'focus': {'tasks': ['TaskB'], 'hops': 2}}, [])
+        self.assertEqual(len(everything.G), 4)
+
+        with self.assertRaisesRegex(Exception, "no such task"):
+            summarize(self.G, self.decorations, {'focus': {'tasks': ['TaskZ']}}, [])
+
+    def test_bounded(self):
+        self.assertIs(summarize(self.G, self.decorations, {}, []).G, self.G)
+        with mock.patch.dict(os.environ, {'FANTASIA_MAX_NODES': '3'}):
+            notifications = []
+            summary = summarize(self.G, self.decorations, {'expand': ['Build', 'Test']}, notifications)
+            # Build would go over, Test fits
+            self.assertEqual(summary.G.tasks.names, ['Build (2 tasks)', 'TaskC', 'Ungrouped (1 task)'])
+            self.assertIn('Collapsed 4 tasks by group', notifications[0].message)
+            self.assertIn('Not expanding Build', notifications[1].message)
+
+if __name__ == '__main__':
+    unittest.main()
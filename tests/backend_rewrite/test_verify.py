@@ -0,0 +1,37 @@
+from backend_rewrite.dag import Graph
+from backend_rewrite.parse_csv import csv_string_to_task_table
+from backend_rewrite.metadata import extract_metadata
+from backend_rewrite.notification import Severity
+from backend_rewrite.verify import find_bad_dates, verify_graph
+
+import unittest
+
+def graph(input):
+    return Graph(csv_string_to_task_table(input, '|', extract_metadata(input, '|')))
+
+class TestVerify(unittest.TestCase):
+    def test_good_dates(self):
+        G = graph('''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        %TEAM|All|Michael|John
+        TaskA|TaskA|3|2025-04-01|2025-04-04|not started|All|TaskB
+        TaskB|TaskB|4|2025-04-04||not started|All|''')
+        self.assertEqual(find_bad_dates(G), [])
+
+    def test_all_bad_dates_reported(self):
+        G = graph('''Task|Description|Estimate|StartDate|EndDate|Status|Assignee|next
+        %TEAM|All|Michael|John
+        TaskA|TaskA|3|2025-04-04|2025-04-01|not started|All|TaskB
+        TaskB|TaskB|9|2025-04-01|2025-04-04|not started|All|TaskC
+        TaskC|TaskC|1|2025-04-02||not started|All|''')
+        notifications = []
+        with self.assertRaisesRegex(Exception, "Found 3 inconsistent dates"):
+            verify_graph(G, notifications)
+
+        messages = [n.message for n in notifications]
+        self.assertTrue(all(n.severity == Severity.ERROR for n in notifications))
+        self.assertIn("Task 'TaskA' has an end date before its start date", messages)
+        self.assertIn("Task 'TaskB' has an estimate 9 that cannot fit in [2025-04-01, 2025-04-04]", messages)
+        self.assertIn("Task 'TaskB' has an end date 2025-04-04 after next task 'TaskC' start date 2025-04-02", messages)
+
+if __name__ == '__main__':
+    unittest.main()